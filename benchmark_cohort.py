@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Benchmark cohort_export.py against one PDF per report
+
+For synthetic cohorts of increasing size, writes the cohort as a single
+PDF and as separate files (FPDF and the fast writer), and reports wall
+time, bytes on disk and the peak memory the cohort writer allocates on
+top of the loaded records.
+
+Usage:
+    python benchmark_cohort.py [record_count ...]      e.g. 1000 7000
+"""
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import sys
+
+from benchmark_search import make_records
+from report_renderer import BULK_REPORT, pdf_bytes
+from fast_report_writer import FAST_BULK_REPORT
+from cohort_export import CohortPdfWriter
+
+DEFAULT_SIZES = [500, 2000]
+
+
+def write_separate(records, out_dir, render):
+    """One file per record; returns total bytes written"""
+    total = 0
+    for i, record in enumerate(records):
+        data = render(record)
+        with open(os.path.join(out_dir, f"{i}.pdf"), 'wb') as f:
+            f.write(data)
+        total += len(data)
+    return total
+
+
+def write_cohort(records, path):
+    """Stream records into one cohort PDF; returns the page count"""
+    cohort = CohortPdfWriter(path, "Benchmark cohort")
+    for record in records:
+        cohort.add_report(record)
+    return cohort.close()
+
+
+def main(sizes):
+    work_dir = tempfile.mkdtemp()
+    try:
+        print(f"  {'Reports':>7} | {'Output':<20} | {'Time':>8} | {'Size':>9} | {'Peak memory':>11}")
+        for count in sizes:
+            records = list(make_records(count).values())
+            for name, render in (("separate (FPDF)", lambda r: pdf_bytes(BULK_REPORT.render(r))),
+                                 ("separate (fast)", FAST_BULK_REPORT.render_bytes)):
+                out_dir = os.path.join(work_dir, name.split()[1].strip('()'))
+                os.makedirs(out_dir)
+                start = time.perf_counter()
+                total = write_separate(records, out_dir, render)
+                elapsed = time.perf_counter() - start
+                shutil.rmtree(out_dir)
+                print(f"  {count:>7} | {name:<20} | {elapsed:>7.2f}s | {total / 1024:>7.0f}KB | {'':>11}")
+
+            path = os.path.join(work_dir, 'cohort.pdf')
+            start = time.perf_counter()
+            pages = write_cohort(records, path)
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(path)
+
+            # Second pass under tracemalloc (which slows it down) for the peak
+            tracemalloc.start()
+            write_cohort(records, path)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"  {count:>7} | {'cohort (' + str(pages) + ' pages)':<20} | {elapsed:>7.2f}s | "
+                  f"{size / 1024:>7.0f}KB | {peak / 1024:>9.0f}KB")
+            os.remove(path)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Benchmark GUI startup loading with and without the load cache
+
+Writes a synthetic reports_data.json, then runs the GUI's loader
+(ReportGeneratorApp._load_worker, no window needed) until the record map
+and search index are complete:
+    cold    no cache: parse the JSON, build the records and the index
+    warm    valid reports_data.json.cache from the cold run
+
+Usage:
+    python benchmark_load_cache.py [record_count ...]      default 7000 100000
+"""
+import os
+import queue
+import shutil
+import tempfile
+import time
+import sys
+
+import report_store
+from benchmark_streaming import write_json
+from kidney_biopsy_report_generator import ReportGeneratorApp
+from report_cache import cache_path
+
+DEFAULT_SIZES = [7000, 100000]
+
+
+def load_once():
+    """Seconds until the loader has handed over every record and the index"""
+    load_queue = queue.Queue()
+    start = time.perf_counter()
+    ReportGeneratorApp._load_worker(load_queue, ReportGeneratorApp.LOAD_BATCH_SIZE)
+    elapsed = time.perf_counter() - start
+    records = 0
+    while not load_queue.empty():
+        message = load_queue.get()
+        if message[0] == 'batch':
+            records += len(message[1])
+        elif message[0] == 'error':
+            raise RuntimeError(message[1])
+    return elapsed, records
+
+
+def main(sizes):
+    work_dir = tempfile.mkdtemp()
+    report_store.DATA_DIR = work_dir
+    try:
+        for count in sizes:
+            json_path = os.path.join(work_dir, report_store.JSON_FILENAME)
+            write_json(json_path, count)
+            if os.path.exists(cache_path(json_path)):
+                os.remove(cache_path(json_path))
+
+            # The cold run includes writing the cache for the warm one
+            cold, records = load_once()
+            warm, cached_records = load_once()
+            assert records == cached_records == count, (records, cached_records, count)
+            print(f"{count} records: cold {cold:.2f}s, warm {warm:.2f}s ({cold / warm:.1f}x), "
+                  f"cache {os.path.getsize(cache_path(json_path)) / 1e6:.1f} MB")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Benchmark parse_reports.py: DOM ingest vs streaming iterparse ingest
+
+Builds synthetic SpreadsheetML workbooks of increasing size and converts each
+one with both modes. Every run happens in a fresh interpreter so the peak
+memory figures do not leak between runs.
+
+Usage:
+    python benchmark_parse_reports.py [row_count ...]
+"""
+import subprocess
+import tempfile
+import time
+import sys
+import os
+from xml.sax.saxutils import escape
+
+import parse_reports
+
+DEFAULT_SIZES = [1000, 5000, 20000]
+
+HEADERS = ["ID", "Receipt Date", "Year", "CR No.", "Biopsy No.", "Ward No.", "Name",
+           "Age", "Referred by", "Sex", "Reference No.", "Speciment Received", "Report",
+           "Impression", "Note", "Addendum", "Reported By", "Date of Report",
+           "Keywords", "ICD Code"]
+
+REPORT_TEXT = ("Light microscopy shows 14 glomeruli with mild mesangial expansion. "
+               "No crescents or necrosis. Tubules show focal atrophy with mild "
+               "interstitial fibrosis. Immunofluorescence: IgA 2+ mesangial.")
+
+
+def write_workbook(path, row_count):
+    """Write a SpreadsheetML workbook with a header row and row_count reports"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0"?>\n')
+        f.write(f'<Workbook xmlns="{parse_reports.SS_NS}" xmlns:ss="{parse_reports.SS_NS}">\n')
+        f.write('<Worksheet ss:Name="Reports"><Table>\n')
+        for i in range(row_count + 1):
+            if i == 0:
+                values = HEADERS
+            else:
+                values = [str(i), "01-02-2018", "2018", f"CR{i}", f"KB-{i}/18", "Neph",
+                          f"Patient {i}", "40 years", "Dr. Test", "Male", f"REF{i}",
+                          "Kidney core", REPORT_TEXT, "IgA nephropathy", "", "",
+                          "Dr. Pathologist", "05-02-2018", "IgAN", "N02.8"]
+            cells = ''.join(f'<Cell><Data ss:Type="String">{escape(v)}</Data></Cell>'
+                            for v in values)
+            f.write(f'<Row>{cells}</Row>\n')
+        f.write('</Table></Worksheet></Workbook>\n')
+
+
+def run_child(mode, xml_file, json_file):
+    """Convert one workbook and print 'seconds peak_bytes' for the parent"""
+    import tracemalloc
+    import json
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    if mode == 'stream':
+        parse_reports.write_rows_json(parse_reports.iter_rows(xml_file), json_file)
+    else:
+        rows_data = parse_reports.parse_rows(xml_file)
+        with open(json_file, 'w') as f:
+            json.dump(rows_data, f, indent=2)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{elapsed} {peak}")
+
+
+def measure(mode, xml_file, json_file):
+    """Run one conversion in a fresh interpreter and return (seconds, peak_bytes)"""
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), '--child', mode, xml_file, json_file],
+        cwd=os.path.dirname(os.path.abspath(__file__)), text=True)
+    elapsed, peak = output.split()
+    return float(elapsed), int(peak)
+
+
+def main(sizes):
+    print(f"{'Rows':>8} | {'Mode':<6} | {'Wall time':>10} | {'Peak memory':>12}")
+    print("-" * 48)
+    with tempfile.TemporaryDirectory() as tmp:
+        for row_count in sizes:
+            xml_file = os.path.join(tmp, f'reports_{row_count}.xls')
+            json_file = os.path.join(tmp, f'reports_{row_count}.json')
+            write_workbook(xml_file, row_count)
+            for mode in ('dom', 'stream'):
+                elapsed, peak = measure(mode, xml_file, json_file)
+                print(f"{row_count:>8} | {mode:<6} | {elapsed:>9.2f}s | {peak / 1e6:>9.1f} MB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == '--child':
+        run_child(sys.argv[2], sys.argv[3], sys.argv[4])
+    else:
+        main([int(n) for n in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Benchmark the memory held by the loaded record map
+
+Builds the GUI's data_map (Biopsy No. -> record) from the same rows three
+times and reports the Python heap it occupies (tracemalloc, after loading):
+    dict per row    {header: value} for every record (previous behavior)
+    ReportRecord    value tuple + shared header map, repeated values shared
+    hot projection  LazyReportRecord: only the columns outside COLD_HEADERS,
+                    the long free text read back from the file per record
+and the time to read one record's cold columns back.
+
+Usage:
+    python benchmark_record_memory.py [record_count ... | reports_data.json]      default 7000 100000
+"""
+import gc
+import os
+import random
+import time
+import shutil
+import tempfile
+import tracemalloc
+import sys
+
+from benchmark_streaming import write_json
+from report_store import iter_table, iter_json_records, record_maker
+
+DEFAULT_SIZES = [7000, 100000]
+
+
+def table_rows(json_path):
+    return iter_table(json_path, os.path.join(os.path.dirname(json_path), 'missing.db'))
+
+
+def dict_records(json_path):
+    headers, rows = table_rows(json_path)
+    return ({headers[i]: (row[i] if i < len(row) else '') for i in range(len(headers))} for row in rows)
+
+
+def compact_records(json_path):
+    headers, rows = table_rows(json_path)
+    return map(record_maker(headers, share_values=True), rows)
+
+
+def hot_records(json_path):
+    headers, cold, numbered = iter_json_records(json_path)
+    make_record = cold.record_maker(share_values=True)
+    return (make_record(key, row) for key, row in numbered)
+
+
+def loaded_size(json_path, build):
+    """(MB held by the data_map built from json_path, the data_map)"""
+    gc.collect()
+    tracemalloc.start()
+    data_map = {}
+    for record in build(json_path):
+        biopsy_num = record.get('Biopsy No.')
+        if biopsy_num:
+            data_map[str(biopsy_num)] = record
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / 1e6, data_map
+
+
+def report(json_path):
+    before, old_map = loaded_size(json_path, dict_records)
+    del old_map
+    after, new_map = loaded_size(json_path, compact_records)
+    del new_map
+    hot, hot_map = loaded_size(json_path, hot_records)
+    print(f"{len(hot_map)} records: dict per row {before:.1f} MB, ReportRecord {after:.1f} MB "
+          f"({before / after:.1f}x smaller), hot projection {hot:.1f} MB ({before / hot:.1f}x smaller)")
+
+    sample = random.Random(0).sample(list(hot_map.values()), min(1000, len(hot_map)))
+    start = time.perf_counter()
+    for record in sample:
+        record.full()
+    print(f"  reading the cold columns back: {(time.perf_counter() - start) / len(sample) * 1e6:.0f} us per record")
+
+
+def main(args):
+    if args and args[0].endswith('.json'):
+        report(args[0])
+        return
+    work_dir = tempfile.mkdtemp()
+    try:
+        for count in [int(arg) for arg in args] or DEFAULT_SIZES:
+            json_path = os.path.join(work_dir, 'reports_data.json')
+            write_json(json_path, count)
+            report(json_path)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
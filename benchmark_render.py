@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Benchmark the compiled report layouts for every PDF caller
+
+Times the three ways a report gets rendered, each with and without
+serializing the PDF:
+    GUI single    build_report_pdf(form values)          (Generate PDF button)
+    GUI bulk      form_values(record) -> FORM_REPORT      (Bulk Generate from IDs)
+    batch script  BULK_REPORT.render(record)              (generate_individual_pdfs.py)
+and the fixed-layout fast writer for both layouts. Then times records
+that need the embedded Unicode font (report_fonts.py, when installed)
+against fpdf's own add_font per report, and finally runs
+create_patient_report end to end (PDF plus both files on disk) with and
+without --fast.
+
+Usage:
+    python benchmark_render.py [record_count]      default 300, e.g. 7000
+"""
+import os
+import shutil
+import tempfile
+import time
+import sys
+
+from benchmark_search import make_records
+from report_renderer import FORM_REPORT, BULK_REPORT, form_values, build_report_pdf, pdf_bytes
+from fast_report_writer import FAST_FORM_REPORT, FAST_BULK_REPORT
+from generate_individual_pdfs import create_patient_report
+from report_fonts import UNICODE_FONT_FAMILY, unicode_font_files
+from fpdf import FPDF
+
+DEFAULT_COUNT = 300
+
+
+def time_per_record(func, records):
+    start = time.perf_counter()
+    for record in records:
+        func(record)
+    return (time.perf_counter() - start) / len(records)
+
+
+def main(count):
+    records = list(make_records(count).values())
+    forms = [form_values(record) for record in records]
+    cases = [
+        ("GUI single", build_report_pdf, forms),
+        ("GUI bulk", lambda record: FORM_REPORT.render(form_values(record)), records),
+        ("batch script", BULK_REPORT.render, records),
+    ]
+    print(f"{count} records, plan sizes: form {len(FORM_REPORT.plan)} ops, "
+          f"bulk {len(BULK_REPORT.plan)} ops")
+    print(f"  {'Caller':<13} | {'Layout':>10} | {'Layout+bytes':>12}")
+    for name, render, inputs in cases:
+        layout = time_per_record(render, inputs)
+        full = time_per_record(lambda item: pdf_bytes(render(item)), inputs)
+        print(f"  {name:<13} | {layout * 1000:>8.2f}ms | {full * 1000:>10.2f}ms")
+
+    print(f"  {'Fast writer':<13} | {'':>10} | {'PDF bytes':>12} | {'Fallbacks':>9}")
+    for name, writer, inputs in (("GUI single", FAST_FORM_REPORT, forms),
+                                 ("batch script", FAST_BULK_REPORT, records)):
+        full = time_per_record(writer.render_bytes, inputs)
+        print(f"  {name:<13} | {'':>10} | {full * 1000:>10.3f}ms | {writer.fallbacks:>9}")
+
+    font_files = unicode_font_files()
+    if font_files:
+        unicode_records = [dict(record, Name="Łukasz Ševčík " + record['Name']) for record in records]
+
+        def add_font_per_report(record):
+            pdf = FPDF()
+            for style, path in font_files.items():
+                pdf.add_font(UNICODE_FONT_FAMILY, style, path, uni=True)
+            pdf.add_page()
+            BULK_REPORT._run(pdf, BULK_REPORT.plan, BULK_REPORT._text(record), UNICODE_FONT_FAMILY)
+            return pdf_bytes(pdf)
+
+        print(f"  {'Unicode font':<13} | {'':>10} | {'PDF bytes':>12}")
+        for name, render, inputs in (
+                ("core font", lambda record: pdf_bytes(BULK_REPORT.render(record)), records),
+                ("cached TTF", lambda record: pdf_bytes(BULK_REPORT.render(record)), unicode_records),
+                ("add_font", add_font_per_report, unicode_records[:50])):
+            full = time_per_record(render, inputs)
+            print(f"  {name:<13} | {'':>10} | {full * 1000:>10.3f}ms")
+
+    headers = list(records[0])
+    rows = [[record[header] for header in headers] for record in records]
+    work_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(work_dir, 'out'))
+    try:
+        print(f"  {'create_patient_report':<27} | {'Per record':>12}")
+        for fast in (False, True):
+            start = time.perf_counter()
+            for report_num, row in enumerate(rows, start=1):
+                create_patient_report(row, report_num, headers, os.path.join(work_dir, 'out'),
+                                      os.path.join(work_dir, 'year'), fast=fast)
+            elapsed = (time.perf_counter() - start) / len(rows)
+            print(f"  {'--fast' if fast else 'FPDF':<27} | {elapsed * 1000:>10.3f}ms")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COUNT)
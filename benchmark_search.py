@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Benchmark the Reports Database global search
+
+Compares the old per-keystroke scan (str(value).lower() substring test over
+every field of every record) with ReportSearchIndex prefix lookups, on
+synthetic record sets of increasing size.
+
+Usage:
+    python benchmark_search.py [record_count ...]      e.g. 7000 1000000
+"""
+import random
+import time
+import sys
+
+from report_search import ReportSearchIndex
+
+DEFAULT_SIZES = [7000, 100000]
+
+QUERIES = ['l', 'lu', 'lupus', 'lupus neph', 'kb-1234', 'igg', 'ram kumar', 'zzz']
+
+NAMES = ['Ram Kumar', 'Sita Devi', 'Asha Rani', 'Mohan Lal', 'Priya Sharma', 'Anil Gupta']
+IMPRESSIONS = ['IgA nephropathy', 'Lupus nephritis class IV', 'Focal segmental glomerulosclerosis',
+               'Minimal change disease', 'Membranous nephropathy', 'Acute tubular injury']
+FINDINGS = ['Light microscopy shows 12 glomeruli.', 'IF: IgG 2+, C3 2+ along capillary walls.',
+            'Tubular atrophy and interstitial fibrosis of 10%.', 'No crescents are seen.',
+            'Mesangial proliferation is present.', 'Arterioles show hyaline change.']
+
+
+def make_records(count):
+    """Synthetic records keyed by biopsy number"""
+    rng = random.Random(7)
+    records = {}
+    for i in range(count):
+        biopsy_num = f"KB-{i}/{16 + i % 4}"
+        records[biopsy_num] = {
+            'ID': str(i), 'Biopsy No.': biopsy_num, 'Name': rng.choice(NAMES),
+            'Age': f"{rng.randint(5, 80)} years", 'Sex': rng.choice(['Male', 'Female']),
+            'Receipt Date': f"{rng.randint(1, 28):02d}-{rng.randint(1, 12):02d}-2018",
+            'Report': ' '.join(rng.choice(FINDINGS) for _ in range(rng.randint(3, 10))),
+            'Impression': rng.choice(IMPRESSIONS), 'Keywords': rng.choice(IMPRESSIONS),
+            'Note': '', 'ICD Code': f"N0{rng.randint(0, 9)}.{rng.randint(0, 9)}",
+        }
+    return records
+
+
+def scan(records, search_text):
+    """The previous filter_database_view matching loop"""
+    matches = []
+    for biopsy_num, record in records.items():
+        for field_value in record.values():
+            if search_text in str(field_value).lower():
+                matches.append(biopsy_num)
+                break
+    return matches
+
+
+def best_of(func, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(sizes):
+    for count in sizes:
+        records = make_records(count)
+        start = time.perf_counter()
+        index = ReportSearchIndex.build(records)
+        build_time = time.perf_counter() - start
+        print(f"\n{count} records - index built in {build_time:.2f}s "
+              f"({len(index.vocabulary)} distinct tokens)")
+        print(f"  {'Query':<12} | {'Scan':>10} | {'Index cold':>10} | {'Index warm':>10} | {'Hits':>7}")
+        for query in QUERIES:
+            scan_time = best_of(lambda: scan(records, query), repeat=1)
+            index._prefix_cache.clear()
+            start = time.perf_counter()
+            hits = index.search(query)
+            cold = time.perf_counter() - start
+            warm = best_of(lambda: index.search(query))
+            print(f"  {query:<12} | {scan_time * 1000:>8.2f}ms | {cold * 1000:>8.3f}ms | "
+                  f"{warm * 1000:>8.3f}ms | {len(hits):>7}")
+
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or DEFAULT_SIZES)
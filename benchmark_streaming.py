@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Benchmark memory use of loading vs streaming the report records
+
+Writes a synthetic reports_data.json (and migrates it to SQLite), then
+walks every data row once and reports the peak Python heap for:
+    load_table      whole table in memory (previous bulk-run behavior)
+    iter_table      rows streamed from the cursor / incremental JSON parser
+
+Usage:
+    python benchmark_streaming.py [record_count ...]      default 7000 100000
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import sys
+
+from benchmark_search import make_records
+from report_store import load_table, iter_table, migrate_json
+
+DEFAULT_SIZES = [7000, 100000]
+
+
+def write_json(path, count):
+    """reports_data.json with count synthetic records, written row by row"""
+    records = make_records(count)
+    headers = list(next(iter(records.values())))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[' + json.dumps(headers))
+        for record in records.values():
+            f.write(',\n' + json.dumps([record[h] for h in headers]))
+        f.write(']')
+
+
+def measure(read):
+    """(rows seen, peak heap in MB, seconds) for one pass over read()'s rows"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    headers, rows = read()
+    count = sum(1 for _ in rows)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, peak / 1e6, elapsed
+
+
+def main(sizes):
+    work_dir = tempfile.mkdtemp()
+    try:
+        for count in sizes:
+            json_path = os.path.join(work_dir, 'reports_data.json')
+            db_path = os.path.join(work_dir, 'reports_data.db')
+            missing_db = os.path.join(work_dir, 'missing.db')
+            write_json(json_path, count)
+            migrate_json(json_path, db_path)
+
+            print(f"{count} records ({os.path.getsize(json_path) / 1e6:.1f} MB of JSON)")
+            print(f"  {'Source':<7} | {'Reader':<11} | {'Peak heap':>9} | {'Time':>7}")
+            for source, kwargs in (('JSON', {'json_path': json_path, 'db_path': missing_db}),
+                                   ('SQLite', {'db_path': db_path})):
+                for name, reader in (('load_table', load_table), ('iter_table', iter_table)):
+                    rows, peak, elapsed = measure(lambda: reader(**kwargs))
+                    assert rows == count, (rows, count)
+                    print(f"  {source:<7} | {name:<11} | {peak:>7.1f}MB | {elapsed:>6.2f}s")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
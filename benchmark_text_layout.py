@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Benchmark the share of render time spent laying out multi_cell text
+
+Renders synthetic records through the batch layout (FPDF) and the fast
+writer, with the sections laid out by:
+    fpdf multi_cell   FPDF's per-character loop (the previous renderer)
+    uncached          text_layout's bisect line breaking, LRU cache off
+    cached            text_layout with the per-paragraph LRU cache
+and reports wall time per report plus, from a cProfile pass, the share
+of render time spent in multi_cell layout.
+
+Usage:
+    python benchmark_text_layout.py [record_count]      default 2000
+"""
+import cProfile
+import pstats
+import time
+import sys
+
+import text_layout
+from benchmark_search import make_records
+from report_renderer import BULK_REPORT, ReportLayout, pdf_bytes
+from fast_report_writer import FAST_BULK_REPORT
+
+DEFAULT_COUNT = 2000
+
+# Functions whose cumulative time counts as text layout
+LAYOUT_FUNCTIONS = ('_multi_cell', 'previous_multi_cell')
+
+
+def previous_multi_cell(pdf, h, value):
+    """The renderer's MULTI step before text_layout"""
+    pdf.multi_cell(0, h, value)
+
+
+def run(render, records, reset, repeat=3):
+    """(best seconds per report, share of profiled time in text layout)
+
+    reset() runs before every pass (it empties the paragraph cache).
+    """
+    per_report = None
+    for _ in range(repeat):
+        reset()
+        start = time.perf_counter()
+        for record in records:
+            render(record)
+        elapsed = (time.perf_counter() - start) / len(records)
+        per_report = elapsed if per_report is None else min(per_report, elapsed)
+
+    reset()
+    profile = cProfile.Profile()
+    profile.enable()
+    for record in records:
+        render(record)
+    profile.disable()
+    stats = pstats.Stats(profile).stats
+    total = sum(tt for _, _, tt, _, _ in stats.values())
+    layout = sum(ct for (_, _, name), (_, _, _, ct, _) in stats.items() if name in LAYOUT_FUNCTIONS)
+    return per_report, layout / total
+
+
+def main(count):
+    records = list(make_records(count).values())
+    cached = text_layout.wrap_paragraph
+    current = ReportLayout.__dict__['_multi_cell']
+    print(f"{count} records")
+    print(f"  {'Renderer':<12} | {'Text layout':<16} | {'Per report':>10} | {'Layout share':>12}")
+    try:
+        for name, render in (("FPDF", lambda record: pdf_bytes(BULK_REPORT.render(record))),
+                             ("fast writer", FAST_BULK_REPORT.render_bytes)):
+            for mode in ("fpdf multi_cell", "uncached", "cached"):
+                if mode == "fpdf multi_cell" and name != "FPDF":
+                    continue
+                ReportLayout._multi_cell = (staticmethod(previous_multi_cell) if mode == "fpdf multi_cell"
+                                            else current)
+                text_layout.wrap_paragraph = cached if mode == "cached" else cached.__wrapped__
+                per_report, share = run(render, records, cached.cache_clear)
+                print(f"  {name:<12} | {mode:<16} | {per_report * 1000:>8.3f}ms | {share * 100:>11.1f}%")
+        info = cached.cache_info()
+        print(f"  paragraph cache: {info.hits} hits, {info.misses} misses, "
+              f"{info.currsize}/{info.maxsize} entries")
+    finally:
+        ReportLayout._multi_cell = current
+        text_layout.wrap_paragraph = cached
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COUNT)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Benchmark pipelined disk writes on slow storage
+
+Simulates a network share by adding a fixed latency to every file write,
+then compares for the same records:
+    render only         PDF bytes, nothing written (the upper bound)
+    render + write      write each PDF right after rendering it (previous behavior)
+    pipelined           writes handed to a ReportWriterPool of N threads
+
+Usage:
+    python benchmark_write_pipeline.py [record_count] [write_latency_ms]      default 500 10
+"""
+import os
+import shutil
+import tempfile
+import time
+import sys
+
+from benchmark_search import make_records
+from report_renderer import BULK_REPORT, pdf_bytes
+from write_pipeline import ReportWriterPool, atomic_write
+
+DEFAULT_COUNT = 500
+DEFAULT_LATENCY_MS = 10
+WRITER_COUNTS = [1, 2, 4, 8]
+
+
+def main(count, latency_ms):
+    records = list(make_records(count).values())
+    latency = latency_ms / 1000.0
+    work_dir = tempfile.mkdtemp()
+
+    def render(record):
+        return pdf_bytes(BULK_REPORT.render(record))
+
+    def slow_write(data, path):
+        time.sleep(latency)
+        atomic_write(path, data)
+
+    def target(i):
+        return os.path.join(work_dir, f"{i}.pdf")
+
+    try:
+        print(f"{count} records, {latency_ms} ms per file write")
+        print(f"  {'Mode':<22} | {'Total':>8} | {'Reports/s':>9}")
+
+        def report(name, elapsed):
+            print(f"  {name:<22} | {elapsed:>7.2f}s | {count / elapsed:>9.0f}")
+
+        start = time.perf_counter()
+        for record in records:
+            render(record)
+        report("render only", time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for i, record in enumerate(records):
+            slow_write(render(record), target(i))
+        report("render + write", time.perf_counter() - start)
+
+        for writers in WRITER_COUNTS:
+            start = time.perf_counter()
+            pool = ReportWriterPool(slow_write, writers)
+            for i, record in enumerate(records):
+                pool.submit(i, render(record), target(i))
+            errors = [error for _, error in pool.close() if error]
+            report(f"pipelined, {writers} writer{'s' if writers > 1 else ''}", time.perf_counter() - start)
+            if errors:
+                print(f"    {len(errors)} writes failed: {errors[0]}")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COUNT,
+         float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_LATENCY_MS)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+Append-only checkpoint journal for resumable bulk PDF exports
+
+A bulk job writes one JSON line per finished record to a journal file in
+its output folder. Lines are buffered and flushed (and fsync'd) in batches,
+so a crashed or killed job loses at most one batch. Starting the same job
+again with resume enabled skips every record the journal lists as done;
+failed records are retried. The journal is deleted once a job completes.
+
+Journal lines:
+    {"job": "<job id>"}                      first line
+    {"ok": "<key>", "hash": "<digest>"}      record written
+    {"fail": "<key>", "error": "<message>"}  record failed
+"""
+import hashlib
+import json
+import os
+
+JOURNAL_FILENAME = 'bulk_export.journal'
+
+# Journal lines buffered before they are written and synced to disk
+DEFAULT_FLUSH_EVERY = 50
+
+
+def job_signature(parts):
+    """Identify a bulk job by what it exports and where"""
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def read_journal(path):
+    """Return (job_id, {key: hash}) of completed records, or (None, {})
+
+    A torn last line from a killed process is ignored.
+    """
+    job_id = None
+    completed = {}
+    if not os.path.exists(path):
+        return job_id, completed
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if 'job' in entry:
+                job_id = entry['job']
+            elif 'ok' in entry:
+                completed[entry['ok']] = entry.get('hash')
+            elif 'fail' in entry:
+                completed.pop(entry['fail'], None)
+    return job_id, completed
+
+
+class CheckpointJournal:
+    """Journal for one bulk job; see the module docstring for the format"""
+
+    def __init__(self, path, job_id, completed, flush_every=DEFAULT_FLUSH_EVERY):
+        self.path = path
+        self.job_id = job_id
+        self.completed = completed
+        self.flush_every = flush_every
+        self._buffer = []
+        self._file = None
+
+    @classmethod
+    def open(cls, path, job_id, resume=False, flush_every=DEFAULT_FLUSH_EVERY):
+        """Open the journal for job_id, keeping earlier progress if resume is set
+
+        Progress recorded for a different job is discarded.
+        """
+        previous_job, completed = read_journal(path) if resume else (None, {})
+        journal = cls(path, job_id, completed if previous_job == job_id else {}, flush_every)
+        if previous_job == job_id:
+            journal._file = open(path, 'a', encoding='utf-8')
+        else:
+            journal._file = open(path, 'w', encoding='utf-8')
+            journal._buffer.append({'job': job_id})
+            journal.flush()
+        return journal
+
+    def is_done(self, key, digest=None):
+        """True when key finished in an earlier run (from the same data, if digest is given)"""
+        if key not in self.completed:
+            return False
+        return digest is None or self.completed[key] == digest
+
+    def mark_done(self, key, digest=None):
+        self.completed[key] = digest
+        self._append({'ok': key, 'hash': digest})
+
+    def mark_failed(self, key, error):
+        self.completed.pop(key, None)
+        self._append({'fail': key, 'error': str(error)[:200]})
+
+    def _append(self, entry):
+        self._buffer.append(entry)
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """Write buffered lines and sync them to disk"""
+        if not self._buffer or self._file is None:
+            return
+        self._file.write(''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in self._buffer))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._buffer = []
+
+    def close(self):
+        """Flush and close, keeping the journal so the job can be resumed"""
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def finish(self):
+        """The job completed: close and delete the journal"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+"""
+Export a cohort of kidney biopsy reports as one PDF
+
+Selects the reports of a year and/or a referring physician (or all of
+them) and streams them into a single document, in export order, instead
+of one file per case:
+    - every report starts on a new page, laid out exactly like the
+      one-PDF-per-case export (fast_report_writer, page breaks included)
+    - the two fonts and the report title block are stored once and shared
+      by all pages (the title block as a form XObject)
+    - each report gets an outline bookmark, and a table of contents with
+      page numbers and links comes first
+Records are streamed from the store (narrowed by its indexes) or parsed
+from reports_data.json one by one, never loaded as a whole table. Pages
+are compressed and written to disk as soon as they are laid out; only the
+offset of each object and a title and page index per report
+(compact arrays) are kept until the end, so memory grows by a few bytes
+per page instead of with the page content.
+
+Usage:
+    python cohort_export.py [--year YEAR] [--referred-by NAME] [--output FILE]
+"""
+import argparse
+import os
+import zlib
+from array import array
+from datetime import datetime
+from fpdf import FPDF_VERSION
+from fpdf.fonts import fpdf_charwidths
+from report_store import iter_selection, parse_query, parse_year
+from fast_report_writer import FAST_BULK_REPORT, escape
+
+# Output directory
+COHORT_DIR = r'g:\dr_vinita\xml convert\Cohort_Reports'
+
+# Table of contents layout (mm / pt)
+TOC_TITLE = "TABLE OF CONTENTS"
+TOC_LINE_HEIGHT = 6
+TOC_FONT_SIZE = 9
+
+# Fixed objects: 1 page tree, 2 page resources, 3 outline root,
+# 4 title block XObject, 5.. fonts
+PAGES_OBJ = 1
+RESOURCES_OBJ = 2
+OUTLINES_OBJ = 3
+HEAD_OBJ = 4
+FIRST_FONT_OBJ = 5
+
+
+def text_string(text):
+    """PDF text string for outline titles (UTF-16 when not latin-1)"""
+    try:
+        text.encode('latin-1')
+        return '(' + escape(text) + ')'
+    except UnicodeEncodeError:
+        return '<FEFF' + text.encode('utf-16-be').hex().upper() + '>'
+
+
+def report_title(values):
+    """Bookmark / table of contents entry for a record"""
+    parts = [str(values.get(key) or '').strip() for key in ('ID', 'Name', 'Biopsy No.')]
+    title = ' - '.join(part for part in parts[:2] if part) or 'Report'
+    if parts[2]:
+        title += f" ({parts[2]})"
+    return title
+
+
+class CohortPdfWriter:
+    """Streams reports into one PDF file; call add_report() per record, then close()"""
+
+    def __init__(self, path, title, writer=FAST_BULK_REPORT):
+        self.path = path
+        self.title = title
+        self.writer = writer
+        self.created = datetime.now().strftime('%Y%m%d%H%M%S')
+        self.next_obj = FIRST_FONT_OBJ + len(writer.fonts)
+        self.offsets = array('q', [0] * self.next_obj)   # file offset of every object
+        self.page_objs = array('l')    # page object of every report page, in order
+        self.titles = []               # per report: bookmark title...
+        self.first_pages = array('l')  # ...and index of its first page
+        self.failed = 0
+        self._file = open(path, 'wb')
+        self._position = 0
+        self._write(b'%PDF-1.3\n')
+        self._write_shared()
+
+    def _write(self, data):
+        self._file.write(data)
+        self._position += len(data)
+
+    def _new_obj(self):
+        number = self.next_obj
+        self.next_obj += 1
+        self.offsets.append(0)
+        return number
+
+    def _put(self, number, body):
+        """Write object number with a latin-1 body (without obj/endobj)"""
+        self.offsets[number] = self._position
+        self._write(b'%d 0 obj\n' % number + body.encode('latin-1') + b'\nendobj\n')
+
+    def _put_stream(self, number, content, extra=''):
+        """Write latin-1 bytes as a compressed stream object"""
+        stream = zlib.compress(content)
+        self.offsets[number] = self._position
+        self._write(b'%d 0 obj\n<<%s/Filter /FlateDecode /Length %d>>\nstream\n'
+                    % (number, extra.encode('latin-1'), len(stream)) + stream + b'\nendstream\nendobj\n')
+
+    def _write_shared(self):
+        """Fonts, resources and the title block shared by every page"""
+        writer = self.writer
+        font_refs = ''
+        self.font_numbers = {}
+        for key, number in sorted(writer.fonts.items(), key=lambda item: item[1]):
+            obj = FIRST_FONT_OBJ + number - 1
+            self.font_numbers[key] = number
+            self._put(obj, '<</Type /Font\n/BaseFont /%s\n/Subtype /Type1\n/Encoding /WinAnsiEncoding\n>>'
+                      % writer.core_fonts[key])
+            font_refs += '/F%d %d 0 R\n' % (number, obj)
+        if 'helvetica' not in self.font_numbers:
+            # The table of contents is set in regular Helvetica
+            self.font_numbers['helvetica'] = len(self.font_numbers) + 1
+            obj = self._new_obj()
+            self._put(obj, '<</Type /Font\n/BaseFont /Helvetica\n/Subtype /Type1\n'
+                           '/Encoding /WinAnsiEncoding\n>>')
+            font_refs += '/F%d %d 0 R\n' % (self.font_numbers['helvetica'], obj)
+        self._put(RESOURCES_OBJ, '<<\n/ProcSet [/PDF /Text /ImageB /ImageC /ImageI]\n/Font <<\n'
+                  + font_refs + '>>\n/XObject <<\n/H1 %d 0 R\n>>\n>>' % HEAD_OBJ)
+        self._put_stream(HEAD_OBJ, writer.static_head.encode('latin-1'),
+                         '/Type /XObject /Subtype /Form /BBox [0 0 %.2f %.2f] /Resources %d 0 R '
+                         % (writer.w_pt, writer.h_pt, RESOURCES_OBJ))
+        # Text state does not survive the XObject, so select the font again after it
+        self.head = '/H1 Do\n' + (writer.head_font_op + '\n' if writer.head_font_op else '')
+
+    def add_report(self, values):
+        """Lay out one record on new pages; returns False if it could not be rendered"""
+        try:
+            pages = [content.encode('latin-1')
+                     for content in self.writer.page_contents(values, self.created, head=self.head)]
+        except UnicodeEncodeError:
+            self.failed += 1
+            return False
+        self.titles.append(report_title(values))
+        self.first_pages.append(len(self.page_objs))
+        for content in pages:
+            content_obj = self._new_obj()
+            self._put_stream(content_obj, content)
+            page_obj = self._new_obj()
+            self._put(page_obj, '<</Type /Page\n/Parent %d 0 R\n/Resources %d 0 R\n/Contents %d 0 R>>'
+                      % (PAGES_OBJ, RESOURCES_OBJ, content_obj))
+            self.page_objs.append(page_obj)
+        return True
+
+    def _dest(self, page_obj):
+        return '[%d 0 R /XYZ 0 %.2f null]' % (page_obj, self.writer.h_pt)
+
+    def _write_toc(self):
+        """Table of contents pages (placed first in the page tree); returns their page objects"""
+        writer = self.writer
+        k = writer.k
+        font_size = TOC_FONT_SIZE / k
+        widths = fpdf_charwidths['helvetica']
+        bold_op = 'BT /F%d 14.00 Tf ET' % self.font_numbers.get('helveticaB', self.font_numbers['helvetica'])
+        font_op = 'BT /F%d %.2f Tf ET' % (self.font_numbers['helvetica'], TOC_FONT_SIZE)
+        x_text = (writer.l_margin + writer.c_margin) * k
+        right = writer.l_margin + writer.width - writer.c_margin
+
+        # Entries per page, the first page also holding the title lines
+        y_first = writer.t_margin + 8 + TOC_LINE_HEIGHT + 4
+        per_page = int((writer.page_break_trigger - writer.t_margin) // TOC_LINE_HEIGHT)
+        first_page = int((writer.page_break_trigger - y_first) // TOC_LINE_HEIGHT)
+        remaining = max(0, len(self.titles) - first_page)
+        toc_pages = 1 + -(-remaining // per_page)
+
+        toc_objs = []
+        index = 0
+        for page in range(toc_pages):
+            out = [writer.page_start]
+            y = writer.t_margin
+            if page == 0:
+                out.append(bold_op + '\n')
+                out.append('BT %.2f %.2f Td (%s) Tj ET\n' % (x_text, (writer.page_h - (y + 4 + .3 * 14 / k)) * k,
+                                                              escape(TOC_TITLE)))
+                out.append(font_op + '\n')
+                y += 8
+                out.append('BT %.2f %.2f Td (%s) Tj ET\n'
+                           % (x_text, (writer.page_h - (y + 3 + .3 * font_size)) * k,
+                              escape(self.title.encode('latin-1', 'replace').decode('latin-1'))))
+                y += TOC_LINE_HEIGHT + 4
+            else:
+                out.append(font_op + '\n')
+            links = []
+            end = first_page if page == 0 else index + per_page
+            while index < min(end, len(self.titles)):
+                title = self.titles[index].encode('latin-1', 'replace').decode('latin-1')
+                first = self.first_pages[index]
+                number = str(toc_pages + first + 1)
+                baseline = (writer.page_h - (y + .5 * TOC_LINE_HEIGHT + .3 * font_size)) * k
+                number_x = right - sum(widths.get(c, 0) for c in number) * font_size / 1000.0
+                out.append('BT %.2f %.2f Td (%s) Tj ET\n' % (x_text, baseline, escape(title)))
+                out.append('BT %.2f %.2f Td (%s) Tj ET\n' % (number_x * k, baseline, number))
+                links.append('<</Type /Annot /Subtype /Link /Rect [%.2f %.2f %.2f %.2f] /Border [0 0 0] '
+                             '/Dest %s>>' % (writer.l_margin * k, (writer.page_h - y) * k,
+                                             (writer.l_margin + writer.width) * k,
+                                             (writer.page_h - y - TOC_LINE_HEIGHT) * k,
+                                             self._dest(self.page_objs[first])))
+                y += TOC_LINE_HEIGHT
+                index += 1
+            content_obj = self._new_obj()
+            self._put_stream(content_obj, ''.join(out).encode('latin-1'))
+            page_obj = self._new_obj()
+            annots = '\n/Annots [' + '\n'.join(links) + ']' if links else ''
+            self._put(page_obj, '<</Type /Page\n/Parent %d 0 R\n/Resources %d 0 R%s\n/Contents %d 0 R>>'
+                      % (PAGES_OBJ, RESOURCES_OBJ, annots, content_obj))
+            toc_objs.append(page_obj)
+        return toc_objs
+
+    def _write_outlines(self, toc_objs):
+        """One bookmark for the table of contents and one per report"""
+        count = len(self.titles) + 1
+        first = self.next_obj
+        for i in range(count):
+            number = self._new_obj()
+            if i == 0:
+                title, page_obj = "Table of Contents", toc_objs[0]
+            else:
+                title, page_obj = self.titles[i - 1], self.page_objs[self.first_pages[i - 1]]
+            links = ''
+            if i > 0:
+                links += '\n/Prev %d 0 R' % (number - 1)
+            if i + 1 < count:
+                links += '\n/Next %d 0 R' % (number + 1)
+            self._put(number, '<</Title %s\n/Parent %d 0 R%s\n/Dest %s>>'
+                      % (text_string(title), OUTLINES_OBJ, links, self._dest(page_obj)))
+        self._put(OUTLINES_OBJ, '<</Type /Outlines\n/First %d 0 R\n/Last %d 0 R\n/Count %d>>'
+                  % (first, first + count - 1, count))
+
+    def close(self):
+        """Write the table of contents, bookmarks, page tree and trailer"""
+        toc_objs = self._write_toc()
+        self._write_outlines(toc_objs)
+        # Page tree, written in slices so no page-sized string is built
+        page_count = len(toc_objs) + len(self.page_objs)
+        self.offsets[PAGES_OBJ] = self._position
+        self._write(b'%d 0 obj\n<</Type /Pages\n/Kids [' % PAGES_OBJ)
+        for kids in [toc_objs] + [self.page_objs[i:i + 1000] for i in range(0, len(self.page_objs), 1000)]:
+            self._write(''.join('%d 0 R ' % obj for obj in kids).encode('ascii'))
+        self._write(b']\n/Count %d\n/MediaBox [0 0 %.2f %.2f]\n>>\nendobj\n'
+                    % (page_count, self.writer.w_pt, self.writer.h_pt))
+        info_obj = self._new_obj()
+        self._put(info_obj, '<<\n/Producer (PyFPDF %s http://pyfpdf.googlecode.com/)\n/Title %s\n'
+                            '/CreationDate (D:%s)\n>>' % (FPDF_VERSION, text_string(self.title), self.created))
+        catalog_obj = self._new_obj()
+        self._put(catalog_obj, '<<\n/Type /Catalog\n/Pages %d 0 R\n/Outlines %d 0 R\n/PageMode /UseOutlines\n'
+                               '/OpenAction [%d 0 R /FitH null]\n/PageLayout /OneColumn\n>>'
+                  % (PAGES_OBJ, OUTLINES_OBJ, toc_objs[0]))
+
+        xref_offset = self._position
+        self._write(b'xref\n0 %d\n0000000000 65535 f \n' % self.next_obj)
+        for start in range(1, self.next_obj, 1000):
+            self._write(''.join('%010d 00000 n \n' % offset
+                                for offset in self.offsets[start:start + 1000]).encode('ascii'))
+        self._write(b'trailer\n<<\n/Size %d\n/Root %d 0 R\n/Info %d 0 R\n>>\nstartxref\n%d\n%%%%EOF\n'
+                    % (self.next_obj, catalog_obj, info_obj, xref_offset))
+        self._file.close()
+        return page_count
+
+
+def select_records(headers, data_rows, year=None, referred_by=None):
+    """Yield the record dicts of the cohort, in export order"""
+    year = str(year).strip() if year else None
+    referred_by = referred_by.strip().lower() if referred_by else None
+    for row in data_rows:
+        record = dict(zip(headers, row))
+        if year and str(record.get('Year', '')).strip() != year:
+            continue
+        if referred_by and str(record.get('Referred by', '')).strip().lower() != referred_by:
+            continue
+        yield record
+
+
+def cohort_query(year=None, referred_by=None):
+    """Bulk query (report_store.parse_query) narrowing the cohort through the
+    store's indexes; select_records() still applies the exact match"""
+    criteria = {}
+    if year and parse_year(year) is not None:
+        criteria['year_from'] = criteria['year_to'] = year
+    if referred_by and referred_by.strip():
+        criteria['referred_by'] = referred_by
+    return parse_query(criteria)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a cohort of reports as one PDF")
+    parser.add_argument('--year', help="only reports of this year")
+    parser.add_argument('--referred-by', help="only reports from this referring physician")
+    parser.add_argument('--output', help="PDF file to write (default: in the cohort directory)")
+    args = parser.parse_args(argv)
+
+    parts = []
+    if args.year:
+        parts.append(f"Year {args.year}")
+    if args.referred_by:
+        parts.append(f"Referred by {args.referred_by}")
+    title = "Kidney Biopsy Reports - " + (", ".join(parts) or "All")
+    output = args.output
+    if not output:
+        os.makedirs(COHORT_DIR, exist_ok=True)
+        name = '_'.join(parts).replace(' ', '_').replace('.', '') or 'All'
+        output = os.path.join(COHORT_DIR, f"Cohort_{name}.pdf")
+
+    # Stream the matching rows; only the report being written is held
+    headers, numbered = iter_selection(cohort_query(args.year, args.referred_by))
+    data_rows = (row for _, row in numbered)
+
+    print(f"Writing {title} to {output}...")
+    cohort = CohortPdfWriter(output, title)
+    try:
+        for record in select_records(headers, data_rows, args.year, args.referred_by):
+            if cohort.add_report(record) and len(cohort.titles) % 500 == 0:
+                print(f"Progress: {len(cohort.titles)} reports, {len(cohort.page_objs)} pages")
+    finally:
+        page_count = cohort.close()
+
+    print(f"\n{'='*70}")
+    print(f"COHORT EXPORT COMPLETE")
+    print(f"{'='*70}")
+    print(f"Reports: {len(cohort.titles)}")
+    print(f"Failed: {cohort.failed}")
+    print(f"Pages (including table of contents): {page_count}")
+    print(f"File: {output} ({os.path.getsize(output) / 1024:.0f} KB)")
+    print(f"{'='*70}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Content-hash manifest for incremental bulk PDF exports
+
+The manifest maps each output report (keyed by its set of output paths,
+see output_key()) to a hash of the record it was rendered from plus the
+template version, and to the files written for it. On a rerun, records
+whose hash matches and whose files still exist are skipped; entries for
+records that no longer exist are pruned together with their files.
+
+Several entries can list the same file (two records with one file name in
+different years share the flat copy but not their year copies); a file is
+only deleted once no entry lists it any more.
+"""
+import hashlib
+import json
+import os
+
+MANIFEST_FILENAME = 'export_manifest.json'
+
+
+def record_hash(headers, row_data, template_version):
+    """Stable hash of a record's contents and the layout it is rendered with"""
+    payload = json.dumps([template_version, headers, row_data], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def output_key(files, roots):
+    """Manifest key of a report written to files: each path relative to its
+    output root (files[i] lies under roots[i]), joined with '|'"""
+    return '|'.join(os.path.relpath(path, root).replace(os.sep, '/') for path, root in zip(files, roots))
+
+
+def remove_file(path):
+    """Delete a file if it is still there"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ExportManifest:
+    """Output file name -> {'hash': ..., 'files': [...]} saved as JSON"""
+
+    def __init__(self, path, template_version):
+        self.path = path
+        self.template_version = template_version
+        self.entries = {}
+        self.seen = set()
+        self.owners = {}      # file path -> number of entries listing it
+
+    @classmethod
+    def load(cls, path, template_version):
+        """Load the manifest at path, or start an empty one"""
+        manifest = cls(path, template_version)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest.entries = json.load(f).get('entries', {})
+        for entry in manifest.entries.values():
+            manifest._own(entry['files'], 1)
+        return manifest
+
+    def _own(self, files, change):
+        for path in files:
+            self.owners[path] = self.owners.get(path, 0) + change
+
+    def _release(self, files):
+        """Drop one claim on each file, deleting files no entry lists any more"""
+        self._own(files, -1)
+        for path in files:
+            if self.owners.get(path, 0) <= 0:
+                self.owners.pop(path, None)
+                remove_file(path)
+
+    def is_current(self, key, digest, files):
+        """True when key was rendered from digest into files that still exist"""
+        self.seen.add(key)
+        entry = self.entries.get(key)
+        return (entry is not None and entry['hash'] == digest and entry['files'] == files
+                and all(os.path.exists(path) for path in files))
+
+    def record(self, key, digest, files):
+        """Note a successful render, removing files the entry no longer lists
+        (unless another entry still does)"""
+        self.seen.add(key)
+        self._own(files, 1)
+        old = self.entries.get(key)
+        if old:
+            self._release(old['files'])
+        self.entries[key] = {'hash': digest, 'files': files}
+
+    def prune(self):
+        """Drop entries not seen during this run and delete their files"""
+        orphans = [key for key in self.entries if key not in self.seen]
+        for key in orphans:
+            self._release(self.entries.pop(key)['files'])
+        return len(orphans)
+
+    def save(self):
+        """Write the manifest atomically (temp file + replace)"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'template_version': self.template_version, 'entries': self.entries}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+"""
+Fast fixed-layout PDF writer for the compiled report layouts
+
+FPDF builds every report through its full object model: a document buffer
+grown line by line, per-call font lookups and a fresh header, page tree,
+font and catalog section for each file. Our reports are a single A4 page
+in two core fonts, so all of that is the same for every record.
+
+FastReportWriter takes a compiled ReportLayout and pre-builds, once:
+    - the file skeleton (page, page tree, fonts, resources, catalog) with
+      the byte offsets of every object relative to the content stream
+    - the PDF operators of every plan step, with x positions, font
+      switches, labels and centered static text already formatted
+Per record it only lays out the text (reproducing FPDF's cell and
+multi_cell positioning and line breaking exactly), compresses the content
+stream and patches the stream length, the xref offsets and the creation
+date. The resulting PDFs show the same text at the same positions as
+FPDF's.
+
+Records the fast path cannot handle are rendered with FPDF instead:
+text that would overflow onto a second page and text outside latin-1
+(which FPDF's core fonts reject with the same error either way).
+"""
+import zlib
+from datetime import datetime
+from fpdf import FPDF, FPDF_VERSION
+from fpdf.fonts import fpdf_charwidths
+from report_renderer import (FONT_FAMILY, FONT, LINE, ROW, SPACE, SECTION, MULTI, STAMP,
+                             FORM_REPORT, BULK_REPORT, pdf_bytes)
+from text_layout import wrap_text
+
+# Objects of a one-page FPDF document: 1 page tree, 2 resources, 3 page,
+# 4 page content, then one per font, the info dictionary and the catalog
+FIRST_FONT_OBJ = 5
+
+
+class FastPathUnsupported(Exception):
+    """The record does not fit the pre-built single-page layout"""
+
+
+def escape(text):
+    """Escape a string for a PDF literal, as FPDF does"""
+    return text.replace('\\', '\\\\').replace(')', '\\)').replace('(', '\\(').replace('\r', '\\r')
+
+
+class FastReportWriter:
+    """Renders records of one ReportLayout straight to PDF bytes"""
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.fallbacks = 0
+        self._stamp = (None, None, None, None)
+
+        # Page geometry, taken from FPDF itself so positions match exactly
+        ref = FPDF()
+        ref.add_page()
+        self.k = ref.k
+        self.page_h = ref.h
+        self.t_margin = ref.t_margin
+        self.l_margin = ref.l_margin
+        self.c_margin = ref.c_margin
+        self.width = ref.w - ref.r_margin - ref.l_margin
+        self.page_break_trigger = ref.page_break_trigger
+        self.page_start = '2 J\n%.2f w\n' % (ref.line_width * ref.k)
+        self.w_pt, self.h_pt = ref.w_pt, ref.h_pt
+        self.core_fonts = ref.core_fonts
+
+        self.fonts = {}     # FPDF font key -> (resource number, base font name)
+        self.plan = self._compile(layout.plan, [None])
+        self._build_prefix()
+        self._build_skeleton()
+
+    def _font(self, style, size):
+        """Font switch operator and metrics of a (style, size) pair"""
+        key = FONT_FAMILY.lower() + style
+        if key not in self.fonts:
+            self.fonts[key] = len(self.fonts) + 1
+        font_size = size / self.k
+        return ((style, size), 'BT /F%d %.2f Tf ET' % (self.fonts[key], size),
+                fpdf_charwidths[key], font_size)
+
+    def _compile(self, plan, font):
+        """Bind fonts and fixed positions to the layout's render plan
+
+        font is a one-item list holding the (key, operator, widths, size)
+        in effect, shared with nested sections.
+        """
+        k = self.k
+        x_text = '%.2f' % ((self.l_margin + self.c_margin) * k)
+        x_value = '%.2f' % ((self.l_margin + 40 + self.c_margin) * k)
+        ops = []
+        for op in plan:
+            code = op[0]
+            if code == FONT:
+                font[0] = self._font(op[1], op[2])
+                ops.append((FONT, font[0][0], font[0][1]))
+            elif code == LINE:
+                h, text, align = op[1], op[2], op[3]
+                font_key, _, widths, font_size = font[0]
+                if align == 'C':
+                    text_width = sum(widths.get(c, 0) for c in text) * font_size / 1000.0
+                    x = '%.2f' % ((self.l_margin + (self.width - text_width) / 2.0) * k)
+                else:
+                    x = x_text
+                ops.append((LINE, h, .5 * h, .3 * font_size,
+                            'BT %s ' % x, ' Td (%s) Tj ET' % escape(text) if text else None))
+            elif code == ROW:
+                h, label, field, max_length = op[1], op[2], op[3], op[4]
+                font_size = font[0][3]
+                ops.append((ROW, h, .5 * h, .3 * font_size, 'BT %s ' % x_text,
+                            ' Td (%s) Tj ET' % escape(label), 'BT %s ' % x_value,
+                            field, max_length))
+            elif code == SPACE:
+                ops.append(op)
+            elif code == SECTION:
+                # A skipped section leaves the outer font in place; the plan
+                # switches fonts explicitly wherever that matters
+                ops.append((SECTION, op[1], op[2], self._compile(op[3], font)))
+            elif code == MULTI:
+                (style, _), _, _, font_size = font[0]
+                wmax = (self.width - 2 * self.c_margin) * 1000.0 / font_size
+                ops.append((MULTI, op[1], op[2], op[3], .5 * op[1], .3 * font_size,
+                            FONT_FAMILY.lower() + style, font_size, wmax, 'BT %s ' % x_text))
+            elif code == STAMP:
+                font_size = font[0][3]
+                ops.append((STAMP, op[1], .5 * op[1], .3 * font_size, font[0][2], font_size))
+        return tuple(ops)
+
+    def _build_prefix(self):
+        """Pre-format the leading part of the page whose positions never vary
+
+        Everything before the first free-text section sits at fixed y
+        positions, so it becomes static operator text with slots for the
+        row values. self.rest is the remaining plan, run per record.
+        self.static_head is the operator text before the first slot (after
+        the page setup) and head_font_op the font switch in effect after it.
+        """
+        k = self.k
+        y = self.t_margin
+        font_key = font_op = None
+        self.head_font_op = None
+        pieces = [self.page_start]
+        position = 0
+        for position, op in enumerate(self.plan):
+            code = op[0]
+            if code == FONT:
+                if font_key != op[1]:
+                    font_key, font_op = op[1], op[2]
+                    pieces.append(op[2] + '\n')
+            elif code == LINE:
+                if y + op[1] > self.page_break_trigger:
+                    break
+                if op[5] is not None:
+                    pieces.append(op[4] + '%.2f' % ((self.page_h - (y + op[2] + op[3])) * k) + op[5] + '\n')
+                y += op[1]
+            elif code == ROW:
+                if y + op[1] > self.page_break_trigger:
+                    break
+                y_text = '%.2f' % ((self.page_h - (y + op[2] + op[3])) * k)
+                if self.head_font_op is None:
+                    self.head_font_op = font_op
+                pieces.append(op[4] + y_text + op[5] + '\n')
+                pieces.append((op[7], op[8], op[6] + y_text + ' Td ('))
+                y += op[1]
+            elif code == SPACE:
+                y += op[1]
+            else:
+                break
+        else:
+            position = len(self.plan)
+        if self.head_font_op is None:
+            self.head_font_op = font_op
+
+        # Merge neighbouring static pieces
+        self.prefix = []
+        for piece in pieces:
+            if isinstance(piece, str) and self.prefix and isinstance(self.prefix[-1], str):
+                self.prefix[-1] += piece
+            else:
+                self.prefix.append(piece)
+        self.static_head = self.prefix[0][len(self.page_start):]
+        self.prefix_state = (y, font_key, font_op)
+        self.rest = self.plan[position:]
+
+    def _build_skeleton(self):
+        """Pre-serialize everything around the page content stream"""
+        self.head = (b'%PDF-1.3\n'
+                     b'3 0 obj\n<</Type /Page\n/Parent 1 0 R\n/Resources 2 0 R\n/Contents 4 0 R>>\nendobj\n'
+                     b'4 0 obj\n<</Filter /FlateDecode /Length ')
+        self.page_offset = 9
+        self.content_offset = self.head.index(b'4 0 obj')
+
+        objects = [(1, '1 0 obj\n<</Type /Pages\n/Kids [3 0 R ]\n/Count 1\n'
+                       '/MediaBox [0 0 %.2f %.2f]\n>>\nendobj\n' % (self.w_pt, self.h_pt))]
+        font_refs = ''
+        for key, number in sorted(self.fonts.items(), key=lambda item: item[1]):
+            obj = FIRST_FONT_OBJ + number - 1
+            objects.append((obj, '%d 0 obj\n<</Type /Font\n/BaseFont /%s\n/Subtype /Type1\n'
+                                 '/Encoding /WinAnsiEncoding\n>>\nendobj\n' % (obj, self.core_fonts[key])))
+            font_refs += '/F%d %d 0 R\n' % (number, obj)
+        objects.append((2, '2 0 obj\n<<\n/ProcSet [/PDF /Text /ImageB /ImageC /ImageI]\n/Font <<\n'
+                           + font_refs + '>>\n/XObject <<\n>>\n>>\nendobj\n'))
+        self.info_obj = FIRST_FONT_OBJ + len(self.fonts)
+        self.catalog_obj = self.info_obj + 1
+
+        # Offsets of the objects after the content stream, relative to its end
+        self.tail = ''.join(text for _, text in objects).encode('latin-1')
+        self.tail_offsets = {}
+        position = 0
+        for obj, text in objects:
+            self.tail_offsets[obj] = position
+            position += len(text)
+        self.info_head = ('%d 0 obj\n<<\n/Producer (PyFPDF %s http://pyfpdf.googlecode.com/)\n'
+                          '/CreationDate (D:' % (self.info_obj, FPDF_VERSION)).encode('latin-1')
+        self.tail_offsets[self.info_obj] = position
+        info_length = len(self.info_head) + len('20000101000000)\n>>\nendobj\n')
+        self.tail_offsets[self.catalog_obj] = position + info_length
+        self.catalog = ('%d 0 obj\n<<\n/Type /Catalog\n/Pages 1 0 R\n/OpenAction [3 0 R /FitH null]\n'
+                        '/PageLayout /OneColumn\n>>\nendobj\n' % self.catalog_obj).encode('latin-1')
+
+        # Cross-reference table and trailer, leaving the offsets that move
+        # with the content stream length as %010d slots
+        xref_end = position + info_length + len(self.catalog)
+        self.xref = 'xref\n0 %d\n0000000000 65535 f \n' % (self.catalog_obj + 1)
+        self.xref_offsets = []
+        for obj in range(1, self.catalog_obj + 1):
+            if obj == 3:
+                self.xref += '%010d 00000 n \n' % self.page_offset
+            elif obj == 4:
+                self.xref += '%010d 00000 n \n' % self.content_offset
+            else:
+                self.xref += '%010d 00000 n \n'
+                self.xref_offsets.append(self.tail_offsets[obj])
+        self.xref += ('trailer\n<<\n/Size %d\n/Root %d 0 R\n/Info %d 0 R\n>>\nstartxref\n'
+                      % (self.catalog_obj + 1, self.catalog_obj, self.info_obj))
+        self.xref += '%d\n%%%%EOF\n'
+        self.xref_offsets.append(xref_end)
+
+    def render_bytes(self, values):
+        """PDF bytes of one record, falling back to FPDF when needed"""
+        created = datetime.now().strftime('%Y%m%d%H%M%S')
+        try:
+            content = self._layout(self.layout._text(values), created)[0].encode('latin-1')
+        except (FastPathUnsupported, UnicodeEncodeError):
+            self.fallbacks += 1
+            return pdf_bytes(self.layout.render(values))
+
+        stream = zlib.compress(content)
+        body = b''.join((self.head, str(len(stream)).encode('ascii'), b'>>\nstream\n',
+                         stream, b'\nendstream\nendobj\n'))
+        base = len(body)
+        xref = self.xref % tuple(base + offset for offset in self.xref_offsets)
+        return b''.join((body, self.tail, self.info_head, created.encode('ascii'),
+                         b')\n>>\nendobj\n', self.catalog, xref.encode('ascii')))
+
+    def page_contents(self, values, created, head=None):
+        """Content streams of every page one record takes, as latin-1 str
+
+        Unlike render_bytes, text that does not fit on one page continues on
+        new pages as FPDF's automatic page breaks would. created is the
+        YYYYMMDDHHMMSS generation time; head, if given, replaces the static
+        head operators (e.g. with a shared form XObject).
+        """
+        return self._layout(self.layout._text(values), created, [], head)
+
+    def _layout(self, text, created, pages=None, head=None):
+        """Lay out one record, returning its page content streams
+
+        With pages=None the record must fit on one page, otherwise
+        FastPathUnsupported is raised; else finished pages go to pages.
+        """
+        out = []
+        missing = self.layout.missing
+        for piece in self.prefix:
+            if piece.__class__ is str:
+                if head is not None and piece is self.prefix[0]:
+                    piece = self.page_start + head
+                out.append(piece)
+                continue
+            field, max_length, start = piece
+            value = text[field]
+            if not value:
+                value = missing
+            elif max_length:
+                value = value[:max_length]
+            if value:
+                out.append(start + escape(value) + ') Tj ET\n')
+        # [y, current font key, its operator, finished pages or None]
+        state = list(self.prefix_state) + [pages]
+        self._run(self.rest, text, out, state, created)
+        if pages is None:
+            return [''.join(out)]
+        pages.append(''.join(out))
+        return pages
+
+    def _page_break(self, out, state):
+        """Continue on a new page as FPDF's automatic page break does; returns the new y"""
+        pages = state[3]
+        if pages is None:
+            raise FastPathUnsupported()
+        pages.append(''.join(out))
+        out[:] = [self.page_start]
+        if state[2] is not None:
+            out.append(state[2] + '\n')
+        return self.t_margin
+
+    def _run(self, plan, text, out, state, created):
+        k = self.k
+        page_h = self.page_h
+        trigger = self.page_break_trigger
+        missing = self.layout.missing
+        y = state[0]
+        for op in plan:
+            code = op[0]
+            if code == ROW:
+                h = op[1]
+                if y + h > trigger:
+                    y = self._page_break(out, state)
+                y_text = '%.2f' % ((page_h - (y + op[2] + op[3])) * k)
+                out.append(op[4] + y_text + op[5] + '\n')
+                value = text[op[7]]
+                if not value:
+                    value = missing
+                elif op[8]:
+                    value = value[:op[8]]
+                if value:
+                    out.append(op[6] + y_text + ' Td (' + escape(value) + ') Tj ET\n')
+                y += h
+            elif code == FONT:
+                if state[1] != op[1]:
+                    state[1], state[2] = op[1], op[2]
+                    out.append(op[2] + '\n')
+            elif code == LINE:
+                h = op[1]
+                if y + h > trigger:
+                    y = self._page_break(out, state)
+                if op[5] is not None:
+                    out.append(op[4] + '%.2f' % ((page_h - (y + op[2] + op[3])) * k) + op[5] + '\n')
+                y += h
+            elif code == SPACE:
+                y += op[1]
+            elif code == SECTION:
+                value = text[op[1]]
+                if value and value != missing and len(value) >= op[2]:
+                    state[0] = y
+                    self._run(op[3], text, out, state, created)
+                    y = state[0]
+            elif code == MULTI:
+                value = text[op[2]]
+                limit = op[3]
+                if limit and len(value) > limit:
+                    value = value[:limit] + "..."
+                y = self._multi_cell(op, value, y, out, state)
+            elif code == STAMP:
+                h = op[1]
+                if y + h > trigger:
+                    y = self._page_break(out, state)
+                head, tail = self._stamp_text(op, created)
+                out.append(head + '%.2f' % ((page_h - (y + op[2] + op[3])) * k) + tail)
+                y += h
+        state[0] = y
+
+    def _stamp_text(self, op, created):
+        """Centered "PDF Generated" line around its y position, kept for the current second"""
+        if self._stamp[:2] != (created, op):
+            c = created
+            stamp = f"PDF Generated: {c[0:4]}-{c[4:6]}-{c[6:8]} {c[8:10]}:{c[10:12]}:{c[12:14]}"
+            widths, font_size = op[4], op[5]
+            text_width = sum(widths.get(c, 0) for c in stamp) * font_size / 1000.0
+            x = self.l_margin + (self.width - text_width) / 2.0
+            self._stamp = (created, op, 'BT %.2f ' % (x * self.k), ' Td (%s) Tj ET\n' % escape(stamp))
+        return self._stamp[2:]
+
+    def _multi_cell(self, op, s, y, out, state):
+        """FPDF multi_cell(0, h, s) with justified wrapping; returns the new y
+
+        Line breaks come from the memoized text_layout.wrap_text.
+        """
+        _, h, _, _, half_h, text_drop, font_key, font_size, wmax, x_text = op
+        k = self.k
+        page_h = self.page_h
+        trigger = self.page_break_trigger
+        for line, ws, tw in wrap_text(s, font_key, font_size, wmax, k):
+            if tw:
+                out.append(tw + '\n')
+            if y + h > trigger:
+                # FPDF drops word spacing across the page break and restores it
+                if ws > 0:
+                    out.append('0 Tw\n')
+                y = self._page_break(out, state)
+                if ws > 0:
+                    out.append('%.3f Tw\n' % (ws * k))
+            if line:
+                out.append(x_text + '%.2f' % ((page_h - (y + half_h + text_drop)) * k)
+                           + ' Td (' + escape(line) + ') Tj ET\n')
+            y += h
+        return y
+
+
+# Built once per process, like the layouts they wrap
+FAST_FORM_REPORT = FastReportWriter(FORM_REPORT)
+FAST_BULK_REPORT = FastReportWriter(BULK_REPORT)
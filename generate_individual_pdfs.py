@@ -1,38 +1,82 @@
 #!/usr/bin/env python
 """
 Generate individual PDF reports for each kidney biopsy case using fpdf2
-"""
-import json
-import os
-from datetime import datetime
-from fpdf import FPDF
-import sys
 
-# Load the data
-print("Loading data...")
-with open(r'g:\dr_vinita\xml convert\reports_data.json', 'r', encoding='utf-8') as f:
-    rows_data = json.load(f)
+Usage:
+    python generate_individual_pdfs.py [--workers N] [--chunk-size N] [--incremental] [--resume] [--fast]
+                                       [--archive | --archive-per-year] [--layout flat|hash|year]
+                                       [--writers N] [--year-from Y] [--year-to Y] [--referred-by NAME]
+                                       [--keyword PREFIX] [--icd-code PREFIX] [--date-from D] [--date-to D]
+
+By default the reports are rendered one after another. With --workers N
+(0 = one per CPU core) the records are split into chunks of --chunk-size
+and rendered by a pool of N processes; the per-record results are
+aggregated into the same success/failure summary.
+
+Every run keeps export_manifest.json in the output directory. With
+--incremental, reports whose record and template are unchanged since the
+last run are skipped, and PDFs of records that no longer exist are removed.
+
+While a run is in progress, finished records are appended to a checkpoint
+journal in the output directory. If the run crashes or is killed, --resume
+continues from where it stopped without re-rendering finished PDFs.
 
-headers = rows_data[0] if rows_data else []
-data_rows = rows_data[1:] if len(rows_data) > 1 else []
+With --fast, reports are written by the pre-built fixed-layout writer in
+fast_report_writer.py instead of going through FPDF for every record;
+records it cannot lay out on one page still go through FPDF.
 
-# Create output directory
-output_dir = r'g:\dr_vinita\xml convert\Individual_PDF_Reports'
-os.makedirs(output_dir, exist_ok=True)
+With --archive, the PDFs are rendered in memory and streamed into a single
+ZIP archive (Individual_PDF_Reports.zip next to the output directory, each
+report stored once under Year_<year>/) instead of two files per report;
+--archive-per-year writes Year_<year>.zip archives into the year
+directory. Pull single reports back out with report_archive.py.
+
+--layout hash or --layout year spreads the main output directory over
+subdirectories (see output_layout.py) instead of one flat folder. Every run
+writes report_index.json there, mapping Report ID and Biopsy No. to each
+PDF's relative path.
+
+With --writers N, rendering and disk writes run as two stages: PDFs are
+rendered in memory and handed over a bounded queue to N writer threads
+that write them atomically (temp file + rename), so the CPU keeps
+rendering while slow storage catches up.
+
+Records are streamed from the SQLite store (or parsed incrementally from
+reports_data.json) as rendering consumes them, so memory use depends on
+--chunk-size and --workers, not on the number of records.
+
+The selection options (--year-from/--year-to, --referred-by, --keyword,
+--icd-code, --date-from/--date-to) export only the matching records; the
+SQLite store answers them from its indexes. A selective run adds to the
+output directory and never removes reports outside the selection.
+"""
+import argparse
+import os
+import threading
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from report_store import QUERY_CRITERIA, iter_selection, parse_query, describe_query
+from report_renderer import BULK_REPORT, pdf_bytes
+from fast_report_writer import FAST_BULK_REPORT
+from export_manifest import ExportManifest, MANIFEST_FILENAME, output_key, record_hash
+from checkpoint_journal import CheckpointJournal, JOURNAL_FILENAME, job_signature
+from report_archive import ReportArchiveWriter
+from output_layout import LAYOUTS, INDEX_FILENAME, ReportPathIndex, shard_subdir
+from write_pipeline import ReportWriterPool, atomic_write
+
+# Output directory
+OUTPUT_DIR = r'g:\dr_vinita\xml convert\Individual_PDF_Reports'
 
 # Directory for organized reports (by year)
-year_dir = r'g:\dr_vinita\xml convert\Reports_By_Year'
-os.makedirs(year_dir, exist_ok=True)
+YEAR_DIR = r'g:\dr_vinita\xml convert\Reports_By_Year'
+
+# Records sent to a worker process at a time
+DEFAULT_CHUNK_SIZE = 50
 
-print(f"Output directory: {output_dir}")
-print(f"Creating {len(data_rows)} individual PDF reports...")
-print("This may take several minutes...\n")
+# Bump whenever the PDF layout changes so incremental runs re-render everything
+TEMPLATE_VERSION = '1'
 
-# Counter for progress
-total_reports = len(data_rows)
-processed = 0
-successful = 0
-failed = 0
 
 def clean_text(text, max_length=None):
     """Clean and format text"""
@@ -45,181 +89,420 @@ def clean_text(text, max_length=None):
         return text[:max_length] + ("..." if len(text) > max_length else "")
     return text
 
-def create_patient_report(row_data, report_num, headers):
-    """Create a single PDF report"""
-    global successful, failed
+
+def write_report_files(data, filepath, year_filepath):
+    """Write the PDF to filepath and hardlink the year-organized copy to it
+
+    Both names always get a new file: the PDF is written under a temp name,
+    linked to the year copy and only then renamed over filepath. Writing
+    into an existing filepath would also change an earlier year copy still
+    linked to it (a record of another year with the same file name), and
+    linking from filepath itself could pick up a concurrent writer's file.
+    Falls back to writing the same buffer a second time on filesystems
+    without hardlink support.
+    """
+    tmp_path = f"{filepath}.{threading.get_ident()}.tmp"
+    year_tmp_path = f"{year_filepath}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        try:
+            os.link(tmp_path, year_tmp_path)
+        except OSError:
+            atomic_write(year_filepath, data)
+        else:
+            os.replace(year_tmp_path, year_filepath)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        for path in (tmp_path, year_tmp_path):
+            if os.path.lexists(path):
+                os.remove(path)
+        raise
+
+
+def extract_fields(row_data, headers):
+    """Map headers to cleaned values of a data row"""
+    fields = {}
+    for i, header in enumerate(headers):
+        if i < len(row_data):
+            fields[header] = clean_text(row_data[i])
+        else:
+            fields[header] = "N/A"
+    return fields
+
+
+def report_paths(fields, report_num, output_dir=OUTPUT_DIR, year_dir=YEAR_DIR, layout='flat'):
+    """Return (filepath, year_filepath) for a record's cleaned fields"""
+    # Create filename from case ID and patient name
+    case_id = fields.get('ID', f"Case_{report_num}")
+    patient_name = fields.get('Name', 'Unknown').replace(' ', '_')[:15]
+    year = fields.get('Year', '2016')
+    
+    # Create safe filename
+    filename = f"{case_id}_{patient_name}.pdf"
+    filepath = os.path.join(output_dir, shard_subdir(layout, case_id, year), filename)
+    
+    # Also save in year-based subdirectory
+    year_filepath = os.path.join(year_dir, f"Year_{year}", filename)
+    return filepath, year_filepath
+
+
+def report_bytes(row_data, headers, fast=False):
+    """Lay out one record with the compiled batch layout and serialize it"""
+    record = dict(zip(headers, row_data))
+    if fast:
+        return FAST_BULK_REPORT.render_bytes(record)
+    return pdf_bytes(BULK_REPORT.render(record))
+
+
+def save_report(data, filepath, year_filepath):
+    """Create the report's folders and write both copies of a rendered PDF"""
+    os.makedirs(os.path.dirname(year_filepath), exist_ok=True)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    write_report_files(data, filepath, year_filepath)
+
+
+def create_patient_report(row_data, report_num, headers, output_dir=OUTPUT_DIR, year_dir=YEAR_DIR,
+                          fast=False, layout='flat'):
+    """Create a single PDF report, raising on failure"""
+    # Extract data fields
+    fields = extract_fields(row_data, headers)
+    filepath, year_filepath = report_paths(fields, report_num, output_dir, year_dir, layout)
     
+    # Serialize once and save to both locations
+    save_report(report_bytes(row_data, headers, fast), filepath, year_filepath)
+
+
+def render_record(row_data, report_num, headers, output_dir=OUTPUT_DIR, year_dir=YEAR_DIR, fast=False,
+                  in_memory=False, layout='flat'):
+    """Render one record; returns (report_num, error message or None, PDF bytes or None)
+
+    With in_memory the PDF is returned instead of written to disk.
+    """
+    try:
+        if in_memory:
+            return report_num, None, report_bytes(row_data, headers, fast)
+        create_patient_report(row_data, report_num, headers, output_dir, year_dir, fast, layout)
+        return report_num, None, None
+    except Exception as e:
+        return report_num, str(e), None
+
+
+def render_chunk(chunk, headers, output_dir=OUTPUT_DIR, year_dir=YEAR_DIR, fast=False, in_memory=False,
+                 layout='flat'):
+    """Worker entry point: render a list of (report_num, row_data) pairs"""
+    return [render_record(row_data, report_num, headers, output_dir, year_dir, fast, in_memory, layout)
+            for report_num, row_data in chunk]
+
+
+def iter_results_serial(numbered, headers, output_dir, year_dir, fast=False, in_memory=False,
+                        layout='flat'):
+    """Render (report_num, row_data) pairs in this process, yielding
+    (report_num, error, data)"""
+    for report_num, row_data in numbered:
+        yield render_record(row_data, report_num, headers, output_dir, year_dir, fast, in_memory, layout)
+
+
+def iter_results_parallel(numbered, headers, output_dir, year_dir, workers, chunk_size, fast=False,
+                          in_memory=False, layout='flat'):
+    """Render (report_num, row_data) pairs on a process pool, yielding
+    (report_num, error, data) as chunks finish
+
+    numbered may be a lazy iterator; it is only read as chunks are submitted.
+    At most two chunks per worker are in flight, so the rows pickled for the
+    pool stay bounded however many records there are.
+    """
+    numbered = iter(numbered)
+    chunks = iter(lambda: list(islice(numbered, chunk_size)), [])
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for chunk in chunks:
+            pending.add(pool.submit(render_chunk, chunk, headers, output_dir, year_dir, fast, in_memory,
+                                    layout))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        for future in pending:
+            yield from future.result()
+
+
+def iter_results(numbered, headers, args, workers, in_memory=False):
+    """Serial or process-pool results for the parsed command line"""
+    if workers > 1:
+        print(f"Starting PDF generation on {workers} worker processes...")
+        return iter_results_parallel(numbered, headers, args.output_dir, args.year_dir,
+                                     workers, max(1, args.chunk_size), args.fast, in_memory, args.layout)
+    print(f"Starting PDF generation...")
+    return iter_results_serial(numbered, headers, args.output_dir, args.year_dir, args.fast, in_memory,
+                               args.layout)
+
+
+def write_pipelined(results, paths, writers, finished):
+    """Hand PDFs rendered in memory to a pool of writer threads
+
+    paths(report_num) gives (filepath, year_filepath). Yields
+    (report_num, error) as renders fail or writes finish; the bounded queue
+    makes rendering wait whenever the writers fall behind. Writes that
+    finish after the loop is interrupted (or the generator closed) are
+    passed to finished(report_num, error) instead, so they are recorded too.
+    """
+    pool = ReportWriterPool(save_report, writers)
+    pending = deque()
     try:
-        # Extract data fields
-        fields = {}
-        for i, header in enumerate(headers):
-            if i < len(row_data):
-                fields[header] = clean_text(row_data[i])
+        for report_num, error, data in results:
+            if error is None:
+                pool.submit(report_num, data, *paths(report_num))
             else:
-                fields[header] = "N/A"
-        
-        # Create filename from case ID and patient name
-        case_id = fields.get('ID', f"Case_{report_num}")
-        patient_name = fields.get('Name', 'Unknown').replace(' ', '_')[:15]
+                pending.append((report_num, error))
+            pending.extend(pool.completed())
+            while pending:
+                yield pending.popleft()
+        pending.extend(pool.close())
+        while pending:
+            yield pending.popleft()
+    finally:
+        # Interrupted: let the queued writes finish (they are atomic)
+        if pool.threads:
+            pending.extend(pool.close())
+        for report_num, error in pending:
+            finished(report_num, error)
+
+
+def export_archive(args, workers, query):
+    """--archive / --archive-per-year: stream the rendered PDFs into ZIP archives"""
+    if args.archive_per_year:
+        os.makedirs(args.year_dir, exist_ok=True)
+        archive = ReportArchiveWriter(year_dir=args.year_dir)
+    else:
+        path = os.path.normpath(args.output_dir) + '.zip'
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        archive = ReportArchiveWriter(path=path)
+    
+    # One report per archive member (year folder or year archive plus file
+    # name); like files on disk, a later record with the same name in the
+    # same year replaces an earlier one. A first pass over the records finds
+    # the winners, the second streams them into the renderer.
+    headers, selected = iter_selection(query)
+    members = {}
+    for report_num, row_data in selected:
+        fields = extract_fields(row_data, headers)
+        filename = os.path.basename(report_paths(fields, report_num)[0])
         year = fields.get('Year', '2016')
-        
-        # Create safe filename
-        filename = f"{case_id}_{patient_name}.pdf"
-        filepath = os.path.join(output_dir, filename)
-        
-        # Also save in year-based subdirectory
-        year_subdir = os.path.join(year_dir, f"Year_{year}")
-        os.makedirs(year_subdir, exist_ok=True)
-        year_filepath = os.path.join(year_subdir, filename)
-        
-        # Create PDF document
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Helvetica", "", 10)
-        
-        # Title
-        pdf.set_font("Helvetica", "B", 14)
-        pdf.cell(0, 8, "KIDNEY BIOPSY PATHOLOGY REPORT", ln=True, align="C")
-        pdf.set_font("Helvetica", "", 9)
-        pdf.cell(0, 6, "Department of Pathology - Medical Analysis Center", ln=True, align="C")
-        pdf.ln(4)
-        
-        # Report metadata section
-        pdf.set_font("Helvetica", "B", 10)
-        pdf.cell(0, 6, "PATIENT INFORMATION", ln=True)
-        pdf.set_font("Helvetica", "", 9)
-        
-        # Patient info table-like display
-        pdf.cell(40, 6, "Report ID:", border=0)
-        pdf.cell(0, 6, fields['ID'], ln=True, border=0)
-        
-        pdf.cell(40, 6, "Name:", border=0)
-        pdf.cell(0, 6, fields['Name'], ln=True, border=0)
-        
-        pdf.cell(40, 6, "Age:", border=0)
-        pdf.cell(0, 6, fields['Age'], ln=True, border=0)
-        
-        pdf.cell(40, 6, "Gender:", border=0)
-        pdf.cell(0, 6, fields['Sex'], ln=True, border=0)
-        
-        pdf.ln(2)
-        
-        # Case Details
-        pdf.set_font("Helvetica", "B", 10)
-        pdf.cell(0, 6, "CASE DETAILS", ln=True)
-        pdf.set_font("Helvetica", "", 9)
-        
-        pdf.cell(40, 6, "Receipt Date:", border=0)
-        pdf.cell(0, 6, fields['Receipt Date'], ln=True, border=0)
-        
-        pdf.cell(40, 6, "Biopsy No:", border=0)
-        pdf.cell(0, 6, fields['Biopsy No.'], ln=True, border=0)
-        
-        pdf.cell(40, 6, "Case Ref:", border=0)
-        pdf.cell(0, 6, fields['CR No.'], ln=True, border=0)
-        
-        pdf.cell(40, 6, "Ward:", border=0)
-        pdf.cell(0, 6, fields['Ward No.'], ln=True, border=0)
-        
-        pdf.cell(40, 6, "Referred By:", border=0)
-        pdf.cell(0, 6, fields['Referred by'], ln=True, border=0)
-        
-        pdf.ln(2)
-        
-        # Specimen & Findings
-        pdf.set_font("Helvetica", "B", 10)
-        pdf.cell(0, 6, "SPECIMEN & FINDINGS", ln=True)
-        pdf.set_font("Helvetica", "", 9)
-        
-        pdf.cell(40, 6, "Specimen:", border=0)
-        pdf.cell(0, 6, fields['Speciment Received'][:30], ln=True, border=0)
-        
-        pdf.ln(2)
-        
-        # Microscopic Findings
-        if fields['Report'] != 'N/A':
-            pdf.set_font("Helvetica", "B", 10)
-            pdf.cell(0, 6, "MICROSCOPIC FINDINGS", ln=True)
-            pdf.set_font("Helvetica", "", 9)
-            report_text = clean_text(fields['Report'], 500)
-            pdf.multi_cell(0, 5, report_text)
-            pdf.ln(2)
-        
-        # Impression
-        if fields['Impression'] != 'N/A':
-            pdf.set_font("Helvetica", "B", 10)
-            pdf.cell(0, 6, "PATHOLOGICAL IMPRESSION", ln=True)
-            pdf.set_font("Helvetica", "", 9)
-            impression_text = clean_text(fields['Impression'], 400)
-            pdf.multi_cell(0, 5, impression_text)
-            pdf.ln(2)
-        
-        # Clinical Notes
-        if fields['Note'] != 'N/A' and len(fields['Note']) > 2:
-            pdf.set_font("Helvetica", "B", 10)
-            pdf.cell(0, 6, "CLINICAL NOTES", ln=True)
-            pdf.set_font("Helvetica", "", 9)
-            notes_text = clean_text(fields['Note'], 300)
-            pdf.multi_cell(0, 5, notes_text)
-            pdf.ln(2)
-        
-        # Keywords
-        if fields['Keywords'] != 'N/A':
-            pdf.set_font("Helvetica", "B", 10)
-            pdf.cell(0, 6, "KEYWORDS/DIAGNOSIS", ln=True)
-            pdf.set_font("Helvetica", "", 9)
-            pdf.multi_cell(0, 5, fields['Keywords'])
-            pdf.ln(2)
-        
-        # Footer section
-        pdf.ln(2)
-        pdf.set_font("Helvetica", "B", 9)
-        pdf.cell(40, 6, "Reported By:", border=0)
-        pdf.cell(0, 6, fields['Reported By'], ln=True, border=0)
-        
-        pdf.cell(40, 6, "Report Date:", border=0)
-        pdf.cell(0, 6, fields['Date of Report'], ln=True, border=0)
-        
-        pdf.cell(40, 6, "ICD Code:", border=0)
-        pdf.cell(0, 6, fields['ICD Code'], ln=True, border=0)
-        
-        # Document timestamp
-        pdf.ln(3)
-        pdf.set_font("Helvetica", "", 8)
-        timestamp = f"PDF Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        pdf.cell(0, 6, timestamp, ln=True, align="C")
-        
-        # Save to both locations
-        pdf.output(filepath)
-        
-        # Copy to year subdirectory
-        pdf.output(year_filepath)
-        
-        successful += 1
-        return True
-        
-    except Exception as e:
-        failed += 1
-        print(f"Error creating report {report_num}: {str(e)[:50]}")
-        return False
-
-# Generate all reports
-print(f"Starting PDF generation for {total_reports} reports...")
-for idx, row_data in enumerate(data_rows):
-    processed += 1
-    if processed % 200 == 0:
-        percentage = (processed / total_reports * 100)
-        print(f"Progress: {processed}/{total_reports} ({percentage:.1f}%) - {successful} successful, {failed} failed")
+        members[archive.location(year, filename)] = (report_num, fields.get('ID', f"Case_{report_num}"),
+                                                     year, filename)
+    expected = {num: (report_id, year, filename)
+                for num, report_id, year, filename in members.values()}
+    del members
+    headers, selected = iter_selection(query)
+    numbered = ((num, row) for num, row in selected if num in expected)
+
+    print(f"Creating {len(expected)} PDF reports in ZIP archives...\n")
+    total_reports = len(expected)
+    processed = 0
+    successful = 0
+    failed = 0
+    try:
+        for report_num, error, data in iter_results(numbered, headers, args, workers, in_memory=True):
+            processed += 1
+            if error is None:
+                successful += 1
+                archive.add(*expected.pop(report_num), data)
+            else:
+                failed += 1
+                print(f"Error creating report {report_num}: {error[:50]}")
+
+            if processed % 200 == 0:
+                percentage = (processed / total_reports * 100)
+                print(f"Progress: {processed}/{total_reports} ({percentage:.1f}%) - {successful} successful, {failed} failed")
+    except BaseException:
+        # Interrupted: never move a truncated archive over a complete one
+        archive.abort()
+        raise
+    paths = archive.close()
+
+    print(f"\n{'='*70}")
+    print(f"REPORT GENERATION COMPLETE")
+    print(f"{'='*70}")
+    print(f"Total Reports Processed: {total_reports}")
+    print(f"Successfully Generated: {successful}")
+    print(f"Failed: {failed}")
+    print(f"\nArchives:")
+    for path in paths:
+        print(f"  • {path} ({os.path.getsize(path) / 1024:.0f} KB)")
+    print(f"{'='*70}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate one PDF per kidney biopsy report")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes (1 = serial, 0 = one per CPU core)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="records sent to a worker at a time")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--year-dir', default=YEAR_DIR)
+    parser.add_argument('--incremental', action='store_true',
+                        help="skip reports unchanged since the last run and remove orphans")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue an interrupted run from its checkpoint journal")
+    parser.add_argument('--fast', action='store_true',
+                        help="use the pre-built fixed-layout PDF writer (falls back to FPDF per record)")
+    archive_mode = parser.add_mutually_exclusive_group()
+    archive_mode.add_argument('--archive', action='store_true',
+                              help="write one ZIP archive instead of individual files")
+    archive_mode.add_argument('--archive-per-year', action='store_true',
+                              help="write one ZIP archive per year into the year directory")
+    parser.add_argument('--layout', choices=LAYOUTS, default='flat',
+                        help="subdirectory layout of the output directory (default: flat)")
+    parser.add_argument('--writers', type=int, default=0,
+                        help="writer threads for pipelined disk writes (0 = write while rendering)")
+    selection = parser.add_argument_group("selection", "export only the matching records")
+    selection.add_argument('--year-from', help="first year (inclusive)")
+    selection.add_argument('--year-to', help="last year (inclusive)")
+    selection.add_argument('--referred-by', help="referring physician, case-insensitive prefix")
+    selection.add_argument('--keyword', help="Any one of the comma-separated Keywords, case-insensitive prefix")
+    selection.add_argument('--icd-code', help="ICD code prefix")
+    selection.add_argument('--date-from', help="first receipt date, DD-MM-YYYY (inclusive)")
+    selection.add_argument('--date-to', help="last receipt date, DD-MM-YYYY (inclusive)")
+    args = parser.parse_args(argv)
+    try:
+        query = parse_query({name: getattr(args, name) for name in QUERY_CRITERIA})
+    except ValueError as e:
+        parser.error(str(e))
+    workers = args.workers or os.cpu_count() or 1
+    if (args.archive or args.archive_per_year) and (args.incremental or args.resume):
+        parser.error("archive output always writes complete archives; "
+                     "--incremental and --resume apply to individual files only")
+    if (args.archive or args.archive_per_year) and args.layout != 'flat':
+        parser.error("--layout applies to individual files only")
+    if (args.archive or args.archive_per_year) and args.writers:
+        parser.error("--writers applies to individual files only")
+
+    if args.archive or args.archive_per_year:
+        export_archive(args, workers, query)
+        return
+
+    # Stream the data (SQLite store if migrated, else reports_data.json)
+    print(f"Streaming records: {describe_query(query)}")
+    headers, selected = iter_selection(query)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    os.makedirs(args.year_dir, exist_ok=True)
+
+    # Compare every record with the manifest of the previous run
+    manifest = ExportManifest.load(os.path.join(args.output_dir, MANIFEST_FILENAME), TEMPLATE_VERSION)
     
-    create_patient_report(row_data, idx + 1, headers)
-
-print(f"\n{'='*70}")
-print(f"REPORT GENERATION COMPLETE")
-print(f"{'='*70}")
-print(f"Total Reports Processed: {total_reports}")
-print(f"Successfully Generated: {successful}")
-print(f"Failed: {failed}")
-print(f"\nOutput Locations:")
-print(f"  • Main directory: {output_dir}")
-print(f"  • Organized by year: {year_dir}")
-print(f"{'='*70}")
+    # Checkpoint journal of this run (or of the interrupted run being resumed)
+    job_id = job_signature([os.path.abspath(args.output_dir), os.path.abspath(args.year_dir),
+                            TEMPLATE_VERSION] + ([sorted(query.items())] if query else []))
+    journal = CheckpointJournal.open(os.path.join(args.output_dir, JOURNAL_FILENAME), job_id,
+                                     resume=args.resume)
+    
+    # ID / Biopsy No. -> relative path of every report present after the run
+    # (a selective run keeps the entries of the reports it does not touch)
+    if query:
+        path_index = ReportPathIndex.load(args.output_dir, args.layout)
+    else:
+        path_index = ReportPathIndex(args.output_dir, args.layout)
+    
+    # Records being rendered -> (key, digest, files, index entry); entries
+    # are added as records are read and dropped once they are finished
+    expected = {}
+    skipped = {'up_to_date': 0, 'resumed': 0}
+
+    def to_render():
+        """(report_num, row_data) of the streamed records that need rendering"""
+        for report_num, row_data in selected:
+            fields = extract_fields(row_data, headers)
+            files = list(report_paths(fields, report_num, args.output_dir, args.year_dir, args.layout))
+            # Not the bare file name: records of different years may share it
+            key = output_key(files, (args.output_dir, args.year_dir))
+            digest = record_hash(headers, row_data, TEMPLATE_VERSION)
+            index_entry = (fields.get('ID'), fields.get('Biopsy No.'),
+                           os.path.relpath(files[0], args.output_dir))
+            if manifest.is_current(key, digest, files) and args.incremental:
+                path_index.add(*index_entry)
+                skipped['up_to_date'] += 1
+                continue
+            if journal.is_done(key, digest) and all(os.path.exists(path) for path in files):
+                # Finished before the interruption
+                manifest.record(key, digest, files)
+                path_index.add(*index_entry)
+                skipped['resumed'] += 1
+                continue
+            expected[report_num] = (key, digest, files, index_entry)
+            yield report_num, row_data
+
+    print(f"Output directory: {args.output_dir}")
+    print(f"Creating individual PDF reports...")
+    print("This may take several minutes...\n")
+
+    # Counter for progress
+    processed = 0
+    successful = 0
+    failed = 0
+
+    def finish(report_num, error):
+        """Record one rendered (or failed) report"""
+        nonlocal processed, successful, failed
+        processed += 1
+        key, digest, files, index_entry = expected.pop(report_num)
+        if error is None:
+            successful += 1
+            manifest.record(key, digest, files)
+            path_index.add(*index_entry)
+            journal.mark_done(key, digest)
+        else:
+            failed += 1
+            journal.mark_failed(key, error)
+            print(f"Error creating report {report_num}: {error[:50]}")
+
+        if processed % 200 == 0:
+            print(f"Progress: {processed} reports - {successful} successful, {failed} failed")
+
+    # Generate all reports
+    if args.writers > 0:
+        print(f"Writing through {args.writers} writer threads")
+        results = write_pipelined(iter_results(to_render(), headers, args, workers, in_memory=True),
+                                  lambda report_num: expected[report_num][2], args.writers, finish)
+    else:
+        results = ((report_num, error)
+                   for report_num, error, _ in iter_results(to_render(), headers, args, workers))
+
+    try:
+        for report_num, error in results:
+            finish(report_num, error)
+
+        # Records deleted since the last run, only removed with --incremental
+        # (and unknown for a selective run)
+        orphans = manifest.prune() if args.incremental and not query else 0
+        journal.finish()
+    finally:
+        # Interrupted: record the writes still in flight before saving
+        results.close()
+        journal.close()
+        manifest.save()
+        path_index.save()
+
+    print(f"\n{'='*70}")
+    print(f"REPORT GENERATION COMPLETE")
+    print(f"{'='*70}")
+    print(f"Total Reports Processed: {processed}")
+    print(f"Successfully Generated: {successful}")
+    print(f"Failed: {failed}")
+    if args.incremental:
+        print(f"Up to date (skipped): {skipped['up_to_date']}")
+    if args.resume:
+        print(f"Already completed before interruption: {skipped['resumed']}")
+    if args.incremental:
+        print(f"Orphaned reports removed: {orphans}")
+    print(f"\nOutput Locations:")
+    print(f"  • Main directory: {args.output_dir} ({args.layout} layout)")
+    print(f"  • Path index: {os.path.join(args.output_dir, INDEX_FILENAME)}")
+    print(f"  • Organized by year: {args.year_dir}")
+    print(f"{'='*70}")
+
+
+if __name__ == "__main__":
+    main()
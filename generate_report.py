@@ -1,15 +1,10 @@
 #!/usr/bin/env python
-import json
 from collections import defaultdict
 from datetime import datetime
+from report_store import load_table
 
-# Load the extracted data
-with open(r'g:\dr_vinita\xml convert\reports_data.json', 'r') as f:
-    rows_data = json.load(f)
-
-# Extract headers and data
-headers = rows_data[0] if rows_data else []
-data_rows = rows_data[1:] if len(rows_data) > 1 else []
+# Load the extracted data (SQLite store if migrated, else reports_data.json)
+headers, data_rows = load_table()
 
 # Create analysis
 gender_count = defaultdict(int)
@@ -8,15 +8,15 @@ os.makedirs(out_dir, exist_ok=True)
 root = tk.Tk()
 root.withdraw()
 app = ReportGeneratorApp(root)
+app.wait_until_loaded()
 
 if not app.data_map:
     print('No records loaded from reports_data.json')
     root.destroy()
     raise SystemExit(1)
 
-first_id = next(iter(app.data_map.keys()))
-print('Using Report ID:', first_id)
-row = app.data_map[first_id]
+row = next(iter(app.data_map.values()))
+print('Using Report ID:', row.get('ID', ''))
 app.populate_fields_from_row(row)
 
 safe_name = f"{row.get('ID','')}_{row.get('Name','Unknown').replace(' ','_')}.pdf".replace('/','_').replace('\\','_')
@@ -5,12 +5,45 @@ Allows users to enter report details and generate PDF reports
 """
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
-from datetime import datetime
+import threading
+import queue
+import time
 import os
-from fpdf import FPDF
-import json
+from report_store import (JSON_FILENAME, find_data_file, open_store, iter_json_records, record_maker, full_record,
+                          JsonColdColumns, parse_query, describe_query, record_matches)
+from report_search import ReportSearchIndex
+from record_index import RecordIndex, IDENTIFIER_HEADERS
+from report_cache import load_cache, save_cache, source_signature
+from report_renderer import form_values, build_report_pdf, render_record_to_path
+from checkpoint_journal import CheckpointJournal, JOURNAL_FILENAME, job_signature, read_journal
+from output_layout import INDEX_FILENAME, ReportPathIndex, shard_subdir
 
 class ReportGeneratorApp:
+    # Extra rows inserted below the visible window of the database view
+    DB_OVERSCAN_ROWS = 5
+    
+    # How often the UI polls a running bulk job for progress (ms)
+    BULK_POLL_MS = 100
+    
+    # Records handed from the loader thread to the UI at a time, and how
+    # often the UI picks up loaded batches (ms)
+    LOAD_BATCH_SIZE = 500
+    LOAD_POLL_MS = 50
+    
+    # Bulk exports of at least this many IDs offer the hashed subfolder layout
+    BULK_SHARD_MIN_IDS = 500
+    
+    # Bulk query dialog: (criterion, label) in display order
+    BULK_QUERY_FIELDS = [
+        ('year_from', 'Year from'),
+        ('year_to', 'Year to'),
+        ('referred_by', 'Referred by (starts with)'),
+        ('keyword', 'Keywords (starts with)'),
+        ('icd_code', 'ICD Code (starts with)'),
+        ('date_from', 'Received from (DD-MM-YYYY)'),
+        ('date_to', 'Received to (DD-MM-YYYY)'),
+    ]
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Kidney Biopsy Report Generator")
@@ -36,14 +69,24 @@ class ReportGeneratorApp:
                          font=("Arial", 14, "bold"))
         title.pack(pady=10)
         
-        # Data map (ID -> row dict)
+        # Data map (row number in load order -> LazyReportRecord, a read-only
+        # record mapping holding the hot columns; the long free text is read
+        # from the data file on demand); duplicate Biopsy Numbers are separate entries
         self.data_map = {}
         
-        # Load data first
-        try:
-            self.load_reports_data()
-        except Exception:
-            self.data_map = {}
+        # ID / Biopsy No. / CR No. / Reference No. -> data_map keys
+        self.record_index = RecordIndex()
+        
+        # SQLite record store (None when only reports_data.json is available)
+        self.store = None
+        
+        # Full-text index for the database tab's global search
+        self.search_index = ReportSearchIndex()
+        
+        # Set while the loader thread is still reading reports
+        self.loading = False
+        self.load_thread = None
+        self.load_error = None
         
         # Create main notebook for two modes: Generator and Database
         self.main_notebook = ttk.Notebook(self.main_frame)
@@ -58,6 +101,9 @@ class ReportGeneratorApp:
         self.database_frame = ttk.Frame(self.main_notebook)
         self.main_notebook.add(self.database_frame, text="Reports Database")
         self.create_database_mode()
+        
+        # Read the reports in the background; the window is usable meanwhile
+        self.start_loading()
     
     def create_generator_mode(self):
         """Create the Report Generator mode with form tabs"""
@@ -65,11 +111,14 @@ class ReportGeneratorApp:
         toolbar = ttk.Frame(self.generator_frame)
         toolbar.pack(fill=tk.X, pady=4, padx=10)
 
-        ttk.Label(toolbar, text="Load Biopsy Number:").pack(side=tk.LEFT, padx=(4,2))
+        ttk.Label(toolbar, text="Load Biopsy No. / ID:").pack(side=tk.LEFT, padx=(4,2))
         self.load_id_entry = ttk.Entry(toolbar, width=20)
         self.load_id_entry.pack(side=tk.LEFT, padx=2)
         ttk.Button(toolbar, text="Load", command=self.load_by_id).pack(side=tk.LEFT, padx=4)
-        ttk.Button(toolbar, text="Bulk Generate", command=self.bulk_generate_from_ids).pack(side=tk.LEFT, padx=8)
+        self.bulk_btn = ttk.Button(toolbar, text="Bulk Generate", command=self.bulk_generate_from_ids)
+        self.bulk_btn.pack(side=tk.LEFT, padx=8)
+        self.bulk_query_btn = ttk.Button(toolbar, text="Bulk by Query...", command=self.bulk_generate_from_query)
+        self.bulk_query_btn.pack(side=tk.LEFT, padx=2)
         
         # Create notebook for form tabs
         self.notebook = ttk.Notebook(self.generator_frame)
@@ -122,6 +171,14 @@ class ReportGeneratorApp:
         
         ttk.Button(header_frame, text="Refresh", command=self.refresh_database_view).pack(side=tk.RIGHT, padx=5)
         
+        # Bulk export of the selected rows or of everything the search found
+        self.bulk_results_btn = ttk.Button(header_frame, text="Generate All Results",
+                                           command=self.bulk_generate_results)
+        self.bulk_results_btn.pack(side=tk.RIGHT, padx=5)
+        self.bulk_selected_btn = ttk.Button(header_frame, text="Generate Selected",
+                                            command=self.bulk_generate_selected)
+        self.bulk_selected_btn.pack(side=tk.RIGHT, padx=5)
+        
         # Search frame
         search_frame = ttk.Frame(self.database_frame)
         search_frame.pack(fill=tk.X, padx=10, pady=5)
@@ -140,19 +197,19 @@ class ReportGeneratorApp:
         tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
         # Create Treeview with scrollbars
-        tree_scroll_y = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
-        tree_scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
+        # The vertical scrollbar drives the virtual list, not the Treeview itself
+        self.db_scroll_y = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL,
+                                         command=self.on_db_scrollbar)
+        self.db_scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
         
         tree_scroll_x = ttk.Scrollbar(tree_frame, orient=tk.HORIZONTAL)
         tree_scroll_x.pack(side=tk.BOTTOM, fill=tk.X)
         
         self.db_tree = ttk.Treeview(tree_frame, 
-                                    yscrollcommand=tree_scroll_y.set,
                                     xscrollcommand=tree_scroll_x.set,
-                                    height=20)
+                                    height=20, selectmode='extended')
         self.db_tree.pack(fill=tk.BOTH, expand=True)
         
-        tree_scroll_y.config(command=self.db_tree.yview)
         tree_scroll_x.config(command=self.db_tree.xview)
         
         # Define columns
@@ -175,97 +232,220 @@ class ReportGeneratorApp:
         # Bind double-click to show preview
         self.db_tree.bind('<Double-1>', self.on_report_double_click)
         
+        # Virtual list navigation: wheel, keys and resizing
+        self.db_tree.bind('<MouseWheel>', self.on_db_mousewheel)
+        self.db_tree.bind('<Button-4>', self.on_db_mousewheel)
+        self.db_tree.bind('<Button-5>', self.on_db_mousewheel)
+        for key in ('<Up>', '<Down>', '<Prior>', '<Next>'):
+            self.db_tree.bind(key, self.on_db_key)
+        self.db_tree.bind('<<TreeviewSelect>>', self.on_db_select)
+        self.db_tree.bind('<ButtonPress-1>', self.on_db_click)
+        self.db_tree.bind('<Configure>', self.on_db_tree_configure)
+        
         # Info label (must be created BEFORE refresh_database_view())
         info_frame = ttk.Frame(self.database_frame)
         info_frame.pack(fill=tk.X, padx=10, pady=5)
         self.db_info_label = ttk.Label(info_frame, text="Loading reports...", 
                                        font=("Arial", 9))
         self.db_info_label.pack(side=tk.LEFT)
+        self.db_load_progress = ttk.Progressbar(info_frame, orient=tk.HORIZONTAL, length=200)
         
         # Store mapping for tree items (must be initialized BEFORE refresh)
         self.tree_item_map = {}
         
+        # Virtual list state: full result array and the window shown from it
+        self.db_results = []
+        self.db_offset = 0
+        self.db_visible_rows = 20
+        self.db_selected_key = None
+        self.db_selected_index = None   # position of db_selected_key in db_results
+        
+        # Multi-selection by record key, so it survives scrolling the window
+        self.db_selected_keys = set()
+        
         # Populate database view (now db_info_label and tree_item_map are initialized)
         self.refresh_database_view()
     
     def refresh_database_view(self):
         """Refresh the database view with all reports"""
-        # Clear existing items
-        for item in self.db_tree.get_children():
-            self.db_tree.delete(item)
-        
-        self.tree_item_map = {}
+        self.db_results = []
+        self.db_offset = 0
         
-        # Reload data
-        if not self.data_map:
-            self.load_reports_data()
+        # Reload data (the view is refreshed again once loading finishes)
+        if self.loading:
+            self.db_results = list(self.data_map)
+            self._render_db_window()
+            return
+        if not self.data_map and self.load_thread is not None:
+            self.start_loading()
+            return
         
         if not self.data_map:
+            self._render_db_window()
             self.db_info_label.config(text="No data loaded. Reports database is empty.")
             return
         
-        # Populate tree
-        count = 0
-        for biopsy_num, record in self.data_map.items():
-            report_id = record.get('ID', '')
-            name = record.get('Name', '') or record.get('Patient Name', '')
-            age = record.get('Age', '')
-            sex = record.get('Sex', '') or record.get('Gender', '')
-            receipt_date = record.get('Receipt Date', '')
-            
-            item_id = self.db_tree.insert('', 'end', text=report_id,
-                                         values=(biopsy_num, name, age, sex, receipt_date))
-            self.tree_item_map[item_id] = record
-            count += 1
+        # Populate tree (only the visible window is inserted)
+        self.db_results = list(self.data_map)
+        self._render_db_window()
         
-        self.db_info_label.config(text=f"Total Reports: {count} | Double-click any row to view details")
+        self.db_info_label.config(text=f"Total Reports: {len(self.db_results)} | Double-click any row to view details")
     
     def filter_database_view(self):
         """Filter database view with global search - searches ALL fields including report content, impressions, keywords, etc."""
         search_text = self.search_entry.get().lower().strip()
-        
-        # Clear current view
-        for item in self.db_tree.get_children():
-            self.db_tree.delete(item)
+        self.db_results = []
+        self.db_offset = 0
         
         if not self.data_map:
+            self._render_db_window()
             return
         
-        # Re-populate with filtered results - search entire record
-        count = 0
-        for biopsy_num, record in self.data_map.items():
+        if search_text and self.loading:
+            self._render_db_window()
+            self.db_info_label.config(text="Reports are still loading; search results will appear when done")
+            return
+        
+        # GLOBAL SEARCH: every word is prefix-matched against the full-text index,
+        # which covers ALL fields: Patient name, ID, Biopsy No, Age, Sex, Report
+        # content, Impression, Keywords, Clinical Notes, Case details, etc.
+        # Empty search shows all records
+        if search_text:
+            self.db_results = self.search_index.search(search_text)
+        else:
+            self.db_results = list(self.data_map)
+        
+        # Re-populate with filtered results
+        self._render_db_window()
+        count = len(self.db_results)
+        
+        # Update info label with search results
+        if search_text:
+            self.db_info_label.config(text=f"Global Search Results: Found {count} report(s) matching '{search_text}'")
+        else:
+            self.db_info_label.config(text=f"Total Reports: {count} | Double-click to view details")
+    
+    def _render_db_window(self):
+        """Show db_results[db_offset:] in the Treeview's fixed pool of rows
+        
+        The Treeview only ever holds the visible rows plus DB_OVERSCAN_ROWS;
+        scrolling re-labels those items instead of inserting one per record,
+        so refresh and filter cost does not grow with the dataset.
+        """
+        total = len(self.db_results)
+        self.db_offset = max(0, min(self.db_offset, total - self.db_visible_rows))
+        keys = self.db_results[self.db_offset:self.db_offset + self.db_visible_rows + self.DB_OVERSCAN_ROWS]
+        
+        # Grow or shrink the pool of row items to the window size
+        items = list(self.db_tree.get_children())
+        while len(items) < len(keys):
+            items.append(self.db_tree.insert('', 'end', iid=f"row{len(items)}"))
+        for item in items[len(keys):]:
+            self.db_tree.delete(item)
+        
+        self.tree_item_map = {}
+        selected = ()
+        for item_id, key in zip(items, keys):
+            record = self.data_map[key]
             report_id = record.get('ID', '')
+            biopsy_num = record.get('Biopsy No.', '') or record.get('Biopsy Number', '')
             name = record.get('Name', '') or record.get('Patient Name', '')
             age = record.get('Age', '')
             sex = record.get('Sex', '') or record.get('Gender', '')
             receipt_date = record.get('Receipt Date', '')
             
-            # GLOBAL SEARCH: Search in ALL fields of the record
-            # This includes: Patient name, ID, Biopsy No, Age, Sex, Report content,
-            # Impression, Keywords, Clinical Notes, Case details, etc.
-            search_found = False
-            if search_text:
-                for field_name, field_value in record.items():
-                    # Convert all field values to string and search
-                    searchable_text = str(field_value).lower()
-                    if search_text in searchable_text:
-                        search_found = True
-                        break
-            else:
-                # Empty search shows all records
-                search_found = True
-            
-            if search_found:
-                item_id = self.db_tree.insert('', 'end', text=report_id,
-                                             values=(biopsy_num, name, age, sex, receipt_date))
-                self.tree_item_map[item_id] = record
-                count += 1
-        
-        # Update info label with search results
-        if search_text:
-            self.db_info_label.config(text=f"Global Search Results: Found {count} report(s) matching '{search_text}'")
+            self.db_tree.item(item_id, text=report_id,
+                              values=(biopsy_num, name, age, sex, receipt_date))
+            self.tree_item_map[item_id] = key
+            if key in self.db_selected_keys:
+                selected += (item_id,)
+        
+        # Keep the highlight on the selected records, not on the reused rows
+        self.db_tree.selection_set(selected)
+        self.db_tree.yview_moveto(0)
+        
+        # Map the window onto the scrollbar as a fraction of the full result
+        if total:
+            self.db_scroll_y.set(self.db_offset / total,
+                                 min(1.0, (self.db_offset + self.db_visible_rows) / total))
         else:
-            self.db_info_label.config(text=f"Total Reports: {count} | Double-click to view details")
+            self.db_scroll_y.set(0.0, 1.0)
+    
+    def _scroll_db_to(self, offset):
+        """Move the visible window so that it starts at result index offset"""
+        offset = max(0, min(int(offset), len(self.db_results) - self.db_visible_rows))
+        if offset != self.db_offset:
+            self.db_offset = offset
+            self._render_db_window()
+    
+    def on_db_scrollbar(self, *args):
+        """Scrollbar command: translate moveto/scroll into a result offset"""
+        if args[0] == 'moveto':
+            self._scroll_db_to(float(args[1]) * len(self.db_results))
+        elif args[0] == 'scroll':
+            step = self.db_visible_rows if args[2] == 'pages' else 1
+            self._scroll_db_to(self.db_offset + int(args[1]) * step)
+    
+    def on_db_mousewheel(self, event):
+        """Scroll the virtual list by three rows per wheel notch"""
+        if getattr(event, 'num', None) == 4 or event.delta > 0:
+            self._scroll_db_to(self.db_offset - 3)
+        else:
+            self._scroll_db_to(self.db_offset + 3)
+        return "break"
+    
+    def on_db_key(self, event):
+        """Arrow/page keys move the selection through the whole result list"""
+        if not self.db_results:
+            return "break"
+        step = {'Up': -1, 'Down': 1, 'Prior': -self.db_visible_rows,
+                'Next': self.db_visible_rows}[event.keysym]
+        # The remembered position is only trusted while it still holds the
+        # selected key (db_results changes with every search)
+        index = self.db_selected_index
+        if index is None or index >= len(self.db_results) or self.db_results[index] != self.db_selected_key:
+            index = self.db_offset - (1 if step > 0 else 0)
+        index = max(0, min(index + step, len(self.db_results) - 1))
+        self.db_selected_key = self.db_results[index]
+        self.db_selected_index = index
+        self.db_selected_keys = {self.db_selected_key}
+        
+        if index < self.db_offset:
+            self.db_offset = index
+        elif index >= self.db_offset + self.db_visible_rows:
+            self.db_offset = index - self.db_visible_rows + 1
+        self._render_db_window()
+        return "break"
+    
+    def on_db_select(self, event):
+        """Remember which records (not which reused rows) are selected"""
+        selection = set(self.db_tree.selection())
+        for item_id, key in self.tree_item_map.items():
+            if item_id in selection:
+                self.db_selected_keys.add(key)
+            else:
+                self.db_selected_keys.discard(key)
+        focus = self.db_tree.focus()
+        if focus in selection:
+            self.db_selected_key = self.tree_item_map[focus]
+            # Pool rows show db_results[db_offset:] in order
+            self.db_selected_index = self.db_offset + list(self.tree_item_map).index(focus)
+    
+    def on_db_click(self, event):
+        """A plain click starts a new selection, also dropping rows scrolled out of view"""
+        if not event.state & 0x0005:  # neither Shift nor Control held
+            self.db_selected_keys.clear()
+    
+    def on_db_tree_configure(self, event):
+        """Resize the window of rows to however many fit in the Treeview"""
+        items = self.db_tree.get_children()
+        bbox = self.db_tree.bbox(items[0]) if items else None
+        if not bbox:
+            return
+        rows = max(1, (event.height - bbox[1]) // bbox[3])
+        if rows != self.db_visible_rows:
+            self.db_visible_rows = rows
+            self._render_db_window()
     
     def on_report_double_click(self, event):
         """Handle double-click on a report in database view"""
@@ -274,7 +454,7 @@ class ReportGeneratorApp:
             return
         
         item_id = selection[0]
-        record = self.tree_item_map.get(item_id)
+        record = self.read_full_record(self.data_map.get(self.tree_item_map.get(item_id)))
         if record:
             self.show_report_preview(record)
     
@@ -326,51 +506,218 @@ class ReportGeneratorApp:
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
 
-    def load_reports_data(self):
-        """Load reports_data.json into a dict mapping ID -> dict of fields"""
-        json_path = os.path.join(os.path.dirname(__file__), 'reports_data.json')
-        # Allow absolute path fallback
-        if not os.path.exists(json_path):
-            json_path = r'g:\dr_vinita\xml convert\reports_data.json'
-        if not os.path.exists(json_path):
-            return
+    def start_loading(self):
+        """Read all reports on a background thread
+
+        The records arrive in batches of LOAD_BATCH_SIZE through a queue and
+        are merged into data_map by _poll_loading on the Tk thread, so the
+        window appears and stays responsive however large the dataset is.
+        """
+        if self.store is None:
+            # Index seeks for single lookups work before loading finishes
+            self.store = open_store()
+        self.loading = True
+        self.load_queue = queue.Queue()
+        self.load_thread = threading.Thread(target=self._load_worker,
+                                            args=(self.load_queue, self.LOAD_BATCH_SIZE), daemon=True)
+        self.load_thread.start()
+        self.db_info_label.config(text="Loading reports...")
+        self.db_load_progress.config(mode='indeterminate', value=0)
+        self.db_load_progress.pack(side=tk.RIGHT)
+        self.db_load_progress.start()
+        self.root.after(self.LOAD_POLL_MS, self._poll_loading)
+
+    @staticmethod
+    def _load_worker(load_queue, batch_size):
+        """Loader thread: read the records (SQLite store, else reports_data.json)
+        into batches of (row number, record) and build the search and
+        identifier indexes; the row number is the record's 1-based position
+        in the export (blank rows are skipped)
+
+        The records keep only the hot columns; the long free text
+        (COLD_HEADERS) is indexed for search on the way and read back from
+        the source when a report is opened or rendered. A valid load cache
+        (report_cache.py) of the source replaces the read; after a cold load
+        the cache is rebuilt. Uses its own store connection; sqlite3
+        connections stay on the thread that opened them.
+        """
+        store = None
+        try:
+            store = open_store()
+            source = store.db_path if store is not None else find_data_file(JSON_FILENAME)
+            if not source:
+                load_queue.put(('done', ReportSearchIndex(), RecordIndex()))
+                return
+
+            signature = source_signature(source)
+            cached = load_cache(source, signature)
+            if cached is not None:
+                # Warm start: (headers, keys, hot value rows, search index
+                # snapshot, byte spans of the JSON rows or None for the store)
+                headers, keys, rows, index_snapshot, spans = cached
+                if store is not None:
+                    cold = store.cold_columns()
+                else:
+                    cold = JsonColdColumns(source, headers, signature[:2], spans)
+                load_queue.put(('total', len(keys)))
+                loaded = {}
+                for start in range(0, len(keys), batch_size):
+                    batch = [(key, cold.record(key, row)) for key, row in zip(keys[start:start + batch_size],
+                                                                            rows[start:start + batch_size])]
+                    loaded.update(batch)
+                    load_queue.put(('batch', batch))
+                load_queue.put(('done', ReportSearchIndex.from_snapshot(index_snapshot),
+                                RecordIndex.build(loaded)))
+                return
 
-        with open(json_path, 'r', encoding='utf-8') as f:
-            rows = json.load(f)
+            if store is not None:
+                load_queue.put(('total', len(store)))
+                headers = list(store.headers)
+                cold = store.cold_columns()
+                numbered = store.iter_numbered_rows()
+            else:
+                headers, cold, numbered = iter_json_records(source)
 
-        if not rows or len(rows) < 2:
+            # Each full row is only held while it is indexed
+            make_full = record_maker(headers)
+            make_record = cold.record_maker(share_values=True)
+            index = ReportSearchIndex()
+            loaded = {}
+            batch = []
+            for key, row in numbered:
+                full = make_full(row)
+                if any(full.values()):
+                    index.add(key, full)
+                    loaded[key] = make_record(key, row)
+                    batch.append((key, loaded[key]))
+                    if len(batch) >= batch_size:
+                        load_queue.put(('batch', batch))
+                        batch = []
+            load_queue.put(('batch', batch))
+            index.finalize()
+            load_queue.put(('done', index, RecordIndex.build(loaded)))
+
+            save_cache(source, (headers, list(loaded), [record.hot_values() for record in loaded.values()],
+                                index.snapshot(), cold.spans() if store is None else None), signature)
+        except Exception as e:
+            load_queue.put(('error', str(e)))
+        finally:
+            if store is not None:
+                store.close()
+
+    def _drain_load_queue(self):
+        """Merge the batches loaded so far; returns True once loading is over"""
+        browsing = not self.search_entry.get().strip()
+        try:
+            while True:
+                message = self.load_queue.get_nowait()
+                if message[0] == 'total':
+                    self.db_load_progress.stop()
+                    self.db_load_progress.config(mode='determinate', maximum=max(1, message[1]))
+                elif message[0] == 'batch':
+                    for key, rowdict in message[1]:
+                        if browsing:
+                            self.db_results.append(key)
+                        self.data_map[key] = rowdict
+                elif message[0] == 'done':
+                    _, self.search_index, self.record_index = message
+                    self.load_error = None
+                    return True
+                else:
+                    self.load_error = message[1]
+                    return True
+        except queue.Empty:
+            return False
+
+    def _poll_loading(self):
+        """Show the records loaded so far and keep polling until loading is over"""
+        if not self.loading:
+            return  # finished by wait_until_loaded()
+        if self._drain_load_queue():
+            self.loading = False
+            self.db_load_progress.stop()
+            self.db_load_progress.pack_forget()
+            self.filter_database_view()
+            if self.load_error:
+                self.db_info_label.config(text=f"Could not load reports: {self.load_error}")
             return
 
-        headers = rows[0]
-        for row in rows[1:]:
-            rowdict = {headers[i]: (row[i] if i < len(row) else '') for i in range(len(headers))}
-            biopsy_num = rowdict.get('Biopsy No.') or rowdict.get('Biopsy Number')
-            if biopsy_num:
-                self.data_map[str(biopsy_num)] = rowdict
+        # Only the fixed pool of visible rows is re-labelled
+        self._render_db_window()
+        self.db_load_progress['value'] = len(self.data_map)
+        self.db_info_label.config(text=f"Loading reports... {len(self.data_map)} loaded")
+        self.root.after(self.LOAD_POLL_MS, self._poll_loading)
+
+    def wait_until_loaded(self):
+        """Block until the background load has finished (for scripts using the app)"""
+        if self.load_thread is not None:
+            self.load_thread.join()
+        if self.loading:
+            self._drain_load_queue()
+            self.loading = False
+            self.db_load_progress.pack_forget()
+            self.filter_database_view()
+
+    def reports_ready(self):
+        """True when the reports are loaded; tells the user why not otherwise"""
+        if self.loading:
+            messagebox.showinfo("Loading", "The reports are still loading. Please try again in a moment.")
+            return False
+        if not self.data_map:
+            messagebox.showerror("Data Missing", "reports_data.json not found or empty.")
+            return False
+        return True
 
     def load_by_id(self):
-        """Load a single record by biopsy number and populate the form"""
-        biopsy_num = self.load_id_entry.get().strip()
-        if not biopsy_num:
-            messagebox.showwarning("Input Required", "Please enter a Biopsy Number to load.")
+        """Load a single record by Biopsy Number, Report ID, CR No. or
+        Reference No. and populate the form"""
+        identifier = self.load_id_entry.get().strip()
+        if not identifier:
+            messagebox.showwarning("Input Required", "Please enter a Biopsy Number or Report ID to load.")
             return
 
-        # ensure data map loaded
-        if not self.data_map:
-            self.load_reports_data()
+        if self.loading and self.store is not None:
+            # Index seeks in the SQLite store until the record index is ready
+            records = []
+            for header in IDENTIFIER_HEADERS:
+                records = self.store.find(header, identifier)
+                if records:
+                    break
+        else:
+            # ensure data map loaded
+            if not self.reports_ready():
+                return
+            records = [self.data_map[key] for key in self.record_index.lookup(identifier)]
+        if not records:
+            messagebox.showerror("Not Found", f"No report with Biopsy Number or ID {identifier} in the data file.")
+            return
 
-        record = self.data_map.get(biopsy_num)
+        record = self.read_full_record(records[-1])
         if not record:
-            messagebox.showerror("Not Found", f"Biopsy Number {biopsy_num} not found in data file.")
             return
-
+        if len(records) > 1:
+            messagebox.showinfo("Several Reports",
+                                f"{len(records)} reports match {identifier}; loading the most recent one. "
+                                f"Search for it in the Reports Database tab to see all of them.")
         self.populate_fields_from_row(record)
         
         # Show preview of the loaded report
         self.show_report_preview(record)
 
+    def read_full_record(self, record):
+        """record with its long free-text fields read from the data file,
+        or None (after telling the user) when they cannot be read"""
+        if not record:
+            return None
+        try:
+            return full_record(record)
+        except (OSError, ValueError, KeyError) as e:
+            messagebox.showerror("Report Unavailable", f"Could not read the report text: {e}")
+            return None
+
     def show_report_preview(self, rowdict):
         """Display a preview window of the loaded report data"""
+        rowdict = full_record(rowdict)
         preview_window = tk.Toplevel(self.root)
         preview_window.title("Report Preview")
         preview_window.geometry("700x600")
@@ -445,36 +792,7 @@ class ReportGeneratorApp:
 
     def populate_fields_from_row(self, rowdict):
         """Populate GUI fields from a row dict (keys from JSON headers)"""
-        # Simple mappings
-        mapping = {
-            'ID': ['ID', 'Report ID'],
-            'Name': ['Name', 'Patient Name'],
-            'Age': ['Age'],
-            'Sex': ['Sex', 'Gender'],
-            'Receipt Date': ['Receipt Date'],
-            'Year': ['Year'],
-            'CR No.': ['CR No.', 'Case Reference Number'],
-            'Biopsy No.': ['Biopsy No.', 'Biopsy Number'],
-            'Ward No.': ['Ward No.', 'Ward Number'],
-            'Referred by': ['Referred by', 'Referred By'],
-            'Reference No.': ['Reference No.', 'Reference Number'],
-            'Speciment Received': ['Speciment Received', 'Specimen Received'],
-            'Report': ['Report', 'Microscopic Findings'],
-            'Impression': ['Impression', 'Pathological Impression'],
-            'Keywords': ['Keywords', 'Diagnosis', 'Keywords/Diagnosis'],
-            'Note': ['Note', 'Clinical Notes'],
-            'Reported By': ['Reported By'],
-            'Date of Report': ['Date of Report', 'Report Date'],
-            'ICD Code': ['ICD Code'],
-        }
-
-        for field_key, candidates in mapping.items():
-            value = ''
-            for cand in candidates:
-                if cand in rowdict and rowdict[cand]:
-                    value = str(rowdict[cand])
-                    break
-
+        for field_key, value in form_values(full_record(rowdict)).items():
             widget = self.fields.get(field_key)
             if not widget:
                 continue
@@ -488,11 +806,8 @@ class ReportGeneratorApp:
     def bulk_generate_from_ids(self):
         """Bulk generate PDFs for multiple IDs (comma-separated or from a file)"""
         # Ensure data loaded
-        if not self.data_map:
-            self.load_reports_data()
-            if not self.data_map:
-                messagebox.showerror("Data Missing", "reports_data.json not found or empty.")
-                return
+        if not self.reports_ready():
+            return
 
         # Ask user for IDs or file
         choice = messagebox.askquestion("Bulk Generate", "Load IDs from file? (No = enter comma-separated IDs)")
@@ -508,7 +823,7 @@ class ReportGeneratorApp:
                         if t:
                             ids.append(t)
         else:
-            id_string = simpledialog.askstring("Enter IDs", "Enter comma-separated Report IDs:")
+            id_string = simpledialog.askstring("Enter IDs", "Enter comma-separated Report IDs or Biopsy Numbers:")
             if not id_string:
                 return
             ids = [s.strip() for s in id_string.split(',') if s.strip()]
@@ -517,139 +832,294 @@ class ReportGeneratorApp:
             messagebox.showinfo("No IDs", "No Report IDs provided.")
             return
 
+        # Report IDs, Biopsy Numbers, CR or Reference Numbers; an identifier
+        # shared by several reports exports all of them
+        jobs = []
+        for rid in ids:
+            keys = self.record_index.lookup(rid)
+            if not keys:
+                jobs.append((rid, None))
+            for n, key in enumerate(keys, start=1):
+                jobs.append((rid if n == 1 else f"{rid}#{n}", self.data_map[key]))
+        self.start_bulk_export(jobs)
+
+    def bulk_generate_from_query(self):
+        """Bulk generate the reports matching a year / physician / keyword / ICD / date query"""
+        if not self.reports_ready():
+            return
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Bulk Generate by Query")
+        dialog.transient(self.root)
+        frame = ttk.Frame(dialog)
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        ttk.Label(frame, text="Leave a field empty to not filter on it.",
+                  font=("Arial", 8), foreground="gray").grid(row=0, column=0, columnspan=2, sticky='w')
+        entries = {}
+        for row, (name, label) in enumerate(self.BULK_QUERY_FIELDS, start=1):
+            ttk.Label(frame, text=label + ":").grid(row=row, column=0, sticky='w', pady=3, padx=5)
+            entries[name] = ttk.Entry(frame, width=30)
+            entries[name].grid(row=row, column=1, sticky='ew', pady=3, padx=5)
+        count_label = ttk.Label(frame, text="", font=("Arial", 9))
+        count_label.grid(row=len(entries) + 1, column=0, columnspan=2, sticky='w', pady=(8, 0))
+
+        def selection():
+            try:
+                query = parse_query({name: entry.get() for name, entry in entries.items()})
+            except ValueError as e:
+                messagebox.showerror("Invalid Query", str(e), parent=dialog)
+                return None, None
+            return query, self.select_records(query)
+
+        def preview():
+            query, records = selection()
+            if query is not None:
+                count_label.config(text=f"{describe_query(query)}: {len(records)} report(s)")
+
+        def export():
+            query, records = selection()
+            if query is None:
+                return
+            if not records:
+                messagebox.showinfo("No Reports", "No reports match this query.", parent=dialog)
+                return
+            dialog.destroy()
+            self.start_bulk_export(self.keyed_jobs(records))
+
+        buttons = ttk.Frame(dialog)
+        buttons.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(buttons, text="Cancel", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(buttons, text="Generate", command=export).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(buttons, text="Count", command=preview).pack(side=tk.RIGHT, padx=5)
+        dialog.grab_set()
+
+    def select_records(self, query):
+        """Records matching parsed query criteria, in export order
+
+        Answered by the SQLite store's indexes; without a store the loaded
+        records are filtered in memory.
+        """
+        if self.store is not None:
+            return self.store.query_records(query)
+        return [record for record in self.data_map.values() if record_matches(record, query)]
+
+    @staticmethod
+    def keyed_jobs(records):
+        """(key, record) bulk jobs; the key (also used by the journal) is the
+        Biopsy No. or ID, with the same #n suffix as bulk_generate_from_ids
+        for the second and later records sharing it, so they never collide"""
+        jobs = []
+        seen = {}
+        for record in records:
+            key = str(record.get('Biopsy No.') or record.get('ID') or '')
+            seen[key] = seen.get(key, 0) + 1
+            jobs.append((key if seen[key] == 1 else f"{key}#{seen[key]}", record))
+        return jobs
+
+    def bulk_generate_selected(self):
+        """Bulk generate the rows selected in the Reports Database view"""
+        if not self.reports_ready():
+            return
+        keys = [key for key in self.db_results if key in self.db_selected_keys]
+        if not keys:
+            messagebox.showinfo("No Selection", "Select one or more reports first "
+                                "(Ctrl+click / Shift+click to select several).")
+            return
+        self.start_bulk_export(self.keyed_jobs(self.data_map[key] for key in keys))
+
+    def bulk_generate_results(self):
+        """Bulk generate every report in the current search results"""
+        if not self.reports_ready():
+            return
+        if not self.db_results:
+            messagebox.showinfo("No Reports", "The search found no reports.")
+            return
+        self.start_bulk_export(self.keyed_jobs(self.data_map[key] for key in self.db_results))
+
+    def start_bulk_export(self, jobs):
+        """Ask for the output folder, then render (key, record) jobs
+
+        Offers to resume an interrupted export of the same keys into that
+        folder, and the hashed layout for large exports.
+        """
         out_dir = filedialog.askdirectory(title="Select output folder for PDFs")
         if not out_dir:
             return
 
-        total = len(ids)
-        done = 0
-        failed = 0
-        for rid in ids:
-            row = self.data_map.get(rid)
-            if not row:
-                failed += 1
-                continue
-            # populate then generate to auto-file
-            self.populate_fields_from_row(row)
-            filename = f"{row.get('ID','')}_{row.get('Name','').replace(' ','_')}.pdf"
-            safe_name = filename.replace('/', '_').replace('\\', '_')
-            out_path = os.path.join(out_dir, safe_name)
-            try:
-                self._create_pdf_to_path(out_path)
-                done += 1
-            except Exception:
-                failed += 1
+        # Offer to resume an interrupted export of the same IDs into this folder
+        ids = [rid for rid, _ in jobs]
+        journal_path = os.path.join(out_dir, JOURNAL_FILENAME)
+        job_id = job_signature(ids)
+        previous_job, completed = read_journal(journal_path)
+        resume = False
+        if previous_job == job_id and completed:
+            resume = messagebox.askyesno(
+                "Resume Bulk Job",
+                f"An interrupted export of these IDs was found in this folder "
+                f"({len(completed)} of {len(ids)} already saved).\n\nResume it?")
+        journal = CheckpointJournal.open(journal_path, job_id, resume=resume)
 
-        messagebox.showinfo("Bulk Complete", f"Bulk export complete. {done} saved, {failed} failed.")
+        # Large exports can be spread over hashed subfolders instead of one flat folder
+        layout = 'flat'
+        if len(ids) >= self.BULK_SHARD_MIN_IDS:
+            shard = messagebox.askyesno(
+                "Output Layout",
+                f"Spread the {len(ids)} PDFs over hashed subfolders?\n\n"
+                f"Recommended for large exports; {INDEX_FILENAME} in the "
+                f"output folder lists where each report went.")
+            layout = 'hash' if shard else 'flat'
 
-    def _create_pdf_to_path(self, file_path):
-        """Internal: create PDF using current form values and save to file_path"""
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Helvetica", "", 10)
+        # Records are resolved here; the worker thread never touches data_map or widgets
+        jobs = [(rid, record) for rid, record in jobs if not journal.is_done(rid)]
+        self.start_bulk_job(jobs, out_dir, journal, layout)
 
-        # Title
-        pdf.set_font("Helvetica", "B", 14)
-        pdf.cell(0, 8, "KIDNEY BIOPSY PATHOLOGY REPORT", ln=True, align="C")
-        pdf.set_font("Helvetica", "", 9)
-        pdf.cell(0, 6, "Department of Pathology - Medical Analysis Center", ln=True, align="C")
-        pdf.ln(4)
-
-        # Patient Information
-        pdf.set_font("Helvetica", "B", 10)
-        pdf.cell(0, 6, "PATIENT INFORMATION", ln=True)
-        pdf.set_font("Helvetica", "", 9)
-
-        patient_data = [
-            ('ID', 'Report ID'),
-            ('Name', 'Patient Name'),
-            ('Age', 'Age'),
-            ('Sex', 'Gender'),
-            ('Receipt Date', 'Receipt Date'),
-            ('Year', 'Year'),
-        ]
+    def set_bulk_buttons(self, state):
+        """Enable or disable every button that starts a bulk job"""
+        for button in (self.bulk_btn, self.bulk_query_btn, self.bulk_selected_btn, self.bulk_results_btn):
+            button.config(state=state)
 
-        for field, label in patient_data:
-            pdf.cell(40, 6, label + ":", border=0)
-            pdf.cell(0, 6, self.get_field_value(field), ln=True, border=0)
+    def start_bulk_job(self, jobs, out_dir, journal=None, layout='flat'):
+        """Render (id, record) jobs on a worker thread with a progress window
 
-        pdf.ln(2)
+        Finished IDs are recorded in journal (if given) so the job can be
+        resumed after a crash or a cancel. Files go into out_dir in the given
+        layout (see output_layout.py), and every saved report is added to the
+        folder's path index.
+        """
+        self.set_bulk_buttons(tk.DISABLED)
+        self.bulk_queue = queue.Queue()
+        self.bulk_cancel = threading.Event()
+        self.bulk_total = len(jobs)
+        self.bulk_started = time.perf_counter()
 
-        # Case Details
-        pdf.set_font("Helvetica", "B", 10)
-        pdf.cell(0, 6, "CASE DETAILS", ln=True)
-        pdf.set_font("Helvetica", "", 9)
+        # Progress window: bar, throughput/ETA line and Cancel button
+        self.bulk_window = tk.Toplevel(self.root)
+        self.bulk_window.title("Bulk Generate")
+        self.bulk_window.geometry("420x140")
+        self.bulk_window.transient(self.root)
+        self.bulk_window.protocol("WM_DELETE_WINDOW", self.cancel_bulk_job)
 
-        case_data = [
-            ('CR No.', 'Case Reference'),
-            ('Biopsy No.', 'Biopsy Number'),
-            ('Ward No.', 'Ward'),
-            ('Referred by', 'Referred By'),
-            ('Reference No.', 'Reference No.'),
-            ('Speciment Received', 'Specimen'),
-        ]
+        frame = ttk.Frame(self.bulk_window)
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        ttk.Label(frame, text=f"Generating {self.bulk_total} report(s)...",
+                  font=("Arial", 10, "bold")).pack(anchor='w')
+        self.bulk_progress = ttk.Progressbar(frame, orient=tk.HORIZONTAL, mode='determinate',
+                                             maximum=max(1, self.bulk_total))
+        self.bulk_progress.pack(fill=tk.X, pady=8)
+        self.bulk_status_label = ttk.Label(frame, text="Starting...", font=("Arial", 9))
+        self.bulk_status_label.pack(anchor='w')
+        self.bulk_cancel_btn = ttk.Button(frame, text="Cancel", command=self.cancel_bulk_job)
+        self.bulk_cancel_btn.pack(side=tk.RIGHT, pady=(8, 0))
 
-        for field, label in case_data:
-            pdf.cell(40, 6, label + ":", border=0)
-            pdf.cell(0, 6, self.get_field_value(field)[:40], ln=True, border=0)
+        worker = threading.Thread(target=self._bulk_worker,
+                                  args=(jobs, out_dir, self.bulk_queue, self.bulk_cancel, journal, layout),
+                                  daemon=True)
+        worker.start()
+        self.root.after(self.BULK_POLL_MS, self._poll_bulk_progress)
 
-        pdf.ln(2)
+    @staticmethod
+    def _bulk_worker(jobs, out_dir, progress_queue, cancel_event, journal=None, layout='flat'):
+        """Worker thread: render every job, reporting counts through progress_queue"""
+        done = 0
+        failed = 0
+        processed = 0
+        cancelled = False
+        error = None
+        path_index = None
+        try:
+            path_index = ReportPathIndex.load(out_dir, layout)
+            for rid, row in jobs:
+                if cancel_event.is_set():
+                    cancelled = True
+                    break
+                processed += 1
+                if not row:
+                    failed += 1
+                    if journal:
+                        journal.mark_failed(rid, "not found")
+                else:
+                    filename = f"{row.get('ID','')}_{row.get('Name','').replace(' ','_')}.pdf"
+                    safe_name = filename.replace('/', '_').replace('\\', '_')
+                    relpath = os.path.join(shard_subdir(layout, row.get('ID', ''), row.get('Year', '')),
+                                           safe_name)
+                    out_path = os.path.join(out_dir, relpath)
+                    try:
+                        if layout != 'flat':
+                            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                        # Long free text is read per report, not held for the whole job
+                        render_record_to_path(full_record(row), out_path)
+                        path_index.add(row.get('ID', ''), row.get('Biopsy No.', ''), relpath)
+                        done += 1
+                        if journal:
+                            journal.mark_done(rid)
+                    except Exception as e:
+                        failed += 1
+                        if journal:
+                            journal.mark_failed(rid, e)
+                progress_queue.put(('progress', processed, done, failed))
+            if journal and not cancelled:
+                journal.finish()
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        finally:
+            # Cancelled or crashed: keep the journal so the job can be resumed
+            for cleanup in (journal and journal.close, path_index and path_index.save):
+                try:
+                    if cleanup:
+                        cleanup()
+                except Exception as e:
+                    error = error or str(e) or type(e).__name__
+            # Always sent: the progress window and the bulk buttons wait for it
+            progress_queue.put(('finished', processed, done, failed, cancelled, error))
 
-        # Microscopic Findings
-        report_val = self.get_field_value('Report')
-        if report_val:
-            pdf.set_font("Helvetica", "B", 10)
-            pdf.cell(0, 6, "MICROSCOPIC FINDINGS", ln=True)
-            pdf.set_font("Helvetica", "", 9)
-            pdf.multi_cell(0, 5, report_val)
-            pdf.ln(2)
+    def _poll_bulk_progress(self):
+        """Drain the worker's progress queue and update the progress window"""
+        message = None
+        try:
+            while True:
+                message = self.bulk_queue.get_nowait()
+                if message[0] == 'finished':
+                    break
+        except queue.Empty:
+            pass
 
-        # Impression
-        impression_val = self.get_field_value('Impression')
-        if impression_val:
-            pdf.set_font("Helvetica", "B", 10)
-            pdf.cell(0, 6, "PATHOLOGICAL IMPRESSION", ln=True)
-            pdf.set_font("Helvetica", "", 9)
-            pdf.multi_cell(0, 5, impression_val)
-            pdf.ln(2)
-
-        # Clinical Notes
-        note_val = self.get_field_value('Note')
-        if note_val:
-            pdf.set_font("Helvetica", "B", 10)
-            pdf.cell(0, 6, "CLINICAL NOTES", ln=True)
-            pdf.set_font("Helvetica", "", 9)
-            pdf.multi_cell(0, 5, note_val)
-            pdf.ln(2)
+        if message is not None:
+            processed = message[1]
+            elapsed = time.perf_counter() - self.bulk_started
+            rate = processed / elapsed if elapsed > 0 else 0.0
+            remaining = (self.bulk_total - processed) / rate if rate else 0
+            self.bulk_progress['value'] = processed
+            self.bulk_status_label.config(
+                text=f"{processed}/{self.bulk_total} | {rate:.1f} reports/s | "
+                     f"ETA {int(remaining // 60):02d}:{int(remaining % 60):02d}")
 
-        # Keywords
-        keywords_val = self.get_field_value('Keywords')
-        if keywords_val:
-            pdf.set_font("Helvetica", "B", 10)
-            pdf.cell(0, 6, "KEYWORDS/DIAGNOSIS", ln=True)
-            pdf.set_font("Helvetica", "", 9)
-            pdf.multi_cell(0, 5, keywords_val)
-            pdf.ln(2)
-
-        # Footer
-        pdf.ln(2)
-        pdf.set_font("Helvetica", "B", 9)
-        pdf.cell(40, 6, "Reported By:", border=0)
-        pdf.cell(0, 6, self.get_field_value('Reported By'), ln=True, border=0)
-
-        pdf.cell(40, 6, "Report Date:", border=0)
-        pdf.cell(0, 6, self.get_field_value('Date of Report'), ln=True, border=0)
-
-        pdf.cell(40, 6, "ICD Code:", border=0)
-        pdf.cell(0, 6, self.get_field_value('ICD Code'), ln=True, border=0)
-
-        # Timestamp
-        pdf.ln(3)
-        pdf.set_font("Helvetica", "", 8)
-        timestamp = f"PDF Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        pdf.cell(0, 6, timestamp, ln=True, align="C")
-
-        pdf.output(file_path)
+            if message[0] == 'finished':
+                _, processed, done, failed, cancelled, error = message
+                self.bulk_window.destroy()
+                self.set_bulk_buttons(tk.NORMAL)
+                if error:
+                    messagebox.showerror("Bulk Export Failed",
+                                         f"Bulk export stopped after {processed} of {self.bulk_total}: {error}\n"
+                                         f"{done} saved, {failed} failed.")
+                elif cancelled:
+                    messagebox.showinfo("Bulk Cancelled",
+                                        f"Bulk export cancelled after {processed} of {self.bulk_total}. "
+                                        f"{done} saved, {failed} failed.")
+                else:
+                    messagebox.showinfo("Bulk Complete", f"Bulk export complete. {done} saved, {failed} failed.")
+                return
+
+        self.root.after(self.BULK_POLL_MS, self._poll_bulk_progress)
+
+    def cancel_bulk_job(self):
+        """Ask the running bulk job to stop after the current report"""
+        self.bulk_cancel.set()
+        self.bulk_cancel_btn.config(state=tk.DISABLED)
+        self.bulk_status_label.config(text="Cancelling...")
+
+    def _create_pdf_to_path(self, file_path):
+        """Internal: create PDF using current form values and save to file_path"""
+        build_report_pdf(self.get_form_values()).output(file_path)
     
     def create_case_tab(self):
         """Create case details input fields"""
@@ -753,6 +1223,10 @@ class ReportGeneratorApp:
         else:
             return widget.get()
     
+    def get_form_values(self):
+        """Get the values of all form fields as a dict"""
+        return {field_name: self.get_field_value(field_name) for field_name in self.fields}
+    
     def generate_report(self):
         """Generate PDF report"""
         try:
@@ -775,115 +1249,8 @@ class ReportGeneratorApp:
             if not file_path:
                 return
             
-            # Create PDF
-            pdf = FPDF()
-            pdf.add_page()
-            pdf.set_font("Helvetica", "", 10)
-            
-            # Title
-            pdf.set_font("Helvetica", "B", 14)
-            pdf.cell(0, 8, "KIDNEY BIOPSY PATHOLOGY REPORT", ln=True, align="C")
-            pdf.set_font("Helvetica", "", 9)
-            pdf.cell(0, 6, "Department of Pathology - Medical Analysis Center", 
-                    ln=True, align="C")
-            pdf.ln(4)
-            
-            # Patient Information
-            pdf.set_font("Helvetica", "B", 10)
-            pdf.cell(0, 6, "PATIENT INFORMATION", ln=True)
-            pdf.set_font("Helvetica", "", 9)
-            
-            patient_data = [
-                ('ID', 'Report ID'),
-                ('Name', 'Patient Name'),
-                ('Age', 'Age'),
-                ('Sex', 'Gender'),
-                ('Receipt Date', 'Receipt Date'),
-                ('Year', 'Year'),
-            ]
-            
-            for field, label in patient_data:
-                pdf.cell(40, 6, label + ":", border=0)
-                pdf.cell(0, 6, self.get_field_value(field), ln=True, border=0)
-            
-            pdf.ln(2)
-            
-            # Case Details
-            pdf.set_font("Helvetica", "B", 10)
-            pdf.cell(0, 6, "CASE DETAILS", ln=True)
-            pdf.set_font("Helvetica", "", 9)
-            
-            case_data = [
-                ('CR No.', 'Case Reference'),
-                ('Biopsy No.', 'Biopsy Number'),
-                ('Ward No.', 'Ward'),
-                ('Referred by', 'Referred By'),
-                ('Reference No.', 'Reference No.'),
-                ('Speciment Received', 'Specimen'),
-            ]
-            
-            for field, label in case_data:
-                pdf.cell(40, 6, label + ":", border=0)
-                pdf.cell(0, 6, self.get_field_value(field)[:40], ln=True, border=0)
-            
-            pdf.ln(2)
-            
-            # Microscopic Findings
-            report_val = self.get_field_value('Report')
-            if report_val:
-                pdf.set_font("Helvetica", "B", 10)
-                pdf.cell(0, 6, "MICROSCOPIC FINDINGS", ln=True)
-                pdf.set_font("Helvetica", "", 9)
-                pdf.multi_cell(0, 5, report_val)
-                pdf.ln(2)
-            
-            # Impression
-            impression_val = self.get_field_value('Impression')
-            if impression_val:
-                pdf.set_font("Helvetica", "B", 10)
-                pdf.cell(0, 6, "PATHOLOGICAL IMPRESSION", ln=True)
-                pdf.set_font("Helvetica", "", 9)
-                pdf.multi_cell(0, 5, impression_val)
-                pdf.ln(2)
-            
-            # Clinical Notes
-            note_val = self.get_field_value('Note')
-            if note_val:
-                pdf.set_font("Helvetica", "B", 10)
-                pdf.cell(0, 6, "CLINICAL NOTES", ln=True)
-                pdf.set_font("Helvetica", "", 9)
-                pdf.multi_cell(0, 5, note_val)
-                pdf.ln(2)
-            
-            # Keywords
-            keywords_val = self.get_field_value('Keywords')
-            if keywords_val:
-                pdf.set_font("Helvetica", "B", 10)
-                pdf.cell(0, 6, "KEYWORDS/DIAGNOSIS", ln=True)
-                pdf.set_font("Helvetica", "", 9)
-                pdf.multi_cell(0, 5, keywords_val)
-                pdf.ln(2)
-            
-            # Footer
-            pdf.ln(2)
-            pdf.set_font("Helvetica", "B", 9)
-            pdf.cell(40, 6, "Reported By:", border=0)
-            pdf.cell(0, 6, self.get_field_value('Reported By'), ln=True, border=0)
-            
-            pdf.cell(40, 6, "Report Date:", border=0)
-            pdf.cell(0, 6, self.get_field_value('Date of Report'), ln=True, border=0)
-            
-            pdf.cell(40, 6, "ICD Code:", border=0)
-            pdf.cell(0, 6, self.get_field_value('ICD Code'), ln=True, border=0)
-            
-            # Timestamp
-            pdf.ln(3)
-            pdf.set_font("Helvetica", "", 8)
-            timestamp = f"PDF Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-            pdf.cell(0, 6, timestamp, ln=True, align="C")
-            
-            # Save PDF
-            pdf.output(file_path)
+            # Create and save PDF
+            build_report_pdf(self.get_form_values()).output(file_path)
             
             messagebox.showinfo("Success", 
                               f"PDF report generated successfully!\n\nSaved to:\n{file_path}")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+Sharded output directory layouts for bulk PDF exports, and their path index
+
+One flat folder with tens of thousands of PDFs makes listings and lookups
+slow on the file server. A sharded layout spreads the files over
+subdirectories of the output folder:
+    flat    every PDF directly in the folder (the old layout)
+    hash    two levels from a hash of the Report ID, e.g. 3f/a2/
+    year    Year_<year>/ then the ID's thousands bucket, e.g. Year_2018/012000/
+report_index.json in the output folder maps Report ID and Biopsy No. to
+the PDF's path relative to that folder, so tools can find a report
+without walking the tree.
+
+Usage (look up a report):
+    python output_layout.py OUTPUT_FOLDER ID_OR_BIOPSY_NO
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+LAYOUTS = ('flat', 'hash', 'year')
+
+INDEX_FILENAME = 'report_index.json'
+
+
+def id_bucket(report_id):
+    """Thousands bucket of a numeric ID ('12345' -> '012000'), else a hash prefix"""
+    report_id = str(report_id).strip()
+    if report_id.isdigit():
+        return f"{int(report_id) // 1000 * 1000:06d}"
+    return hashlib.sha1(report_id.encode('utf-8')).hexdigest()[:2]
+
+
+def shard_subdir(layout, report_id, year):
+    """Subdirectory (relative, '' for flat) a report is written to"""
+    if layout == 'hash':
+        digest = hashlib.sha1(str(report_id).strip().encode('utf-8')).hexdigest()
+        return os.path.join(digest[:2], digest[2:4])
+    if layout == 'year':
+        return os.path.join(f"Year_{year}", id_bucket(report_id))
+    if layout == 'flat':
+        return ''
+    raise ValueError(f"Unknown output layout: {layout}")
+
+
+class ReportPathIndex:
+    """Report ID / Biopsy No. -> relative PDF path, saved as report_index.json"""
+
+    def __init__(self, root, layout='flat'):
+        self.root = root
+        self.layout = layout
+        self.by_id = {}
+        self.by_biopsy_no = {}
+
+    @classmethod
+    def load(cls, root, layout=None):
+        """Load the index of root (an empty one if there is none)
+
+        The entries of a previous run are kept only while its layout
+        matches layout (None = whatever was saved).
+        """
+        index = cls(root, layout or 'flat')
+        path = os.path.join(root, INDEX_FILENAME)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if layout is None or saved.get('layout') == layout:
+                index.layout = saved.get('layout', index.layout)
+                index.by_id = saved.get('by_id', {})
+                index.by_biopsy_no = saved.get('by_biopsy_no', {})
+        return index
+
+    def add(self, report_id, biopsy_no, relpath):
+        relpath = relpath.replace(os.sep, '/')
+        if report_id:
+            self.by_id[str(report_id).strip()] = relpath
+        if biopsy_no and biopsy_no != 'N/A':
+            self.by_biopsy_no[str(biopsy_no).strip()] = relpath
+
+    def lookup(self, key):
+        """Absolute path of the report with this ID or Biopsy No., or None"""
+        key = str(key).strip()
+        relpath = self.by_id.get(key) or self.by_biopsy_no.get(key)
+        return os.path.join(self.root, *relpath.split('/')) if relpath else None
+
+    def save(self):
+        """Write the index atomically (temp file + replace)"""
+        path = os.path.join(self.root, INDEX_FILENAME)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'layout': self.layout, 'by_id': self.by_id,
+                       'by_biopsy_no': self.by_biopsy_no}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find a report PDF through the output folder's index")
+    parser.add_argument('output_dir')
+    parser.add_argument('key', help="Report ID or Biopsy No.")
+    args = parser.parse_args(argv)
+
+    path = ReportPathIndex.load(args.output_dir).lookup(args.key)
+    if path is None:
+        print(f"{args.key} not found in {os.path.join(args.output_dir, INDEX_FILENAME)}")
+        return 1
+    print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
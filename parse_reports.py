@@ -1,54 +1,156 @@
 #!/usr/bin/env python
+"""
+Extract the rows of the SpreadsheetML reports.xls export into reports_data.json
+
+Two ingest modes are available:
+  * DOM (default)  - ET.parse the whole workbook, then dump every row at once
+  * --stream       - iterparse the workbook, handle each ss:Row as it arrives,
+                     drop it from the tree and append it to the JSON file, so
+                     peak memory stays flat however many rows the export has
+
+Both modes produce the same list-of-lists JSON (header row first). A
+reports_data.db store next to the JSON (see report_store.py) is rebuilt
+from the new JSON so it never serves the previous export.
+"""
 import xml.etree.ElementTree as ET
-from collections import defaultdict
-from datetime import datetime
+import argparse
 import json
+import os
+from report_store import DB_FILENAME, migrate_json
 
-# Parse the XML file
-xml_file = r'g:\dr_vinita\xml convert\reports.xls'
-tree = ET.parse(xml_file)
-root = tree.getroot()
+XML_FILE = r'g:\dr_vinita\xml convert\reports.xls'
+JSON_FILE = r'g:\dr_vinita\xml convert\reports_data.json'
 
 # Define the namespace
-ns = {'ss': 'urn:schemas-microsoft-com:office:spreadsheet'}
+SS_NS = 'urn:schemas-microsoft-com:office:spreadsheet'
+ns = {'ss': SS_NS}
+ROW_TAG = f'{{{SS_NS}}}Row'
+
+# Number of leading rows kept for the printed summary
+SAMPLE_ROWS = 6
+
 
-# Extract data by rows
-rows_data = []
-for row in root.findall('.//ss:Row', ns):
-    row_cells = []
+def row_cells(row):
+    """Return the stripped text of every cell in a ss:Row element"""
+    cells = []
     for cell in row.findall('.//ss:Cell', ns):
         data_elem = cell.find('.//ss:Data', ns)
         if data_elem is not None and data_elem.text:
-            row_cells.append(data_elem.text.strip())
+            cells.append(data_elem.text.strip())
         else:
-            row_cells.append('')
-    if any(row_cells):  # Only add non-empty rows
-        rows_data.append(row_cells)
-
-print(f"Total rows extracted: {len(rows_data)}")
-print(f"\nFirst row (likely headers):")
-if rows_data:
-    print(rows_data[0])
-
-# Save to JSON for easier processing
-with open(r'g:\dr_vinita\xml convert\reports_data.json', 'w') as f:
-    json.dump(rows_data, f, indent=2)
-
-print("\nData saved to reports_data.json")
-
-# Generate statistics
-print(f"\n\n=== QUICK STATISTICS ===")
-print(f"Total reports: {len(rows_data) - 1 if rows_data else 0}")  # Subtract header row
-if len(rows_data) > 1:
-    print(f"Data columns per row: {len(rows_data[0])}")
-
-# Print sample of data (first 5 non-header rows)
-print(f"\n\n=== SAMPLE DATA ===")
-for i, row in enumerate(rows_data[1:6]):  # Skip header
-    print(f"\nReport {i+1}:")
-    if len(row) > 5:
-        print(f"  Date: {row[1]}")
-        print(f"  Patient Name: {row[6] if len(row) > 6 else 'N/A'}")
-        print(f"  Age: {row[7] if len(row) > 7 else 'N/A'}")
-        print(f"  Gender: {row[9] if len(row) > 9 else 'N/A'}")
-        print(f"  Test Type: {row[10] if len(row) > 10 else 'N/A'}")
+            cells.append('')
+    return cells
+
+
+def parse_rows(xml_file):
+    """DOM path: parse the whole workbook and return all non-empty rows"""
+    tree = ET.parse(xml_file)
+    root = tree.getroot()
+
+    rows_data = []
+    for row in root.findall('.//ss:Row', ns):
+        cells = row_cells(row)
+        if any(cells):  # Only add non-empty rows
+            rows_data.append(cells)
+    return rows_data
+
+
+def iter_rows(xml_file):
+    """Streaming path: yield non-empty rows one at a time using iterparse
+
+    Each ss:Row is detached from its parent as soon as it has been read, so
+    the partially built tree never holds more than the row being parsed.
+    """
+    parents = []
+    for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+        if event == 'start':
+            parents.append(elem)
+            continue
+
+        parents.pop()
+        if elem.tag != ROW_TAG:
+            continue
+
+        cells = row_cells(elem)
+        elem.clear()
+        if parents:
+            parents[-1].remove(elem)
+
+        if any(cells):
+            yield cells
+
+
+def write_rows_json(rows, json_file):
+    """Write rows to json_file one at a time as a JSON array
+
+    Returns (row_count, sample) where sample holds the first SAMPLE_ROWS rows.
+    """
+    count = 0
+    sample = []
+    with open(json_file, 'w') as f:
+        f.write('[')
+        for row in rows:
+            f.write(',\n  ' if count else '\n  ')
+            f.write(json.dumps(row))
+            if count < SAMPLE_ROWS:
+                sample.append(row)
+            count += 1
+        f.write('\n]\n' if count else ']\n')
+    return count, sample
+
+
+def print_summary(total_rows, sample):
+    """Print the extraction statistics and a few sample rows"""
+    print(f"Total rows extracted: {total_rows}")
+    print(f"\nFirst row (likely headers):")
+    if sample:
+        print(sample[0])
+
+    # Generate statistics
+    print(f"\n\n=== QUICK STATISTICS ===")
+    print(f"Total reports: {total_rows - 1 if total_rows else 0}")  # Subtract header row
+    if total_rows > 1:
+        print(f"Data columns per row: {len(sample[0])}")
+
+    # Print sample of data (first 5 non-header rows)
+    print(f"\n\n=== SAMPLE DATA ===")
+    for i, row in enumerate(sample[1:SAMPLE_ROWS]):  # Skip header
+        print(f"\nReport {i+1}:")
+        if len(row) > 5:
+            print(f"  Date: {row[1]}")
+            print(f"  Patient Name: {row[6] if len(row) > 6 else 'N/A'}")
+            print(f"  Age: {row[7] if len(row) > 7 else 'N/A'}")
+            print(f"  Gender: {row[9] if len(row) > 9 else 'N/A'}")
+            print(f"  Test Type: {row[10] if len(row) > 10 else 'N/A'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert reports.xls to reports_data.json")
+    parser.add_argument('xml_file', nargs='?', default=XML_FILE)
+    parser.add_argument('json_file', nargs='?', default=JSON_FILE)
+    parser.add_argument('--stream', action='store_true',
+                        help="iterparse the workbook row by row with bounded memory")
+    args = parser.parse_args(argv)
+
+    if args.stream:
+        total_rows, sample = write_rows_json(iter_rows(args.xml_file), args.json_file)
+    else:
+        rows_data = parse_rows(args.xml_file)
+        # Save to JSON for easier processing
+        with open(args.json_file, 'w') as f:
+            json.dump(rows_data, f, indent=2)
+        total_rows, sample = len(rows_data), rows_data[:SAMPLE_ROWS]
+
+    print(f"\nData saved to {args.json_file}\n")
+
+    # Keep an existing SQLite store in step with the new JSON
+    db_file = os.path.join(os.path.dirname(os.path.abspath(args.json_file)), DB_FILENAME)
+    if os.path.exists(db_file):
+        count = migrate_json(args.json_file, db_file)
+        print(f"Updated {db_file} ({count} reports)\n")
+
+    print_summary(total_rows, sample)
+
+
+if __name__ == "__main__":
+    main()
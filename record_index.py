@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Identifier index over the loaded reports
+
+Maps every identifier column (Report ID, Biopsy No., CR No., Reference
+No.) to the keys of the records carrying that value, so a typed identifier
+is resolved with dict lookups instead of a scan. Values are normalized
+before they are stored or looked up: all whitespace is removed and case is
+folded, so " kb-12 /17" finds "KB-12/17". Several records may share a value
+(a re-reported biopsy, a reused CR number); lookups return all of them in
+load order.
+"""
+
+# Columns indexed, in the order a lookup without a column tries them
+IDENTIFIER_HEADERS = ['ID', 'Biopsy No.', 'CR No.', 'Reference No.']
+
+# Older exports name some identifier columns differently
+HEADER_ALIASES = {'Biopsy No.': ['Biopsy Number'], 'Reference No.': ['Reference Number']}
+
+
+def normalize_key(value):
+    """Identifier value as stored in the index: no whitespace, case-folded"""
+    return ''.join(str(value).split()).casefold()
+
+
+class RecordIndex:
+    """Normalized identifier -> record keys, per identifier column
+
+    A value held by one record maps to its key directly; only shared values
+    get a list, which keeps the index small for large exports.
+    """
+
+    def __init__(self, headers=IDENTIFIER_HEADERS):
+        self.headers = list(headers)
+        self.columns = {header: {} for header in self.headers}
+
+    @classmethod
+    def build(cls, records):
+        """Build an index from a mapping of key -> record"""
+        index = cls()
+        for key, record in records.items():
+            index.add(key, record)
+        return index
+
+    def add(self, key, record):
+        """Index the identifiers of one record under key"""
+        for header, column in self.columns.items():
+            value = record.get(header)
+            if not value:
+                for alias in HEADER_ALIASES.get(header, ()):
+                    value = record.get(alias)
+                    if value:
+                        break
+            if not value:
+                continue
+            value = normalize_key(value)
+            if not value:
+                continue
+            existing = column.get(value)
+            if existing is None:
+                column[value] = key
+            elif isinstance(existing, list):
+                if existing[-1] != key:
+                    existing.append(key)
+            elif existing != key:
+                column[value] = [existing, key]
+
+    def lookup(self, value, header=None):
+        """Keys of the records whose identifier equals value (normalized)
+
+        With header, only that column is searched; otherwise the first
+        column in IDENTIFIER_HEADERS order that has the value answers, so a
+        Report ID is not confused with an equal CR No. of another record.
+        """
+        value = normalize_key(value)
+        headers = [header] if header else self.headers
+        for name in headers:
+            keys = self.columns.get(name, {}).get(value)
+            if keys is not None:
+                return list(keys) if isinstance(keys, list) else [keys]
+        return []
+
+    def __len__(self):
+        return sum(len(column) for column in self.columns.values())
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""
+ZIP archive output for the bulk PDF export, and a reader for it
+
+Instead of writing every report twice to Individual_PDF_Reports and
+Reports_By_Year (two files per case), the bulk export can stream the PDF
+bytes it renders in memory straight into ZIP archives:
+    - one archive with every report stored once under Year_<year>/, or
+    - one archive per year (Year_<year>.zip)
+Each archive also holds report_index.json (Report ID -> member names), so
+ReportArchive can pull a single report out by ID: it only reads the ZIP
+central directory and the index, then decompresses that one member.
+
+Usage (extract one report):
+    python report_archive.py ARCHIVE_OR_FOLDER REPORT_ID [--out FOLDER]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import zipfile
+
+INDEX_MEMBER = 'report_index.json'
+
+# Suffix of an archive while it is being written
+PARTIAL_SUFFIX = '.partial'
+
+
+class ReportArchiveWriter:
+    """Streams rendered PDFs into ZIP archives; call add() per report, then close()
+
+    With path, everything goes into that one archive under Year_<year>/;
+    with year_dir, each year gets its own Year_<year>.zip there. Archives
+    are written under a .partial name and renamed into place on close();
+    abort() discards them instead, leaving any earlier archives untouched.
+    """
+
+    def __init__(self, path=None, year_dir=None, compression=zipfile.ZIP_DEFLATED):
+        self.path = path
+        self.year_dir = year_dir
+        self.compression = compression
+        self.archives = {}    # final archive path -> open ZipFile
+        self.indexes = {}     # final archive path -> {report id: [member, ...]}
+
+    def _archive(self, path):
+        zf = self.archives.get(path)
+        if zf is None:
+            zf = zipfile.ZipFile(path + PARTIAL_SUFFIX, 'w', self.compression)
+            self.archives[path] = zf
+            self.indexes[path] = {}
+        return zf
+
+    def location(self, year, filename):
+        """(archive path, member name) a report of year with filename goes to"""
+        if self.path:
+            return self.path, f"Year_{year}/{filename}"
+        return os.path.join(self.year_dir, f"Year_{year}.zip"), filename
+
+    def add(self, report_id, year, filename, data):
+        """Store one report's PDF bytes; returns the archive path it went to"""
+        path, member = self.location(year, filename)
+        info = zipfile.ZipInfo(member, time.localtime()[:6])
+        info.compress_type = self.compression
+        self._archive(path).writestr(info, data)
+        self.indexes[path].setdefault(str(report_id), []).append(member)
+        return path
+
+    def close(self):
+        """Write the ID index into every archive and move them into place"""
+        paths = sorted(self.archives)
+        try:
+            for path in paths:
+                zf = self.archives[path]
+                zf.writestr(INDEX_MEMBER, json.dumps(self.indexes[path], ensure_ascii=False))
+                zf.close()
+                os.replace(path + PARTIAL_SUFFIX, path)
+                del self.archives[path]
+        except BaseException:
+            self.abort()
+            raise
+        return paths
+
+    def abort(self):
+        """Close and delete the unfinished archives without moving them into place"""
+        for path, zf in self.archives.items():
+            try:
+                zf.close()
+            except (OSError, ValueError, zipfile.BadZipFile):
+                pass
+            if os.path.exists(path + PARTIAL_SUFFIX):
+                os.remove(path + PARTIAL_SUFFIX)
+        self.archives = {}
+
+
+class ReportArchive:
+    """Random-access reader for an archive written by ReportArchiveWriter"""
+
+    def __init__(self, path):
+        self.path = path
+        self.zip = zipfile.ZipFile(path)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        """Report ID -> member names, from the index or else from the file names"""
+        if INDEX_MEMBER in self.zip.NameToInfo:
+            return json.loads(self.zip.read(INDEX_MEMBER).decode('utf-8'))
+        index = {}
+        for name in self.zip.namelist():
+            if name.lower().endswith('.pdf'):
+                report_id = os.path.basename(name).split('_', 1)[0]
+                index.setdefault(report_id, []).append(name)
+        return index
+
+    def ids(self):
+        return list(self.index)
+
+    def member(self, report_id):
+        """Member name of the report with this ID (the last one written), or None"""
+        members = self.index.get(str(report_id).strip())
+        return members[-1] if members else None
+
+    def read(self, report_id):
+        """PDF bytes of the report with this ID, or None"""
+        member = self.member(report_id)
+        return self.zip.read(member) if member else None
+
+    def close(self):
+        self.zip.close()
+
+
+def archive_paths(path):
+    """The archive itself, or every .zip archive in a folder"""
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path)
+                      if name.lower().endswith('.zip'))
+    return [path]
+
+
+def find_report(path, report_id):
+    """Return (archive path, member, PDF bytes) for report_id, or None"""
+    for archive_path in archive_paths(path):
+        archive = ReportArchive(archive_path)
+        try:
+            member = archive.member(report_id)
+            if member:
+                return archive_path, member, archive.zip.read(member)
+        finally:
+            archive.close()
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract one report PDF from a bulk export archive")
+    parser.add_argument('archive', help="archive, or folder of per-year archives")
+    parser.add_argument('report_id')
+    parser.add_argument('--out', default='.', help="folder to write the PDF to")
+    args = parser.parse_args(argv)
+
+    found = find_report(args.archive, args.report_id)
+    if found is None:
+        print(f"Report ID {args.report_id} not found in {args.archive}")
+        return 1
+    archive_path, member, data = found
+    target = os.path.join(args.out, os.path.basename(member))
+    with open(target, 'wb') as f:
+        f.write(data)
+    print(f"✓ {member} from {archive_path} -> {target}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
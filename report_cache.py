@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+On-disk load cache for the GUI's record map and search index
+
+Parsing reports_data.json (or reading reports_data.db) and rebuilding the
+global search index takes seconds on a large dataset, on every launch.
+After a cold load the GUI saves what it built as a marshal snapshot next to
+the source file (reports_data.json.cache / reports_data.db.cache):
+
+    length   4 bytes, little-endian size of the marshalled header
+    header   (CACHE_VERSION, Python version, mtime_ns, size, SHA-1 of the source)
+    payload  whatever the caller saved (plain lists, dicts, str and bytes)
+
+A later launch uses the payload only when the source still has the same
+mtime, size and content hash; anything else is a miss and the caller
+rebuilds (and re-saves) the cache. The cache file is written atomically and
+can be deleted at any time.
+"""
+import hashlib
+import marshal
+import os
+import struct
+import sys
+
+from write_pipeline import atomic_write
+
+# Bump whenever the payload layout changes
+CACHE_VERSION = 3
+
+CACHE_SUFFIX = '.cache'
+
+# Bytes read at a time when hashing the source file
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def cache_path(source_path):
+    """Cache file of a source data file"""
+    return source_path + CACHE_SUFFIX
+
+
+def content_hash(path):
+    """SHA-1 of a file's content"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_signature(path):
+    """(mtime_ns, size, SHA-1) of a source file; take it before reading the
+    source so an edit made while loading shows up as a miss next time"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size, content_hash(path)
+
+
+def _header(signature):
+    return (CACHE_VERSION, tuple(sys.version_info[:2])) + tuple(signature)
+
+
+def load_cache(source_path, signature=None):
+    """The payload cached for source_path, or None when there is no valid cache
+
+    signature is the source's source_signature() if the caller already has it.
+    """
+    path = cache_path(source_path)
+    try:
+        with open(path, 'rb') as f:
+            # marshal.load() on a file reads in tiny pieces; read whole blocks
+            header = marshal.loads(f.read(struct.unpack('<I', f.read(4))[0]))
+            if signature is None:
+                stat = os.stat(source_path)
+                expected = _header((stat.st_mtime_ns, stat.st_size))
+                # Cheap checks first; the content is only hashed when they pass
+                if not isinstance(header, tuple) or header[:len(expected)] != expected:
+                    return None
+                signature = source_signature(source_path)
+            if header != _header(signature):
+                return None
+            return marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError, struct.error):
+        return None
+
+
+def save_cache(source_path, payload, signature):
+    """Write payload as the cache of source_path, as it was at signature
+
+    Returns False when the cache cannot be written (e.g. a read-only share).
+    """
+    try:
+        header = marshal.dumps(_header(signature))
+        atomic_write(cache_path(source_path), struct.pack('<I', len(header)) + header + marshal.dumps(payload))
+        return True
+    except (OSError, ValueError):
+        return False
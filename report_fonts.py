@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+"""
+Embedded Unicode font for reports that the core Helvetica font cannot encode
+
+Core PDF fonts only cover Latin-1, so a name like "Łukasz" or "Zoë Œ"
+made pdf.output() raise and the record was counted as failed. Such records
+are now laid out with a TrueType font that is metric-compatible with
+Helvetica (Arial on Windows, Liberation Sans elsewhere), so the layout
+does not change. Records that fit Latin-1 keep the core font and cost
+exactly what they did before.
+
+fpdf parses the TTF in add_font() and re-reads and subsets it (plus a
+128K-entry CIDToGIDMap) on every output(). Here the metrics are parsed
+once per process and the embedded subset is cached and only rebuilt when
+a report needs a character it does not cover yet, so a worker pays for
+the font once rather than per report.
+"""
+import os
+import re
+import zlib
+
+from fpdf import FPDF
+from fpdf.ttfonts import TTFontFile
+
+# Font family name the Unicode font is registered under
+UNICODE_FONT_FAMILY = "ReportSans"
+
+# TrueType files tried per style, first match wins
+UNICODE_FONT_CANDIDATES = {
+    '': [r'C:\Windows\Fonts\arial.ttf',
+         '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
+         '/usr/share/fonts/liberation-sans/LiberationSans-Regular.ttf',
+         '/Library/Fonts/Arial.ttf'],
+    'B': [r'C:\Windows\Fonts\arialbd.ttf',
+          '/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf',
+          '/usr/share/fonts/liberation-sans/LiberationSans-Bold.ttf',
+          '/Library/Fonts/Arial Bold.ttf'],
+}
+
+# Characters every embedded subset covers, so most reports never grow it
+BASE_SUBSET = frozenset(range(32, 256))
+
+_font_files = None
+_metrics = {}     # TTF path -> parsed font dict
+_embedded = {}    # TTF path -> EmbeddedSubset
+
+
+def unicode_font_files():
+    """Style -> TTF path of the Unicode font, or None when it is not installed"""
+    global _font_files
+    if _font_files is None:
+        files = {}
+        for style, candidates in UNICODE_FONT_CANDIDATES.items():
+            found = [path for path in candidates if os.path.exists(path)]
+            if not found:
+                files = {}
+                break
+            files[style] = found[0]
+        _font_files = files
+    return _font_files or None
+
+
+def needs_unicode_font(texts):
+    """True when some text cannot be written with a core (Latin-1) font"""
+    for text in texts:
+        try:
+            text.encode('latin-1')
+        except UnicodeEncodeError:
+            return True
+    return False
+
+
+def font_metrics(path):
+    """Parsed metrics of a TTF (the dict fpdf's add_font builds), once per process"""
+    font = _metrics.get(path)
+    if font is None:
+        ttf = TTFontFile()
+        ttf.getMetrics(path)
+        font = {
+            'name': re.sub('[ ()]', '', ttf.fullName),
+            'desc': {
+                'Ascent': int(round(ttf.ascent, 0)),
+                'Descent': int(round(ttf.descent, 0)),
+                'CapHeight': int(round(ttf.capHeight, 0)),
+                'Flags': ttf.flags,
+                'FontBBox': "[%s %s %s %s]" % tuple(int(round(v, 0)) for v in ttf.bbox),
+                'ItalicAngle': int(ttf.italicAngle),
+                'StemV': int(round(ttf.stemV, 0)),
+                'MissingWidth': int(round(ttf.defaultWidth, 0)),
+            },
+            'up': round(ttf.underlinePosition),
+            'ut': round(ttf.underlineThickness),
+            'cw': ttf.charWidths,
+            'originalsize': os.stat(path).st_size,
+        }
+        _metrics[path] = font
+    return font
+
+
+class EmbeddedSubset:
+    """Font program, width array and CIDToGIDMap for a set of characters"""
+
+    def __init__(self, pdf, font, chars):
+        self.chars = frozenset(chars)
+        ttf = TTFontFile()
+        program = ttf.makeSubset(font['ttffile'], sorted(self.chars))
+        self.length1 = len(program)
+        # Kept as latin-1 str, the form fpdf's buffer holds binary data in
+        self.program = zlib.compress(program).decode('latin-1')
+
+        cidtogid = bytearray(256 * 256 * 2)
+        for cc, glyph in ttf.codeToGlyph.items():
+            cidtogid[cc * 2] = glyph >> 8
+            cidtogid[cc * 2 + 1] = glyph & 0xFF
+        self.cidtogidmap = zlib.compress(bytes(cidtogid)).decode('latin-1')
+
+        # fpdf's width writer emits through _out(); collect its /W line instead
+        lines = []
+        pdf._out = lines.append
+        try:
+            pdf._putTTfontwidths(dict(font, subset=self.chars), ttf.maxUni)
+        finally:
+            del pdf._out
+        self.widths = '\n'.join(lines)
+
+
+def embedded_subset(pdf, font):
+    """Cached subset covering every character font uses; grown when needed"""
+    used = set(font['subset'])
+    used.discard(0)
+    subset = _embedded.get(font['ttffile'])
+    if subset is None or not used <= subset.chars:
+        chars = used | BASE_SUBSET | (subset.chars if subset else frozenset())
+        subset = EmbeddedSubset(pdf, font, chars)
+        _embedded[font['ttffile']] = subset
+    return subset
+
+
+class UnicodeFPDF(FPDF):
+    """FPDF with the Unicode font registered from the per-process caches"""
+
+    def __init__(self, *args, **kwargs):
+        FPDF.__init__(self, *args, **kwargs)
+        for style, path in unicode_font_files().items():
+            fontkey = UNICODE_FONT_FAMILY.lower() + style
+            font = font_metrics(path)
+            self.fonts[fontkey] = {
+                'i': len(self.fonts) + 1, 'type': 'TTF',
+                'name': font['name'], 'desc': font['desc'],
+                'up': font['up'], 'ut': font['ut'], 'cw': font['cw'],
+                'ttffile': path, 'fontkey': fontkey,
+                'subset': list(range(0, 32)), 'unifilename': None,
+            }
+            self.font_files[fontkey] = {'length1': font['originalsize'], 'type': "TTF", 'ttffile': path}
+
+    def _putfonts(self):
+        # Core fonts as usual; the TrueType ones come from the cached subsets
+        ttf_fonts = {key: font for key, font in self.fonts.items() if font['type'] == 'TTF'}
+        for key in ttf_fonts:
+            del self.fonts[key]
+        FPDF._putfonts(self)
+        self.fonts.update(ttf_fonts)
+        for key, font in sorted(ttf_fonts.items(), key=lambda item: item[1]['i']):
+            font['n'] = self.n + 1
+            self._put_unicode_font(font, embedded_subset(self, font))
+
+    def _put_unicode_font(self, font, subset):
+        """Same objects fpdf writes for a TTF font, from a cached subset"""
+        fontname = 'MPDFAA+' + font['name']
+        n = self.n
+        self._newobj()
+        self._out('<</Type /Font\n/Subtype /Type0\n/BaseFont /%s\n/Encoding /Identity-H\n'
+                  '/DescendantFonts [%d 0 R]\n/ToUnicode %d 0 R\n>>\nendobj' % (fontname, n + 2, n + 3))
+
+        self._newobj()
+        self._out('<</Type /Font\n/Subtype /CIDFontType2\n/BaseFont /%s\n'
+                  '/CIDSystemInfo %d 0 R\n/FontDescriptor %d 0 R' % (fontname, n + 4, n + 5))
+        if font['desc'].get('MissingWidth'):
+            self._out('/DW %d' % font['desc']['MissingWidth'])
+        self._out(subset.widths)
+        self._out('/CIDToGIDMap %d 0 R\n>>\nendobj' % (n + 6))
+
+        self._newobj()
+        self._out('<</Length %d>>' % len(TO_UNICODE_CMAP))
+        self._putstream(TO_UNICODE_CMAP)
+        self._out('endobj')
+
+        self._newobj()
+        self._out('<</Registry (Adobe)\n/Ordering (UCS)\n/Supplement 0\n>>\nendobj')
+
+        self._newobj()
+        self._out('<</Type /FontDescriptor\n/FontName /' + fontname)
+        for key in ('Ascent', 'Descent', 'CapHeight', 'Flags', 'FontBBox', 'ItalicAngle', 'StemV',
+                    'MissingWidth'):
+            value = font['desc'][key]
+            if key == 'Flags':
+                value = (value | 4) & ~32
+            self._out(' /%s %s' % (key, value))
+        self._out('/FontFile2 %d 0 R\n>>\nendobj' % (n + 7))
+
+        self._newobj()
+        self._out('<</Length %d\n/Filter /FlateDecode\n>>' % len(subset.cidtogidmap))
+        self._putstream(subset.cidtogidmap)
+        self._out('endobj')
+
+        self._newobj()
+        self._out('<</Length %d\n/Filter /FlateDecode\n/Length1 %d\n>>' % (len(subset.program),
+                                                                          subset.length1))
+        self._putstream(subset.program)
+        self._out('endobj')
+
+
+# Identity ToUnicode CMap (the text is written as UTF-16BE code points)
+TO_UNICODE_CMAP = (
+    "/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n/CIDSystemInfo\n"
+    "<</Registry (Adobe)\n/Ordering (UCS)\n/Supplement 0\n>> def\n"
+    "/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+    "1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n"
+    "1 beginbfrange\n<0000> <FFFF> <0000>\nendbfrange\n"
+    "endcmap\nCMapName currentdict /CMap defineresource pop\nend\nend")
+
+
+def report_pdf(texts, core_family):
+    """(FPDF, font family) for a report made of texts
+
+    The Unicode font is only used when the texts need it and it is installed;
+    otherwise this is a plain FPDF and core_family.
+    """
+    if needs_unicode_font(texts) and unicode_font_files():
+        return UnicodeFPDF(), UNICODE_FONT_FAMILY
+    return FPDF(), core_family
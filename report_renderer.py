@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+"""
+Tk-free PDF rendering shared by the GUI and the batch scripts
+
+Both report layouts (the Report Generator form and the one-PDF-per-case
+batch export) are described declaratively below and compiled once into
+render plans by ReportLayout. Rendering goes straight from a record dict,
+so bulk jobs never touch the widgets and can run anywhere (worker
+threads, other processes, scripts).
+"""
+from datetime import datetime
+from report_fonts import report_pdf
+from text_layout import wrap_text
+
+# Form field key -> record keys that may hold its value, in order of preference
+FIELD_ALIASES = {
+    'ID': ['ID', 'Report ID'],
+    'Name': ['Name', 'Patient Name'],
+    'Age': ['Age'],
+    'Sex': ['Sex', 'Gender'],
+    'Receipt Date': ['Receipt Date'],
+    'Year': ['Year'],
+    'CR No.': ['CR No.', 'Case Reference Number'],
+    'Biopsy No.': ['Biopsy No.', 'Biopsy Number'],
+    'Ward No.': ['Ward No.', 'Ward Number'],
+    'Referred by': ['Referred by', 'Referred By'],
+    'Reference No.': ['Reference No.', 'Reference Number'],
+    'Speciment Received': ['Speciment Received', 'Specimen Received'],
+    'Report': ['Report', 'Microscopic Findings'],
+    'Impression': ['Impression', 'Pathological Impression'],
+    'Keywords': ['Keywords', 'Diagnosis', 'Keywords/Diagnosis'],
+    'Note': ['Note', 'Clinical Notes'],
+    'Reported By': ['Reported By'],
+    'Date of Report': ['Date of Report', 'Report Date'],
+    'ICD Code': ['ICD Code'],
+}
+
+# Fields edited in multi-line Text widgets (their values are read back stripped)
+TEXT_AREA_FIELDS = ('Report', 'Impression', 'Keywords', 'Note')
+
+
+def form_values(rowdict):
+    """Map a record dict onto the form field keys, as the form would hold them"""
+    values = {}
+    for field_key, candidates in FIELD_ALIASES.items():
+        value = ''
+        for cand in candidates:
+            if cand in rowdict and rowdict[cand]:
+                value = str(rowdict[cand])
+                break
+        if field_key in TEXT_AREA_FIELDS:
+            value = value.strip()
+        values[field_key] = value
+    return values
+
+
+def pdf_bytes(pdf):
+    """Serialize an FPDF document to bytes (fpdf 1.7 returns a latin-1 str)"""
+    data = pdf.output(dest='S')
+    if isinstance(data, str):
+        data = data.encode('latin-1')
+    return bytes(data)
+
+
+# Font family used by every layout (records outside Latin-1 use the embedded
+# Unicode font from report_fonts instead)
+FONT_FAMILY = "Helvetica"
+
+# Render plan op codes
+FONT, LINE, ROW, SPACE, SECTION, MULTI, STAMP = range(7)
+
+# Title block shared by every report layout
+REPORT_HEADER = [
+    {'text': "KIDNEY BIOPSY PATHOLOGY REPORT", 'style': 'B', 'size': 14, 'height': 8, 'align': 'C'},
+    {'text': "Department of Pathology - Medical Analysis Center", 'size': 9, 'align': 'C'},
+    {'space': 4},
+]
+
+# Signature lines and generation timestamp shared by every report layout
+REPORT_FOOTER = [
+    {'space': 2},
+    {'rows': [('Reported By', "Reported By:"),
+              ('Date of Report', "Report Date:"),
+              ('ICD Code', "ICD Code:")],
+     'style': 'B', 'size': 9},
+    {'space': 3},
+    {'timestamp': True},
+]
+
+# Layout of the Report Generator form (single and bulk GUI exports); values
+# are keyed by form field
+FORM_REPORT_BLOCKS = REPORT_HEADER + [
+    {'heading': "PATIENT INFORMATION",
+     'rows': [('ID', "Report ID:"), ('Name', "Patient Name:"), ('Age', "Age:"),
+              ('Sex', "Gender:"), ('Receipt Date', "Receipt Date:"), ('Year', "Year:")]},
+    {'space': 2},
+    {'heading': "CASE DETAILS",
+     'rows': [('CR No.', "Case Reference:", 40), ('Biopsy No.', "Biopsy Number:", 40),
+              ('Ward No.', "Ward:", 40), ('Referred by', "Referred By:", 40),
+              ('Reference No.', "Reference No.:", 40), ('Speciment Received', "Specimen:", 40)]},
+    {'space': 2},
+    {'section': 'Report', 'heading': "MICROSCOPIC FINDINGS"},
+    {'section': 'Impression', 'heading': "PATHOLOGICAL IMPRESSION"},
+    {'section': 'Note', 'heading': "CLINICAL NOTES"},
+    {'section': 'Keywords', 'heading': "KEYWORDS/DIAGNOSIS"},
+] + REPORT_FOOTER
+
+# Layout of the one-PDF-per-case batch export; values are keyed by the
+# export headers and free text is truncated with "..."
+BULK_REPORT_BLOCKS = REPORT_HEADER + [
+    {'heading': "PATIENT INFORMATION",
+     'rows': [('ID', "Report ID:"), ('Name', "Name:"), ('Age', "Age:"), ('Sex', "Gender:")]},
+    {'space': 2},
+    {'heading': "CASE DETAILS",
+     'rows': [('Receipt Date', "Receipt Date:"), ('Biopsy No.', "Biopsy No:"),
+              ('CR No.', "Case Ref:"), ('Ward No.', "Ward:"), ('Referred by', "Referred By:")]},
+    {'space': 2},
+    {'heading': "SPECIMEN & FINDINGS", 'rows': [('Speciment Received', "Specimen:", 30)]},
+    {'space': 2},
+    {'section': 'Report', 'heading': "MICROSCOPIC FINDINGS", 'max_length': 500},
+    {'section': 'Impression', 'heading': "PATHOLOGICAL IMPRESSION", 'max_length': 400},
+    {'section': 'Note', 'heading': "CLINICAL NOTES", 'max_length': 300, 'min_length': 3},
+    {'section': 'Keywords', 'heading': "KEYWORDS/DIAGNOSIS"},
+] + REPORT_FOOTER
+
+
+class ReportLayout:
+    """A declarative report layout compiled once into a flat render plan
+
+    Blocks are dicts of one of these kinds:
+        {'text': ..., 'style', 'size', 'height', 'align'}   static line
+        {'space': h}                                        vertical gap
+        {'heading': ..., 'rows': [(field, label[, max_length]), ...]}
+                                                            label/value rows
+        {'section': field, 'heading': ..., 'max_length', 'min_length'}
+                                                            free text, skipped when empty
+        {'timestamp': True}                                 "PDF Generated" line
+
+    Compilation resolves fonts, labels and truncation rules and drops
+    redundant font changes, so render() only substitutes record values.
+    Empty values print as `missing`; row values are cut at max_length,
+    section text is cut with a trailing "...".
+    """
+
+    def __init__(self, blocks, missing=''):
+        self.missing = missing
+        self.fields = []
+        self.plan = self._compile(blocks)
+
+    def _compile(self, blocks):
+        plan = []
+        font = [None]
+
+        def set_font(style, size, ops):
+            if font[0] == (style, size):
+                return
+            if ops and ops[-1][0] == FONT:
+                ops.pop()  # immediately overridden
+            ops.append((FONT, style, size))
+            font[0] = (style, size)
+
+        def use(field):
+            if field not in self.fields:
+                self.fields.append(field)
+
+        for block in blocks:
+            if 'text' in block:
+                set_font(block.get('style', ''), block.get('size', 9), plan)
+                plan.append((LINE, block.get('height', 6), block['text'], block.get('align', '')))
+            elif 'space' in block:
+                plan.append((SPACE, block['space']))
+            elif 'rows' in block:
+                if 'heading' in block:
+                    set_font('B', 10, plan)
+                    plan.append((LINE, 6, block['heading'], ''))
+                set_font(block.get('style', ''), block.get('size', 9), plan)
+                for row in block['rows']:
+                    field, label = row[0], row[1]
+                    use(field)
+                    plan.append((ROW, 6, label, field, row[2] if len(row) > 2 else None))
+            elif 'section' in block:
+                field = block['section']
+                use(field)
+                outer_font = font[0]
+                body = []
+                set_font('B', 10, body)
+                body.append((LINE, 6, block['heading'], ''))
+                set_font('', 9, body)
+                body.append((MULTI, 5, field, block.get('max_length')))
+                body.append((SPACE, 2))
+                plan.append((SECTION, field, block.get('min_length', 1), tuple(body)))
+                # The font after the section depends on whether it was printed
+                font[0] = outer_font if outer_font == ('', 9) else None
+            elif 'timestamp' in block:
+                set_font('', 8, plan)
+                plan.append((STAMP, 6))
+        return tuple(plan)
+
+    def _text(self, values):
+        """Stripped text of every field the layout uses ('' when empty)"""
+        text = {}
+        for field in self.fields:
+            value = values.get(field)
+            text[field] = str(value).strip() if value is not None else ''
+        return text
+
+    def render(self, values):
+        """Execute the plan against a record mapping and return the FPDF"""
+        text = self._text(values)
+        pdf, family = report_pdf(text.values(), FONT_FAMILY)
+        pdf.add_page()
+        self._run(pdf, self.plan, text, family)
+        return pdf
+
+    def _run(self, pdf, plan, text, family=FONT_FAMILY):
+        missing = self.missing
+        for op in plan:
+            code = op[0]
+            if code == ROW:
+                value = text[op[3]]
+                if not value:
+                    value = missing
+                elif op[4]:
+                    value = value[:op[4]]
+                pdf.cell(40, op[1], op[2], border=0)
+                pdf.cell(0, op[1], value, ln=True, border=0)
+            elif code == FONT:
+                pdf.set_font(family, op[1], op[2])
+            elif code == LINE:
+                pdf.cell(0, op[1], op[2], ln=True, align=op[3])
+            elif code == SPACE:
+                pdf.ln(op[1])
+            elif code == SECTION:
+                value = text[op[1]]
+                if value and value != missing and len(value) >= op[2]:
+                    self._run(pdf, op[3], text, family)
+            elif code == MULTI:
+                value = text[op[2]]
+                limit = op[3]
+                if limit and len(value) > limit:
+                    value = value[:limit] + "..."
+                self._multi_cell(pdf, op[1], value)
+            elif code == STAMP:
+                timestamp = f"PDF Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+                pdf.cell(0, op[1], timestamp, ln=True, align="C")
+
+    @staticmethod
+    def _multi_cell(pdf, h, value):
+        """pdf.multi_cell(0, h, value) with the line breaks taken from the
+        memoized text layout (core fonts; the Unicode font goes through FPDF)"""
+        if pdf.unifontsubset:
+            pdf.multi_cell(0, h, value)
+            return
+        w = pdf.w - pdf.r_margin - pdf.x
+        wmax = (w - 2 * pdf.c_margin) * 1000.0 / pdf.font_size
+        font_key = pdf.font_family + pdf.font_style
+        for line, ws, tw in wrap_text(value, font_key, pdf.font_size, wmax, pdf.k):
+            if tw:
+                pdf._out(tw)
+            pdf.ws = ws
+            pdf.cell(w, h, line, 0, 2, 'J')
+        pdf.x = pdf.l_margin
+
+
+# Compiled once per process and shared by every caller
+FORM_REPORT = ReportLayout(FORM_REPORT_BLOCKS)
+BULK_REPORT = ReportLayout(BULK_REPORT_BLOCKS, missing="N/A")
+
+
+def build_report_pdf(values):
+    """Lay out one report from a mapping of form field key -> value"""
+    return FORM_REPORT.render(values)
+
+
+def render_record_to_path(rowdict, file_path):
+    """Render a record dict straight to a PDF file (no form involved)"""
+    build_report_pdf(form_values(rowdict)).output(file_path)
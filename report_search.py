@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+In-process full-text index for the Reports Database global search
+
+The index is built once when the reports are loaded. Every field of every
+record is split into lower-cased word tokens; each token maps to the sorted
+list of record ordinals that contain it. A query is split the same way and
+every query word is matched as a prefix of the indexed tokens (vocabulary
+range found with bisect), so "lup neph" finds "Lupus nephritis". Records
+must match all query words. Results come back in load order.
+
+snapshot() / from_snapshot() turn a finished index into plain bytes and
+lists (for the on-disk load cache in report_cache.py) and back.
+"""
+from collections import OrderedDict
+from bisect import bisect_left
+from array import array
+import re
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Number of per-word prefix results kept between keystrokes
+PREFIX_CACHE_SIZE = 256
+
+
+def tokenize(text):
+    """Lower-cased word tokens of a field value"""
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class ReportSearchIndex:
+    """Inverted index over all fields of the loaded records"""
+
+    def __init__(self):
+        self.keys = []            # ordinal -> record key (data_map key)
+        self.postings = {}        # token -> sorted list of ordinals
+        self.vocabulary = []      # sorted tokens, for prefix ranges
+        self._prefix_cache = OrderedDict()
+
+    @classmethod
+    def build(cls, records):
+        """Build an index from a mapping of key -> record dict"""
+        index = cls()
+        for key, record in records.items():
+            index.add(key, record)
+        index.finalize()
+        return index
+
+    def add(self, key, record):
+        """Index one record; call finalize() once all records are added"""
+        ordinal = len(self.keys)
+        self.keys.append(key)
+        postings = self.postings
+        tokens = set()
+        for value in record.values():
+            if value:
+                tokens.update(tokenize(value))
+        for token in tokens:
+            ordinals = postings.get(token)
+            if ordinals is None:
+                postings[token] = [ordinal]
+            else:
+                ordinals.append(ordinal)
+
+    def finalize(self):
+        """Sort the vocabulary after adding records"""
+        self.vocabulary = sorted(self.postings)
+        self._prefix_cache.clear()
+
+    def snapshot(self):
+        """(keys, vocabulary, {token: packed ordinals}) of a finalized index"""
+        return (list(self.keys), list(self.vocabulary),
+                {token: array('I', ordinals).tobytes() for token, ordinals in self.postings.items()})
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Index restored from snapshot(); postings come back as arrays"""
+        keys, vocabulary, packed = snapshot
+        index = cls()
+        index.keys = keys
+        index.vocabulary = vocabulary
+        postings = index.postings
+        for token, data in packed.items():
+            ordinals = array('I')
+            ordinals.frombytes(data)
+            postings[token] = ordinals
+        return index
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _match_prefix(self, prefix):
+        """Set of ordinals whose record has a token starting with prefix"""
+        cached = self._prefix_cache.get(prefix)
+        if cached is not None:
+            self._prefix_cache.move_to_end(prefix)
+            return cached
+
+        vocabulary = self.vocabulary
+        start = bisect_left(vocabulary, prefix)
+        end = bisect_left(vocabulary, prefix + '\U0010ffff', start)
+        if end - start == 1:
+            matches = set(self.postings[vocabulary[start]])
+        else:
+            matches = set().union(*(self.postings[vocabulary[i]] for i in range(start, end)))
+
+        self._prefix_cache[prefix] = matches
+        if len(self._prefix_cache) > PREFIX_CACHE_SIZE:
+            self._prefix_cache.popitem(last=False)
+        return matches
+
+    def search(self, query):
+        """Return the keys of all records matching every word of query"""
+        terms = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not terms:
+            return list(self.keys)
+
+        result = None
+        for term in terms:
+            matches = self._match_prefix(term)
+            result = matches if result is None else result & matches
+            if not result:
+                return []
+        keys = self.keys
+        return [keys[ordinal] for ordinal in sorted(result)]
@@ -0,0 +1,896 @@
+#!/usr/bin/env python
+"""
+SQLite-backed record store for the kidney biopsy reports
+
+reports_data.json is a list-of-lists (header row first) that every consumer
+used to json.load in full. This module keeps the same rows in a SQLite
+database next to it, with indexes on the identifier and filter columns, and
+exposes a small data-access API shared by the GUI and the batch scripts:
+
+    load_table()        -> (headers, data_rows), from the store or the JSON
+    iter_table()        -> (headers, row iterator), streamed from either source
+    iter_selection(q)   -> (headers, (position, row) iterator) of the records
+                           matching a bulk query, via the store's indexes
+    open_store()        -> ReportStore for index lookups, or None (migrated
+                           again first when reports_data.json has changed)
+    record_maker(h)     -> turns data rows into compact read-only ReportRecords
+    iter_json_records() -> (headers, JsonColdColumns, (position, row) iterator)
+                           for loading only the hot columns of the JSON
+    parse_query(...)    -> bulk selection criteria (year range, referring
+                           physician, keyword/ICD prefix, receipt dates)
+    migrate_json(...)   -> one-shot JSON -> SQLite migration
+
+Migrate once with:
+    python report_store.py [reports_data.json] [reports_data.db]
+
+The store records the size and modification time of the JSON it was
+migrated from; parse_reports.py refreshes an existing store, and
+open_store() migrates again whenever the JSON next to the store no longer
+matches, so a re-parse is never hidden behind the old data.
+"""
+import sqlite3
+import json
+import re
+import os
+import sys
+from array import array
+from collections.abc import Mapping
+
+DATA_DIR = r'g:\dr_vinita\xml convert'
+JSON_FILENAME = 'reports_data.json'
+DB_FILENAME = 'reports_data.db'
+
+# Header columns that get a B-tree index (Year and Receipt Date are indexed
+# through their typed columns so range queries can use the index)
+INDEXED_HEADERS = ['Biopsy No.', 'ID', 'CR No.', 'Reference No.', 'Referred by']
+
+# Header columns matched by case-insensitive prefix in bulk queries; they get
+# a NOCASE index so the prefix becomes an index range
+PREFIX_INDEXED_HEADERS = ['Referred by', 'ICD Code']
+
+# Bulk query criterion -> (header, kind); kind 'prefix' is a case-insensitive
+# prefix of the header's value, 'keyword' the same for any one of the
+# comma-separated keywords in it, 'year'/'date' an inclusive bound
+QUERY_CRITERIA = {
+    'year_from': ('Year', 'year'),
+    'year_to': ('Year', 'year'),
+    'referred_by': ('Referred by', 'prefix'),
+    'keyword': ('Keywords', 'keyword'),
+    'icd_code': ('ICD Code', 'prefix'),
+    'date_from': ('Receipt Date', 'date'),
+    'date_to': ('Receipt Date', 'date'),
+}
+
+DATE_PATTERN = re.compile(r'^\s*(\d{1,2})[-/.](\d{1,2})[-/.](\d{2,4})\s*$')
+
+# One row per keyword of a record's Keywords cell, for the keyword query
+KEYWORD_TABLE = "CREATE TABLE IF NOT EXISTS report_keywords (keyword TEXT COLLATE NOCASE, report INTEGER)"
+KEYWORD_INDEX = "CREATE INDEX IF NOT EXISTS idx_report_keywords ON report_keywords (keyword, report)"
+
+# Characters read from reports_data.json at a time when streaming it
+JSON_CHUNK_SIZE = 1 << 16
+
+# Rows fetched from the SQLite cursor at a time when streaming it
+STREAM_BATCH_SIZE = 1000
+
+# Long free-text columns; the GUI loads the other (hot) columns at startup
+# and reads these per record when a report is opened or rendered
+COLD_HEADERS = ['Report', 'Impression', 'Note', 'Addendum']
+
+
+def find_data_file(filename):
+    """Return the first existing copy of filename (script dir, then DATA_DIR)"""
+    for base in (os.path.dirname(os.path.abspath(__file__)), DATA_DIR):
+        path = os.path.join(base, filename)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def column_name(header):
+    """Turn a spreadsheet header such as 'Biopsy No.' into 'biopsy_no'"""
+    return re.sub(r'\W+', '_', header.strip().lower()).strip('_') or 'column'
+
+
+def split_keywords(text):
+    """The trimmed, non-empty keywords of a comma-separated Keywords cell"""
+    return [keyword.strip() for keyword in str(text or '').split(',') if keyword.strip()]
+
+
+def parse_year(text):
+    """Return the year as an int, or None when it is not a number"""
+    try:
+        return int(str(text).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_date(text):
+    """Normalise a DD-MM-YYYY style date to ISO YYYY-MM-DD, or None"""
+    match = DATE_PATTERN.match(str(text or ''))
+    if not match:
+        return None
+    day, month, year = (int(part) for part in match.groups())
+    if year < 100:
+        year += 2000
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return None
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def parse_query(criteria):
+    """Clean bulk query criteria (QUERY_CRITERIA names -> text)
+
+    Empty values are dropped, years become ints and dates ISO strings (both
+    DD-MM-YYYY and YYYY-MM-DD are accepted); raises ValueError on a value
+    that cannot be parsed.
+    """
+    query = {}
+    for name, value in criteria.items():
+        if name not in QUERY_CRITERIA:
+            raise ValueError(f"Unknown query criterion: {name}")
+        value = str(value or '').strip()
+        if not value:
+            continue
+        kind = QUERY_CRITERIA[name][1]
+        if kind == 'year':
+            query[name] = parse_year(value)
+        elif kind == 'date':
+            if re.match(r'^\d{4}-\d{1,2}-\d{1,2}$', value):
+                value = '-'.join(reversed(value.split('-')))
+            query[name] = parse_date(value)
+        else:
+            query[name] = value.lower()
+        if query[name] is None:
+            raise ValueError(f"Invalid {name.replace('_', ' ')}: {value}")
+    return query
+
+
+def describe_query(query):
+    """Short human-readable summary of parsed query criteria"""
+    parts = []
+    for low, high, label in (('year_from', 'year_to', 'Year'), ('date_from', 'date_to', 'Received')):
+        if low in query or high in query:
+            parts.append(f"{label} {query.get(low, '...')} to {query.get(high, '...')}")
+    for name, label in (('referred_by', 'Referred by'), ('keyword', 'Keywords'), ('icd_code', 'ICD')):
+        if name in query:
+            parts.append(f"{label} {query[name]}*")
+    return ', '.join(parts) or 'All reports'
+
+
+def record_matches(record, query):
+    """Whether a header -> value record satisfies parsed query criteria
+    (for records that are not in the SQLite store)"""
+    for name, bound in query.items():
+        header, kind = QUERY_CRITERIA[name]
+        value = record.get(header, '')
+        if kind == 'year':
+            value = parse_year(value)
+        elif kind == 'date':
+            value = parse_date(value)
+        elif kind == 'keyword':
+            if not any(keyword.lower().startswith(bound) for keyword in split_keywords(value)):
+                return False
+            continue
+        else:
+            if not str(value or '').strip().lower().startswith(bound):
+                return False
+            continue
+        if value is None or (value < bound if name.endswith('_from') else value > bound):
+            return False
+    return True
+
+
+class ReportRecord(Mapping):
+    """Read-only record: a tuple of values plus a header -> position map
+    shared by every record of the table
+
+    A dict per record repeats the header keys and a hash table for every
+    row; this keeps one small object and one tuple per record. It behaves
+    like the record dict it replaces for reading (get, [], in, keys, items,
+    iteration in header order).
+    """
+    __slots__ = ('_positions', '_values')
+
+    def __init__(self, positions, values):
+        self._positions = positions
+        self._values = values
+
+    def __getitem__(self, header):
+        return self._values[self._positions[header]]
+
+    def get(self, header, default=None):
+        position = self._positions.get(header)
+        return default if position is None else self._values[position]
+
+    def __contains__(self, header):
+        return header in self._positions
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def keys(self):
+        return self._positions.keys()
+
+    def values(self):
+        """The values in header order (a tuple)"""
+        return self._values
+
+    def items(self):
+        return zip(self._positions, self._values)
+
+    def __repr__(self):
+        return f"ReportRecord({dict(self.items())!r})"
+
+
+def record_maker(headers, share_values=False):
+    """Return a function that turns a data row (header order, possibly
+    short) into a ReportRecord; all its records share one position map
+
+    With share_values, equal strings across records (years, physicians,
+    impressions, dates...) become one object. The lookup table for that
+    lives as long as the returned function, so use it for one load pass.
+    """
+    # Later duplicate headers win, as with dict(zip(headers, row))
+    columns = {header: i for i, header in enumerate(headers)}
+    picks = list(columns.values())
+    positions = {header: n for n, header in enumerate(columns)}
+    width = len(headers)
+    pool = {}
+
+    def make(row):
+        if len(row) < width:
+            row = list(row) + [''] * (width - len(row))
+        values = row[:width] if len(picks) == width else [row[i] for i in picks]
+        if share_values:
+            values = [pool.setdefault(v, v) if type(v) is str else v for v in values]
+        return ReportRecord(positions, tuple(values))
+
+    return make
+
+
+class LazyReportRecord(ReportRecord):
+    """ReportRecord that holds only the hot columns; a cold column is read
+    from the data source (by the record's key) when it is asked for
+
+    Reading the long free text of one record costs a file seek or an index
+    seek, so callers that need several cold fields take full() once.
+    """
+    __slots__ = ('_cold', '_key')
+
+    def __init__(self, positions, values, cold, key):
+        super().__init__(positions, values)
+        self._cold = cold
+        self._key = key
+
+    def __getitem__(self, header):
+        position = self._positions.get(header)
+        if position is not None:
+            return self._values[position]
+        return self._cold.fetch(self._key)[self._cold.cold_positions[header]]
+
+    def get(self, header, default=None):
+        position = self._positions.get(header)
+        if position is not None:
+            return self._values[position]
+        position = self._cold.cold_positions.get(header)
+        return default if position is None else self._cold.fetch(self._key)[position]
+
+    def __contains__(self, header):
+        return header in self._positions or header in self._cold.cold_positions
+
+    def __iter__(self):
+        return iter(self._cold.fields)
+
+    def __len__(self):
+        return len(self._cold.fields)
+
+    def keys(self):
+        return self._cold.positions.keys()
+
+    def values(self):
+        return self.full().values()
+
+    def items(self):
+        return self.full().items()
+
+    def hot_values(self):
+        """The hot column values (a tuple in hot_fields order)"""
+        return self._values
+
+    def full(self):
+        """A ReportRecord with every column, the cold ones read in"""
+        return self._cold.full_record(self._values, self._cold.fetch(self._key))
+
+
+def full_record(record):
+    """record with its cold columns read in; other records are returned as is"""
+    return record.full() if isinstance(record, LazyReportRecord) else record
+
+
+class ColdColumns:
+    """Splits a header row into hot and cold (COLD_HEADERS) columns and
+    reads the cold values of one record back from the data source
+
+    Subclasses implement fetch(key) -> cold values in cold_fields order.
+    """
+
+    def __init__(self, headers, cold_headers=COLD_HEADERS):
+        # Later duplicate headers win, as in record_maker()
+        columns = {header: i for i, header in enumerate(headers)}
+        self.headers = list(headers)
+        self.fields = list(columns)
+        self.hot_fields = [h for h in self.fields if h not in cold_headers]
+        self.cold_fields = [h for h in self.fields if h in cold_headers]
+        self.positions = {header: n for n, header in enumerate(self.fields)}
+        self.hot_positions = {header: n for n, header in enumerate(self.hot_fields)}
+        self.cold_positions = {header: n for n, header in enumerate(self.cold_fields)}
+        self.hot_picks = [columns[h] for h in self.hot_fields]
+        self.cold_picks = [columns[h] for h in self.cold_fields]
+        # (is cold, position) of every field, for reassembling full records
+        self._order = [(1, self.cold_positions[h]) if h in self.cold_positions else (0, self.hot_positions[h])
+                       for h in self.fields]
+
+    def record(self, key, hot_values):
+        """LazyReportRecord of key from its hot values (hot_fields order)"""
+        return LazyReportRecord(self.hot_positions, tuple(hot_values), self, key)
+
+    def record_maker(self, share_values=False):
+        """Return a function (key, data row) -> LazyReportRecord keeping the
+        row's hot values; share_values as in record_maker()"""
+        picks = self.hot_picks
+        width = len(self.headers)
+        pool = {}
+
+        def make(key, row):
+            if len(row) < width:
+                row = list(row) + [''] * (width - len(row))
+            values = [row[i] for i in picks]
+            if share_values:
+                values = [pool.setdefault(v, v) if type(v) is str else v for v in values]
+            return LazyReportRecord(self.hot_positions, tuple(values), self, key)
+
+        return make
+
+    def full_record(self, hot_values, cold_values):
+        """ReportRecord of all fields from a record's hot and cold values"""
+        parts = (hot_values, cold_values)
+        return ReportRecord(self.positions, tuple(parts[cold][n] for cold, n in self._order))
+
+    def _cold_values(self, row):
+        """Cold values picked from a full data row (possibly short)"""
+        return tuple(row[i] if i < len(row) else '' for i in self.cold_picks)
+
+    def fetch(self, key):
+        raise NotImplementedError
+
+
+class JsonColdColumns(ColdColumns):
+    """Cold columns read back from reports_data.json
+
+    Keeps the byte span of every element of the JSON array (element 0 is
+    the header row, so a data row's span is at its 1-based position); a
+    fetch reads and decodes that one row. The spans are only valid for the
+    file as it was loaded: a changed mtime or size makes fetch() fail
+    instead of reading some other report.
+    """
+
+    def __init__(self, json_path, headers, signature=None, spans=None, cold_headers=COLD_HEADERS):
+        super().__init__(headers, cold_headers)
+        self.json_path = json_path
+        if signature is None:
+            stat = os.stat(json_path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        self.signature = tuple(signature)
+        self.starts = array('q')
+        self.ends = array('q')
+        if spans is not None:
+            self.starts.frombytes(spans[0])
+            self.ends.frombytes(spans[1])
+
+    def add_span(self, start, end):
+        """Record the byte span of the next element of the array"""
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def spans(self):
+        """(starts, ends) as bytes, for the load cache"""
+        return self.starts.tobytes(), self.ends.tobytes()
+
+    def fetch(self, key):
+        stat = os.stat(self.json_path)
+        if (stat.st_mtime_ns, stat.st_size) != self.signature:
+            raise ValueError(f"{self.json_path} has changed since the reports were loaded; "
+                             f"restart to reload them")
+        # Opened per fetch so the file is never held open (and locked on Windows)
+        with open(self.json_path, 'rb') as f:
+            f.seek(self.starts[key])
+            data = f.read(self.ends[key] - self.starts[key])
+        return self._cold_values(json.loads(data.decode('utf-8')))
+
+
+class StoreColdColumns(ColdColumns):
+    """Cold columns read back from the SQLite store by rowid (the key)
+
+    Connects per fetch, so records can be read from any thread.
+    """
+
+    def __init__(self, db_path, headers, columns, cold_headers=COLD_HEADERS):
+        super().__init__(headers, cold_headers)
+        self.db_path = db_path
+        column_list = ', '.join(f'"{columns[i]}"' for i in self.cold_picks)
+        self._select = f"SELECT {column_list} FROM reports WHERE rowid = ?"
+
+    def fetch(self, key):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            values = conn.execute(self._select, (key,)).fetchone()
+        finally:
+            conn.close()
+        if values is None:
+            raise KeyError(key)
+        return tuple('' if v is None else v for v in values)
+
+
+class ReportStore:
+    """Reports table in SQLite with typed columns and lookup indexes
+
+    Every header column is stored as TEXT exactly as it appears in the
+    export (missing trailing cells are NULL), plus two typed columns derived
+    on insert: year_num INTEGER and receipt_date_iso TEXT (YYYY-MM-DD).
+    Each record's comma-separated Keywords are also stored one per row in
+    report_keywords (keyword, report rowid) for the keyword query.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'headers'").fetchone()
+        self.headers = json.loads(row[0])
+        self.columns = self._column_names(self.headers)
+        self._query_indexes_checked = False
+        self._make_record = record_maker(self.headers)
+
+    @staticmethod
+    def _column_names(headers):
+        """SQL column name for each header, de-duplicated in order"""
+        columns = []
+        for header in headers:
+            name = column_name(header)
+            candidate, n = name, 2
+            while candidate in columns or candidate in ('rowid', 'year_num', 'receipt_date_iso'):
+                candidate = f"{name}_{n}"
+                n += 1
+            columns.append(candidate)
+        return columns
+
+    @classmethod
+    def create(cls, db_path, headers):
+        """Create an empty store with the schema for the given header row"""
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        columns = cls._column_names(headers)
+        conn = sqlite3.connect(db_path)
+        with conn:
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("INSERT INTO meta VALUES ('headers', ?)", (json.dumps(headers),))
+            column_defs = ', '.join(f'"{c}" TEXT' for c in columns)
+            conn.execute(f"CREATE TABLE reports (rowid INTEGER PRIMARY KEY, {column_defs}, "
+                         f"year_num INTEGER, receipt_date_iso TEXT)")
+            conn.execute(KEYWORD_TABLE)
+        conn.close()
+        return cls(db_path)
+
+    def create_indexes(self):
+        """Build the lookup indexes (done after the bulk insert)"""
+        with self.conn:
+            for name, definition in self._index_definitions():
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON reports ({definition})')
+            self.conn.execute(KEYWORD_INDEX)
+            self.conn.execute("ANALYZE")
+
+    def _index_definitions(self):
+        """(index name, column definition) of every lookup index"""
+        indexed = [self.columns[self.headers.index(h)] for h in INDEXED_HEADERS if h in self.headers]
+        indexed += ['year_num', 'receipt_date_iso']
+        definitions = [(f"idx_{column}", f'"{column}"') for column in indexed]
+        for header in PREFIX_INDEXED_HEADERS:
+            if header in self.headers:
+                column = self.columns[self.headers.index(header)]
+                definitions.append((f"idx_{column}_nocase", f'"{column}" COLLATE NOCASE'))
+        return definitions
+
+    def _ensure_query_indexes(self):
+        """Add indexes (and the keyword table) missing from stores migrated
+        by an older version"""
+        if self._query_indexes_checked:
+            return
+        existing = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master")}
+        if 'report_keywords' not in existing:
+            with self.conn:
+                self.conn.execute(KEYWORD_TABLE)
+                self._insert_keywords(0)
+        if any(name not in existing for name, _ in self._index_definitions() + [('idx_report_keywords', '')]):
+            self.create_indexes()
+        self._query_indexes_checked = True
+
+    def _insert_keywords(self, after_rowid):
+        """Fill report_keywords for the records after after_rowid"""
+        if 'Keywords' not in self.headers:
+            return
+        column = self.columns[self.headers.index('Keywords')]
+        cursor = self.conn.execute(f'SELECT rowid, "{column}" FROM reports WHERE rowid > ?', (after_rowid,))
+        self.conn.executemany("INSERT INTO report_keywords (keyword, report) VALUES (?, ?)",
+                              ((keyword, rowid) for rowid, text in cursor for keyword in split_keywords(text)))
+
+    def insert_rows(self, rows):
+        """Append data rows (lists in header order); returns the number inserted"""
+        width = len(self.headers)
+        year_pos = self.headers.index('Year') if 'Year' in self.headers else None
+        date_pos = self.headers.index('Receipt Date') if 'Receipt Date' in self.headers else None
+
+        def values():
+            for row in rows:
+                cells = list(row[:width]) + [None] * (width - len(row))
+                year = cells[year_pos] if year_pos is not None else None
+                date = cells[date_pos] if date_pos is not None else None
+                yield cells + [parse_year(year), parse_date(date)]
+
+        placeholders = ', '.join('?' * (width + 2))
+        column_list = ', '.join(f'"{c}"' for c in self.columns)
+        last_rowid = self.conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM reports").fetchone()[0]
+        with self.conn:
+            cursor = self.conn.executemany(
+                f"INSERT INTO reports ({column_list}, year_num, receipt_date_iso) VALUES ({placeholders})",
+                values())
+            inserted = cursor.rowcount
+            self._insert_keywords(last_rowid)
+        return inserted
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+    def _select(self, where='', params=()):
+        column_list = ', '.join(f'"{c}"' for c in self.columns)
+        return self.conn.execute(f"SELECT {column_list} FROM reports {where}", params)
+
+    @staticmethod
+    def _as_row(values):
+        """Stored values back to the original JSON row (trailing NULLs dropped)"""
+        row = list(values)
+        while row and row[-1] is None:
+            row.pop()
+        return ['' if v is None else v for v in row]
+
+    def _as_record(self, values, make_record=None):
+        """Stored values as a ReportRecord (NULLs read as '')"""
+        return (make_record or self._make_record)(['' if v is None else v for v in values])
+
+    def iter_rows(self, batch_size=1000):
+        """Yield data rows in export order, fetched from a cursor in batches"""
+        cursor = self._select("ORDER BY rowid")
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            for values in batch:
+                yield self._as_row(values)
+
+    def iter_numbered_rows(self, batch_size=1000):
+        """Yield (rowid, data row) of every record in export order; rowid
+        is the record's 1-based position"""
+        column_list = ', '.join(f'"{c}"' for c in self.columns)
+        cursor = self.conn.execute(f"SELECT rowid, {column_list} FROM reports ORDER BY rowid")
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            for values in batch:
+                yield values[0], self._as_row(values[1:])
+
+    def cold_columns(self, cold_headers=COLD_HEADERS):
+        """StoreColdColumns reading this store's cold columns by rowid"""
+        return StoreColdColumns(self.db_path, self.headers, self.columns, cold_headers)
+
+    def iter_records(self, batch_size=1000):
+        """Yield every record as a ReportRecord, in export order; repeated
+        values are shared between the records of one pass"""
+        make_record = record_maker(self.headers, share_values=True)
+        cursor = self._select("ORDER BY rowid")
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            for values in batch:
+                yield self._as_record(values, make_record)
+
+    def find(self, header, value):
+        """Return all records whose header column equals value (index seek)"""
+        if header not in self.headers:
+            return []
+        column = self.columns[self.headers.index(header)]
+        cursor = self._select(f'WHERE "{column}" = ? ORDER BY rowid', (str(value),))
+        return [self._as_record(values) for values in cursor]
+
+    def _query_where(self, query):
+        """WHERE clause and parameters for parsed query criteria
+        
+        Every criterion is a range over an indexed column (prefixes run from
+        the prefix up to the prefix followed by the highest code point), so
+        SQLite can seek the most selective index instead of scanning; a
+        keyword is looked up in report_keywords the same way.
+        """
+        clauses = []
+        params = []
+        for name, bound in query.items():
+            header, kind = QUERY_CRITERIA[name]
+            if kind == 'prefix':
+                if header not in self.headers:
+                    return 'WHERE 0', ()
+                column = f'"{self.columns[self.headers.index(header)]}" COLLATE NOCASE'
+                clauses.append(f"{column} >= ? AND {column} < ?")
+                params += [bound, bound + '\U0010ffff']
+            elif kind == 'keyword':
+                if header not in self.headers:
+                    return 'WHERE 0', ()
+                clauses.append("rowid IN (SELECT report FROM report_keywords WHERE keyword >= ? AND keyword < ?)")
+                params += [bound, bound + '\U0010ffff']
+            else:
+                column = 'year_num' if kind == 'year' else 'receipt_date_iso'
+                clauses.append(f"{column} {'>=' if name.endswith('_from') else '<='} ?")
+                params.append(bound)
+        return ('WHERE ' + ' AND '.join(clauses) if clauses else ''), tuple(params)
+
+    def query_rows(self, query, batch_size=1000):
+        """Yield (rowid, data row) of the records matching parsed query
+        criteria, in export order; rowid is the record's 1-based position"""
+        self._ensure_query_indexes()
+        where, params = self._query_where(query)
+        column_list = ', '.join(f'"{c}"' for c in self.columns)
+        cursor = self.conn.execute(f"SELECT rowid, {column_list} FROM reports {where} ORDER BY rowid", params)
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            for values in batch:
+                yield values[0], self._as_row(values[1:])
+
+    def query_records(self, query):
+        """Header -> value records matching parsed query criteria, in export order"""
+        self._ensure_query_indexes()
+        where, params = self._query_where(query)
+        return [self._as_record(values) for values in self._select(f"{where} ORDER BY rowid", params)]
+
+    def get_by_biopsy_no(self, biopsy_num):
+        """Latest record with the given Biopsy No., or None"""
+        matches = self.find('Biopsy No.', biopsy_num)
+        return matches[-1] if matches else None
+
+    def get_by_id(self, report_id):
+        """Latest record with the given Report ID, or None"""
+        matches = self.find('ID', report_id)
+        return matches[-1] if matches else None
+
+    def source_signature(self):
+        """(mtime_ns, size) of the JSON the store was migrated from, or None"""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        return tuple(json.loads(row[0])) if row else None
+
+    def close(self):
+        self.conn.close()
+
+
+def json_signature(json_path):
+    """(mtime_ns, size) of reports_data.json, as recorded in the store"""
+    stat = os.stat(json_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def migrate_json(json_path, db_path):
+    """One-shot migration of reports_data.json into a new SQLite store
+
+    The store is built under a temporary name and then replaces db_path.
+    """
+    # Taken before reading, so an edit made meanwhile shows up as stale
+    signature = json_signature(json_path)
+    with open(json_path, 'r', encoding='utf-8') as f:
+        rows = json.load(f)
+    if not rows:
+        raise ValueError(f"{json_path} contains no header row")
+
+    tmp_path = db_path + '.tmp'
+    store = ReportStore.create(tmp_path, rows[0])
+    try:
+        try:
+            count = store.insert_rows(rows[1:])
+            store.create_indexes()
+            with store.conn:
+                store.conn.execute("INSERT INTO meta VALUES ('source', ?)", (json.dumps(signature),))
+        finally:
+            store.close()
+        os.replace(tmp_path, db_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+
+def open_store(db_path=None, json_path=None):
+    """Open the SQLite store if it exists, otherwise return None
+
+    When json_path (default: reports_data.json next to the store) has
+    changed since the store was migrated from it, the store is migrated
+    again first; if that fails the stale store is not used and None is
+    returned, so callers read the JSON instead.
+    """
+    db_path = db_path or find_data_file(DB_FILENAME)
+    if not db_path or not os.path.exists(db_path):
+        return None
+    json_path = json_path or os.path.join(os.path.dirname(os.path.abspath(db_path)), JSON_FILENAME)
+    store = ReportStore(db_path)
+    if not os.path.exists(json_path) or store.source_signature() == json_signature(json_path):
+        return store
+
+    store.close()
+    print(f"{json_path} has changed since {db_path} was built; migrating it again")
+    try:
+        migrate_json(json_path, db_path)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Warning: could not update {db_path} ({e}); reading {json_path} instead")
+        return None
+    return ReportStore(db_path)
+
+
+def _utf8_length(text):
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+
+def iter_json_array(path, chunk_size=JSON_CHUNK_SIZE, with_spans=False):
+    """Yield the elements of the top-level JSON array in path one by one,
+    reading the file in chunks instead of parsing it whole
+
+    With with_spans, yields (element, start, end) with the element's byte
+    offsets in the file.
+    """
+    decoder = json.JSONDecoder()
+    # newline='' keeps \r\n as two characters, so byte offsets stay exact
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        buffer, pos, eof = '', 0, False
+        opened = False
+        # Byte offset of buffer[mark]
+        mark, mark_offset = 0, 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer):
+                if not opened:
+                    if buffer[pos] != '[':
+                        raise ValueError(f"{path} does not contain a JSON array")
+                    opened = True
+                    pos += 1
+                    continue
+                if buffer[pos] == ']':
+                    return
+                try:
+                    element, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    # An element running up to the end of the buffer may be cut off
+                    if end < len(buffer) or eof:
+                        if with_spans:
+                            start = mark_offset + _utf8_length(buffer[mark:pos])
+                            mark, mark_offset = end, start + _utf8_length(buffer[pos:end])
+                            yield element, start, mark_offset
+                        else:
+                            yield element
+                        pos = end
+                        continue
+            elif eof:
+                raise ValueError(f"{path}: unexpected end of JSON array")
+            # Keep the unparsed tail and read the next chunk
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            if with_spans:
+                mark_offset += _utf8_length(buffer[mark:pos])
+                mark = 0
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+
+def _store_rows(store, rows):
+    """Stream rows from a store, closing it once they are exhausted"""
+    try:
+        yield from rows
+    finally:
+        store.close()
+
+
+def iter_table(json_path=None, db_path=None, batch_size=STREAM_BATCH_SIZE):
+    """Like load_table(), but the data rows come from an iterator that reads
+    them in batches from the SQLite cursor or parses reports_data.json
+    incrementally, so the whole table is never held in memory"""
+    store = open_store(db_path, json_path)
+    if store is not None:
+        return list(store.headers), _store_rows(store, store.iter_rows(batch_size))
+
+    json_path = json_path or find_data_file(JSON_FILENAME)
+    if not json_path or not os.path.exists(json_path):
+        return [], iter(())
+    rows = iter_json_array(json_path)
+    headers = next(rows, [])
+    return headers, rows
+
+
+def iter_json_records(json_path, cold_headers=COLD_HEADERS):
+    """(headers, JsonColdColumns, (position, row) iterator) of reports_data.json
+
+    The rows are parsed incrementally; the cold columns object learns each
+    row's byte span as it is read, so the cold values of a row already
+    yielded can be fetched back from the file.
+    """
+    signature = os.stat(json_path)
+    elements = iter_json_array(json_path, with_spans=True)
+    headers, start, end = next(elements, ([], 0, 0))
+    cold = JsonColdColumns(json_path, headers, (signature.st_mtime_ns, signature.st_size),
+                           cold_headers=cold_headers)
+    cold.add_span(start, end)
+
+    def numbered():
+        for position, (row, start, end) in enumerate(elements, start=1):
+            cold.add_span(start, end)
+            yield position, row
+
+    return headers, cold, numbered()
+
+
+def iter_selection(query=None, json_path=None, db_path=None, batch_size=STREAM_BATCH_SIZE):
+    """Like iter_table(), but yields (position, row) of the records matching
+    parsed query criteria; position is the 1-based place in export order
+
+    The SQLite store answers the query from its indexes; records streamed
+    from reports_data.json are tested one by one.
+    """
+    store = open_store(db_path, json_path)
+    if store is not None:
+        return list(store.headers), _store_rows(store, store.query_rows(query or {}, batch_size))
+
+    headers, rows = iter_table(json_path, db_path, batch_size)
+    numbered = enumerate(rows, start=1)
+    if query:
+        numbered = ((position, row) for position, row in numbered
+                    if record_matches(dict(zip(headers, row)), query))
+    return headers, numbered
+
+
+def load_table(json_path=None, db_path=None):
+    """Return (headers, data_rows), preferring the SQLite store over the JSON"""
+    store = open_store(db_path, json_path)
+    if store is not None:
+        try:
+            return list(store.headers), list(store.iter_rows())
+        finally:
+            store.close()
+
+    json_path = json_path or find_data_file(JSON_FILENAME)
+    if not json_path or not os.path.exists(json_path):
+        return [], []
+    with open(json_path, 'r', encoding='utf-8') as f:
+        rows_data = json.load(f)
+    headers = rows_data[0] if rows_data else []
+    data_rows = rows_data[1:] if len(rows_data) > 1 else []
+    return headers, data_rows
+
+
+if __name__ == "__main__":
+    src = sys.argv[1] if len(sys.argv) > 1 else (find_data_file(JSON_FILENAME)
+                                                 or os.path.join(DATA_DIR, JSON_FILENAME))
+    dst = sys.argv[2] if len(sys.argv) > 2 else os.path.join(os.path.dirname(src), DB_FILENAME)
+    print(f"Migrating {src} -> {dst}")
+    count = migrate_json(src, dst)
+    print(f"✓ {count} reports migrated")
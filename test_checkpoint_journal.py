@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Test the checkpoint journal used to resume interrupted bulk exports
+(checkpoint_journal.py): resuming after a partial batch, discarding another
+job's progress, retrying failed records and deleting the journal on finish()
+
+Run with:  python test_checkpoint_journal.py
+"""
+import os
+import tempfile
+
+from checkpoint_journal import CheckpointJournal, JOURNAL_FILENAME, job_signature, read_journal
+
+
+def test_resume_after_partial_batch():
+    """Only flushed batches survive a crash; resume skips exactly those"""
+    with tempfile.TemporaryDirectory() as out_dir:
+        path = os.path.join(out_dir, JOURNAL_FILENAME)
+        job_id = job_signature(['out', 'year', '1'])
+
+        journal = CheckpointJournal.open(path, job_id, flush_every=3)
+        for n in range(1, 6):
+            journal.mark_done(f"{n}_Patient.pdf", f"hash{n}")
+        # Killed here: records 4 and 5 are still in the unflushed buffer
+        journal._file.close()
+
+        assert read_journal(path) == (job_id, {f"{n}_Patient.pdf": f"hash{n}" for n in (1, 2, 3)})
+
+        resumed = CheckpointJournal.open(path, job_id, resume=True, flush_every=3)
+        assert resumed.is_done('1_Patient.pdf', 'hash1')
+        assert not resumed.is_done('1_Patient.pdf', 'changed')   # record edited since
+        assert not resumed.is_done('4_Patient.pdf')               # lost with the batch
+        for n in (4, 5):
+            resumed.mark_done(f"{n}_Patient.pdf", f"hash{n}")
+        resumed.close()
+        assert len(read_journal(path)[1]) == 5
+    print("✓ resume after a partial batch")
+
+
+def test_torn_line_and_failures():
+    """A torn last line is ignored and a failed record is retried"""
+    with tempfile.TemporaryDirectory() as out_dir:
+        path = os.path.join(out_dir, JOURNAL_FILENAME)
+        journal = CheckpointJournal.open(path, 'job', flush_every=1)
+        journal.mark_done('a', 'h')
+        journal.mark_done('b', 'h')
+        journal.mark_failed('b', 'disk full')
+        journal.close()
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('{"ok": "c", "ha')
+
+        resumed = CheckpointJournal.open(path, 'job', resume=True)
+        assert resumed.is_done('a') and not resumed.is_done('b') and not resumed.is_done('c')
+        resumed.close()
+    print("✓ torn line ignored, failed record retried")
+
+
+def test_other_job_discarded():
+    """Progress of a different job (or without resume) starts over"""
+    with tempfile.TemporaryDirectory() as out_dir:
+        path = os.path.join(out_dir, JOURNAL_FILENAME)
+        journal = CheckpointJournal.open(path, 'job-1', flush_every=1)
+        journal.mark_done('a', 'h')
+        journal.close()
+
+        other = CheckpointJournal.open(path, 'job-2', resume=True)
+        assert not other.is_done('a')
+        other.close()
+        assert read_journal(path) == ('job-2', {})
+
+        fresh = CheckpointJournal.open(path, 'job-2')
+        fresh.close()
+        assert read_journal(path) == ('job-2', {})
+    print("✓ another job's progress is discarded")
+
+
+def test_finish_removes_journal():
+    """finish() writes nothing more and deletes the journal"""
+    with tempfile.TemporaryDirectory() as out_dir:
+        path = os.path.join(out_dir, JOURNAL_FILENAME)
+        journal = CheckpointJournal.open(path, 'job')
+        journal.mark_done('a', 'h')
+        assert os.path.exists(path)
+        journal.finish()
+        assert not os.path.exists(path)
+        assert read_journal(path) == (None, {})
+    print("✓ finish() removes the journal")
+
+
+if __name__ == "__main__":
+    print("CHECKPOINT JOURNAL TESTS")
+    print("-" * 70)
+    test_resume_after_partial_batch()
+    test_torn_line_and_failures()
+    test_other_job_discarded()
+    test_finish_removes_journal()
+    print("-" * 70)
+    print("All checkpoint journal tests passed")
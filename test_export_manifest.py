@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+"""
+Test the incremental-export manifest (export_manifest.py): is_current,
+record, prune and the atomic save
+
+Run with:  python test_export_manifest.py
+"""
+import json
+import os
+import tempfile
+
+from export_manifest import ExportManifest, MANIFEST_FILENAME, output_key, record_hash
+
+HEADERS = ['ID', 'Name', 'Report']
+
+
+def write(path, data=b'%PDF'):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_is_current():
+    """Current only for the same hash, the same files, and files still on disk"""
+    with tempfile.TemporaryDirectory() as out_dir:
+        pdf = os.path.join(out_dir, '1_A.pdf')
+        copy = os.path.join(out_dir, 'Year_2017', '1_A.pdf')
+        os.makedirs(os.path.dirname(copy))
+        write(pdf)
+        write(copy)
+        digest = record_hash(HEADERS, ['1', 'A', 'text'], '1')
+        assert digest == record_hash(HEADERS, ['1', 'A', 'text'], '1')
+        assert digest != record_hash(HEADERS, ['1', 'A', 'edited'], '1')
+        assert digest != record_hash(HEADERS, ['1', 'A', 'text'], '2')    # new template
+
+        manifest = ExportManifest(os.path.join(out_dir, MANIFEST_FILENAME), '1')
+        assert not manifest.is_current('1_A.pdf', digest, [pdf, copy])
+        manifest.record('1_A.pdf', digest, [pdf, copy])
+        assert manifest.is_current('1_A.pdf', digest, [pdf, copy])
+        assert not manifest.is_current('1_A.pdf', 'other', [pdf, copy])
+        assert not manifest.is_current('1_A.pdf', digest, [pdf])
+        os.remove(copy)
+        assert not manifest.is_current('1_A.pdf', digest, [pdf, copy])
+    print("✓ is_current")
+
+
+def test_record_replaces_files():
+    """Re-recording a key deletes the files it no longer owns"""
+    with tempfile.TemporaryDirectory() as out_dir:
+        old = os.path.join(out_dir, 'old.pdf')
+        new = os.path.join(out_dir, 'new.pdf')
+        write(old)
+        write(new)
+        manifest = ExportManifest(os.path.join(out_dir, MANIFEST_FILENAME), '1')
+        manifest.record('1_A.pdf', 'h1', [old])
+        manifest.record('1_A.pdf', 'h2', [new])
+        assert not os.path.exists(old) and os.path.exists(new)
+        assert manifest.entries['1_A.pdf'] == {'hash': 'h2', 'files': [new]}
+    print("✓ record replaces files")
+
+
+def test_prune_removes_unseen():
+    """prune() drops entries not seen in this run and deletes their files"""
+    with tempfile.TemporaryDirectory() as out_dir:
+        path = os.path.join(out_dir, MANIFEST_FILENAME)
+        kept, gone = os.path.join(out_dir, 'kept.pdf'), os.path.join(out_dir, 'gone.pdf')
+        write(kept)
+        write(gone)
+        manifest = ExportManifest(path, '1')
+        manifest.record('kept.pdf', 'h', [kept])
+        manifest.record('gone.pdf', 'h', [gone])
+        manifest.save()
+
+        rerun = ExportManifest.load(path, '1')
+        assert rerun.is_current('kept.pdf', 'h', [kept])
+        assert rerun.prune() == 1
+        assert os.path.exists(kept) and not os.path.exists(gone)
+        assert list(rerun.entries) == ['kept.pdf']
+        # A file already deleted by hand is not an error
+        rerun.entries['missing.pdf'] = {'hash': 'h', 'files': [os.path.join(out_dir, 'missing.pdf')]}
+        assert rerun.prune() == 1
+    print("✓ prune removes unseen entries")
+
+
+def test_same_name_in_two_years():
+    """Records sharing a file name in different years keep both year copies;
+    the shared flat copy is only deleted with the last entry listing it"""
+    with tempfile.TemporaryDirectory() as folder:
+        out_dir, year_dir = os.path.join(folder, 'out'), os.path.join(folder, 'years')
+        flat = os.path.join(out_dir, '100_John_Doe.pdf')
+        files = {year: [flat, os.path.join(year_dir, f"Year_{year}", '100_John_Doe.pdf')]
+                 for year in ('2016', '2017')}
+        keys = {year: output_key(paths, (out_dir, year_dir)) for year, paths in files.items()}
+        assert keys['2016'] == '100_John_Doe.pdf|Year_2016/100_John_Doe.pdf'
+        assert keys['2016'] != keys['2017']
+        for paths in files.values():
+            for path in paths:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                write(path)
+
+        path = os.path.join(out_dir, MANIFEST_FILENAME)
+        manifest = ExportManifest(path, '1')
+        manifest.record(keys['2016'], 'h16', files['2016'])
+        manifest.record(keys['2017'], 'h17', files['2017'])
+        assert all(os.path.exists(p) for p in files['2016'] + files['2017'])
+        manifest.save()
+
+        # The 2017 record is deleted from the data: its year copy goes, the
+        # flat copy stays because the 2016 entry still lists it
+        rerun = ExportManifest.load(path, '1')
+        assert rerun.is_current(keys['2016'], 'h16', files['2016'])
+        assert rerun.prune() == 1
+        assert os.path.exists(flat) and os.path.exists(files['2016'][1])
+        assert not os.path.exists(files['2017'][1])
+
+        rerun.seen.clear()
+        assert rerun.prune() == 1
+        assert not os.path.exists(flat) and not os.path.exists(files['2016'][1])
+    print("✓ same name in two years")
+
+
+def test_atomic_save():
+    """save() replaces the manifest whole; a failed save leaves the old one"""
+    with tempfile.TemporaryDirectory() as out_dir:
+        path = os.path.join(out_dir, MANIFEST_FILENAME)
+        manifest = ExportManifest(path, '1')
+        manifest.record('1_A.pdf', 'h', [])
+        manifest.save()
+        assert not os.path.exists(path + '.tmp')
+        with open(path, 'r', encoding='utf-8') as f:
+            assert json.load(f) == {'template_version': '1', 'entries': {'1_A.pdf': {'hash': 'h', 'files': []}}}
+        assert ExportManifest.load(path, '1').entries == manifest.entries
+
+        manifest.entries['bad.pdf'] = {'hash': object(), 'files': []}   # not JSON serializable
+        try:
+            manifest.save()
+        except TypeError:
+            pass
+        else:
+            raise AssertionError("save() should fail")
+        assert ExportManifest.load(path, '1').entries == {'1_A.pdf': {'hash': 'h', 'files': []}}
+    print("✓ atomic save")
+
+
+if __name__ == "__main__":
+    print("EXPORT MANIFEST TESTS")
+    print("-" * 70)
+    test_is_current()
+    test_record_replaces_files()
+    test_prune_removes_unseen()
+    test_same_name_in_two_years()
+    test_atomic_save()
+    print("-" * 70)
+    print("All export manifest tests passed")
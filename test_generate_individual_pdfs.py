@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+Test how the bulk export writes its two copies of every PDF
+(generate_individual_pdfs.write_report_files): each record's year copy
+keeps that record's PDF, even when records of different years share a
+file name and are written one after another or by concurrent writers.
+Also checks that write_pipelined reports every finished write, including
+those still in flight when the export is interrupted
+
+Run with:  python test_generate_individual_pdfs.py
+"""
+import os
+import tempfile
+import threading
+
+from generate_individual_pdfs import write_pipelined, write_report_files
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def year_path(year_dir, year, filename='x.pdf'):
+    path = os.path.join(year_dir, f"Year_{year}", filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def test_same_name_in_two_years():
+    """Rewriting the flat copy must not change the earlier year's copy"""
+    with tempfile.TemporaryDirectory() as folder:
+        flat = os.path.join(folder, 'x.pdf')
+        write_report_files(b'RECORD-A', flat, year_path(folder, 2016))
+        write_report_files(b'RECORD-B', flat, year_path(folder, 2017))
+        assert read(year_path(folder, 2016)) == b'RECORD-A'
+        assert read(year_path(folder, 2017)) == b'RECORD-B'
+        assert read(flat) == b'RECORD-B'
+        # Rewriting a year copy replaces it with the new PDF
+        write_report_files(b'RECORD-A2', flat, year_path(folder, 2016))
+        assert read(year_path(folder, 2016)) == b'RECORD-A2'
+        assert read(year_path(folder, 2017)) == b'RECORD-B'
+        assert not [name for name in os.listdir(folder) if name.endswith('.tmp')]
+    print("✓ same name in two years")
+
+
+def test_concurrent_writers():
+    """Writer threads racing on one flat name still give every year copy its own PDF"""
+    with tempfile.TemporaryDirectory() as folder:
+        flat = os.path.join(folder, 'x.pdf')
+        years = list(range(2000, 2016))
+        barrier = threading.Barrier(len(years))
+
+        def write(year):
+            barrier.wait()
+            for n in range(20):
+                write_report_files(f"RECORD-{year}-{n}".encode(), flat, year_path(folder, year))
+
+        threads = [threading.Thread(target=write, args=(year,)) for year in years]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for year in years:
+            assert read(year_path(folder, year)) == f"RECORD-{year}-19".encode()
+        assert read(flat) in {f"RECORD-{year}-19".encode() for year in years}
+    print("✓ concurrent writers")
+
+
+def pipelined_run(folder, stop_rendering_after=None, interrupt_after=None):
+    """(yielded, passed to finished) of a write_pipelined run over 20 records,
+    the rendering or the consuming loop optionally interrupted"""
+    def rendered():
+        for n in range(1, 21):
+            if n - 1 == stop_rendering_after:
+                raise KeyboardInterrupt
+            yield (n, 'render failed', None) if n == 5 else (n, None, f"RECORD-{n}".encode())
+
+    paths = lambda n: (os.path.join(folder, f"{n}.pdf"), year_path(folder, 2017, f"{n}.pdf"))
+    finished = []
+    results = write_pipelined(rendered(), paths, 3, lambda n, error: finished.append((n, error)))
+    yielded = []
+    try:
+        for report_num, error in results:
+            yielded.append((report_num, error))
+            if len(yielded) == interrupt_after:
+                raise KeyboardInterrupt
+    except KeyboardInterrupt:
+        pass
+    finally:
+        results.close()
+    return yielded, finished
+
+
+def expected_reports(count):
+    return [(n, 'render failed' if n == 5 else None) for n in range(1, count + 1)]
+
+
+def test_pipelined_reports_every_write():
+    """Each report comes back exactly once, yielded or (once interrupted)
+    passed to finished, and every PDF on disk is among them"""
+    with tempfile.TemporaryDirectory() as folder:
+        yielded, finished = pipelined_run(folder)
+        assert finished == [] and sorted(yielded) == expected_reports(20)
+
+    with tempfile.TemporaryDirectory() as folder:
+        yielded, finished = pipelined_run(folder, stop_rendering_after=12)
+        assert sorted(yielded + finished) == expected_reports(12)
+
+    with tempfile.TemporaryDirectory() as folder:
+        yielded, finished = pipelined_run(folder, interrupt_after=2)
+        reported = yielded + finished
+        assert len(yielded) == 2 and len({n for n, _ in reported}) == len(reported)
+        on_disk = {int(name[:-4]) for name in os.listdir(folder) if name.endswith('.pdf')}
+        assert on_disk == {n for n, error in reported if error is None}
+    print("✓ pipelined writes all reported")
+
+
+if __name__ == "__main__":
+    print("BULK EXPORT FILE WRITE TESTS")
+    print("-" * 70)
+    test_same_name_in_two_years()
+    test_concurrent_writers()
+    test_pipelined_reports_every_write()
+    print("-" * 70)
+    print("All bulk export file write tests passed")
@@ -4,5 +4,6 @@ from kidney_biopsy_report_generator import ReportGeneratorApp
 root = tk.Tk()
 root.withdraw()
 app = ReportGeneratorApp(root)
+app.wait_until_loaded()
 print('Loaded records:', len(app.data_map))
 root.destroy()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Test the identifier index behind the Load box and bulk ID lists
+(record_index.py): normalization, duplicates and column precedence
+
+Run with:  python test_record_index.py
+"""
+from record_index import RecordIndex, normalize_key
+
+RECORDS = {
+    1: {'ID': '1', 'Biopsy No.': 'KB-12/17', 'CR No.': 'CR001', 'Reference No.': 'REF1'},
+    2: {'ID': '2', 'Biopsy No.': 'KB-13/17', 'CR No.': '1', 'Reference No.': ''},
+    3: {'ID': '3', 'Biopsy No.': 'kb-12 / 17', 'CR No.': 'CR003', 'Reference No.': 'REF1'},
+    4: {'ID': '', 'Biopsy No.': '', 'CR No.': '', 'Reference No.': ''},
+    5: {'ID': '5', 'Biopsy Number': 'KB-99/18'},
+}
+
+
+def test_normalize_key():
+    assert normalize_key(' kb-12 /17 ') == normalize_key('KB-12/17') == 'kb-12/17'
+    assert normalize_key('CR\t001\n') == 'cr001'
+    assert normalize_key(7) == '7'
+    print("✓ normalize_key")
+
+
+def test_case_and_whitespace_variants():
+    index = RecordIndex.build(RECORDS)
+    for typed in ('KB-13/17', 'kb-13/17', ' KB - 13 / 17 ', 'Kb-13/17\n'):
+        assert index.lookup(typed) == [2], typed
+    assert index.lookup('cr003') == [3]
+    assert index.lookup('') == [] and index.lookup('KB-404/17') == []
+    print("✓ case and whitespace variants")
+
+
+def test_duplicates_keep_every_record():
+    index = RecordIndex.build(RECORDS)
+    # Written differently but equal once normalized: both, in load order
+    assert index.lookup('KB-12/17') == [1, 3]
+    assert index.lookup('ref1') == [1, 3]
+    # Adding the same record again does not repeat it
+    index.add(3, RECORDS[3])
+    assert index.lookup('KB-12/17') == [1, 3]
+    # Returned lists are copies
+    index.lookup('KB-12/17').append(99)
+    assert index.lookup('KB-12/17') == [1, 3]
+    print("✓ duplicates keep every record")
+
+
+def test_column_precedence_and_aliases():
+    index = RecordIndex.build(RECORDS)
+    # '1' is record 1's ID and record 2's CR No.; ID answers first
+    assert index.lookup('1') == [1]
+    assert index.lookup('1', header='CR No.') == [2]
+    assert index.lookup('KB-12/17', header='ID') == []
+    # Older exports' 'Biopsy Number' column is indexed as Biopsy No.
+    assert index.lookup('kb-99/18') == [5]
+    # Blank identifiers are not indexed
+    assert 4 not in sum((index.lookup(v) for v in ('', ' ')), [])
+    # Distinct values per column: 4 IDs, 3 Biopsy Nos., 3 CR Nos., 1 Reference No.
+    assert len(index) == 4 + 3 + 3 + 1
+    print("✓ column precedence and aliases")
+
+
+if __name__ == "__main__":
+    print("RECORD INDEX TESTS")
+    print("-" * 70)
+    test_normalize_key()
+    test_case_and_whitespace_variants()
+    test_duplicates_keep_every_record()
+    test_column_precedence_and_aliases()
+    print("-" * 70)
+    print("All record index tests passed")
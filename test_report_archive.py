@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+Test the ZIP archive output of the bulk export (report_archive.py):
+reports written by ReportArchiveWriter come back out through find_report,
+for one archive and for a folder of per-year archives
+
+Run with:  python test_report_archive.py
+"""
+import os
+import tempfile
+import zipfile
+
+from report_archive import INDEX_MEMBER, PARTIAL_SUFFIX, ReportArchive, ReportArchiveWriter, find_report
+
+REPORTS = [
+    ('1', '2017', '1_John_Doe.pdf', b'%PDF-1 first John Doe'),
+    ('2', '2018', '2_Ram_Kumar.pdf', b'%PDF-2 Ram Kumar'),
+    ('1', '2018', '1_John_Doe.pdf', b'%PDF-1 re-reported in 2018'),
+]
+
+
+def write_reports(writer):
+    for report in REPORTS:
+        writer.add(*report)
+    return writer.close()
+
+
+def test_single_archive_round_trip():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'Individual_PDF_Reports.zip')
+        assert write_reports(ReportArchiveWriter(path=path)) == [path]
+        assert not os.path.exists(path + PARTIAL_SUFFIX)
+
+        # Same file name in two years: both kept under their year folders
+        with zipfile.ZipFile(path) as zf:
+            assert sorted(zf.namelist()) == sorted([INDEX_MEMBER, 'Year_2017/1_John_Doe.pdf',
+                                                    'Year_2018/1_John_Doe.pdf', 'Year_2018/2_Ram_Kumar.pdf'])
+
+        assert find_report(path, '2') == (path, 'Year_2018/2_Ram_Kumar.pdf', b'%PDF-2 Ram Kumar')
+        # An ID written twice resolves to the last report written
+        assert find_report(path, ' 1 ') == (path, 'Year_2018/1_John_Doe.pdf', b'%PDF-1 re-reported in 2018')
+        assert find_report(path, '99') is None
+
+        archive = ReportArchive(path)
+        try:
+            assert sorted(archive.ids()) == ['1', '2']
+            assert archive.index['1'] == ['Year_2017/1_John_Doe.pdf', 'Year_2018/1_John_Doe.pdf']
+        finally:
+            archive.close()
+    print("✓ single archive round trip")
+
+
+def test_per_year_round_trip():
+    with tempfile.TemporaryDirectory() as folder:
+        paths = write_reports(ReportArchiveWriter(year_dir=folder))
+        assert paths == [os.path.join(folder, 'Year_2017.zip'), os.path.join(folder, 'Year_2018.zip')]
+
+        assert find_report(folder, '2') == (paths[1], '2_Ram_Kumar.pdf', b'%PDF-2 Ram Kumar')
+        # Archives are searched in name order, so the 2017 copy of ID 1 is found first
+        assert find_report(folder, '1') == (paths[0], '1_John_Doe.pdf', b'%PDF-1 first John Doe')
+        assert find_report(paths[1], '1') == (paths[1], '1_John_Doe.pdf', b'%PDF-1 re-reported in 2018')
+        assert find_report(folder, '99') is None
+    print("✓ per-year archives round trip")
+
+
+def test_archive_without_index():
+    """Archives lacking report_index.json fall back to the file names"""
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'old.zip')
+        with zipfile.ZipFile(path, 'w') as zf:
+            zf.writestr('Year_2016/7_Asha_Rani.pdf', b'%PDF-7')
+            zf.writestr('notes.txt', b'not a report')
+        assert find_report(path, '7') == (path, 'Year_2016/7_Asha_Rani.pdf', b'%PDF-7')
+        assert find_report(path, 'notes.txt') is None
+    print("✓ archive without index")
+
+
+def test_abort_keeps_previous_archive():
+    """An export that fails part way leaves the last complete archive in place"""
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'Individual_PDF_Reports.zip')
+        write_reports(ReportArchiveWriter(path=path))
+
+        writer = ReportArchiveWriter(path=path)
+        writer.add('3', '2019', '3_Asha_Rani.pdf', b'%PDF-3')
+        assert os.path.exists(path + PARTIAL_SUFFIX)
+        writer.abort()
+        assert not os.path.exists(path + PARTIAL_SUFFIX)
+        assert find_report(path, '3') is None
+        assert find_report(path, '2') == (path, 'Year_2018/2_Ram_Kumar.pdf', b'%PDF-2 Ram Kumar')
+
+        # A failure while finishing the archives is an abort as well
+        writer = ReportArchiveWriter(year_dir=folder)
+        writer.add('3', '2019', '3_Asha_Rani.pdf', b'%PDF-3')
+        writer.indexes[os.path.join(folder, 'Year_2019.zip')]['3'] = object()    # not JSON serializable
+        try:
+            writer.close()
+        except TypeError:
+            pass
+        else:
+            raise AssertionError("close() should fail")
+        assert os.listdir(folder) == ['Individual_PDF_Reports.zip']
+    print("✓ abort keeps previous archive")
+
+
+if __name__ == "__main__":
+    print("REPORT ARCHIVE TESTS")
+    print("-" * 70)
+    test_single_archive_round_trip()
+    test_per_year_round_trip()
+    test_archive_without_index()
+    test_abort_keeps_previous_archive()
+    print("-" * 70)
+    print("All report archive tests passed")
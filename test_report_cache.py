@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Test the GUI's on-disk load cache (report_cache.py): a saved payload is
+only returned while the source file's mtime, size and content are the
+ones it was saved for
+
+Run with:  python test_report_cache.py
+"""
+import os
+import tempfile
+
+import report_cache
+from report_cache import cache_path, load_cache, save_cache, source_signature
+
+PAYLOAD = (['ID', 'Name'], [1, 2], [('1', 'A'), ('2', 'B')], {'token': b'\x00\x00\x00\x00'})
+
+
+def make_source(folder, text='[["ID", "Name"], ["1", "A"], ["2", "B"]]'):
+    path = os.path.join(folder, 'reports_data.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return path
+
+
+def cached_source(folder):
+    source = make_source(folder)
+    assert save_cache(source, PAYLOAD, source_signature(source))
+    return source
+
+
+def test_round_trip():
+    with tempfile.TemporaryDirectory() as folder:
+        source = make_source(folder)
+        assert load_cache(source) is None    # nothing saved yet
+        signature = source_signature(source)
+        assert save_cache(source, PAYLOAD, signature)
+        assert os.path.exists(cache_path(source))
+        assert load_cache(source) == PAYLOAD
+        assert load_cache(source, signature) == PAYLOAD
+    print("✓ payload round trip")
+
+
+def test_mtime_change_invalidates():
+    with tempfile.TemporaryDirectory() as folder:
+        source = cached_source(folder)
+        stat = os.stat(source)
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert load_cache(source) is None
+    print("✓ mtime change invalidates")
+
+
+def test_size_change_invalidates():
+    with tempfile.TemporaryDirectory() as folder:
+        source = cached_source(folder)
+        stat = os.stat(source)
+        with open(source, 'a', encoding='utf-8') as f:
+            f.write('\n')
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns))    # same mtime
+        assert load_cache(source) is None
+    print("✓ size change invalidates")
+
+
+def test_content_change_invalidates():
+    """Same size and mtime, different bytes: caught by the content hash"""
+    with tempfile.TemporaryDirectory() as folder:
+        source = cached_source(folder)
+        stat = os.stat(source)
+        make_source(folder, '[["ID", "Name"], ["1", "A"], ["2", "C"]]')
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert os.stat(source).st_size == stat.st_size
+        assert load_cache(source) is None
+        assert load_cache(source, source_signature(source)) is None
+    print("✓ content change invalidates")
+
+
+def test_version_and_corruption():
+    """Another cache layout or a damaged cache file is a miss, not an error"""
+    with tempfile.TemporaryDirectory() as folder:
+        source = cached_source(folder)
+        version = report_cache.CACHE_VERSION
+        report_cache.CACHE_VERSION = version + 1
+        try:
+            assert load_cache(source) is None
+        finally:
+            report_cache.CACHE_VERSION = version
+        assert load_cache(source) == PAYLOAD
+
+        for damaged in (b'', b'\x05\x00', b'\xff\xff\xff\x7fgarbage'):
+            with open(cache_path(source), 'wb') as f:
+                f.write(damaged)
+            assert load_cache(source) is None
+    print("✓ other version or damaged cache is a miss")
+
+
+if __name__ == "__main__":
+    print("LOAD CACHE TESTS")
+    print("-" * 70)
+    test_round_trip()
+    test_mtime_change_invalidates()
+    test_size_change_invalidates()
+    test_content_change_invalidates()
+    test_version_and_corruption()
+    print("-" * 70)
+    print("All load cache tests passed")
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+"""
+Test the data store helpers (report_store.py): the incremental JSON
+parser and its byte spans, reading cold columns back from the JSON, bulk
+query criteria answered by record_matches or by the SQLite store, and a
+store older than its JSON never being served
+
+Run with:  python test_report_store.py
+"""
+import json
+import os
+import tempfile
+
+from report_store import (ReportStore, iter_json_array, iter_json_records, iter_table, load_table, migrate_json,
+                          open_store, parse_query, record_matches)
+
+HEADERS = ['ID', 'Name', 'Year', 'Keywords', 'Report']
+ROWS = [
+    ['1', 'John Doe', '2017', 'FSGS, IgAN', 'text'],
+    ['2', 'Ram Kumar', '2017', 'IgA nephropathy', 'text'],
+    ['3', 'Asha Rani', '2018', 'Minimal change,  igm ,', 'text'],
+    ['4', 'Ravi Das', '2018', 'LN', 'text'],
+    ['5', 'Sita Devi', '2019', '', 'text'],
+    ['6', 'Mohan Lal', '2019', 'FSGS-IgA variant', 'text'],
+]
+
+
+def write_json(folder, rows=ROWS):
+    json_path = os.path.join(folder, 'reports_data.json')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump([HEADERS] + rows, f)
+    return json_path
+
+
+def make_store(folder):
+    json_path = write_json(folder)
+    db_path = os.path.join(folder, 'reports_data.db')
+    assert migrate_json(json_path, db_path) == len(ROWS)
+    return db_path
+
+
+# Values the chunked parser must not split wrongly: escapes, quotes and
+# brackets inside strings, multi-byte UTF-8, \r\n line ends, non-strings
+TRICKY_ROWS = [
+    ['ID', 'Name', 'Report', 'Impression'],
+    ['1', 'He said "hi"', 'a \\ b \\"c\\" [not, an] {array}', 'ends with \\'],
+    ['2', 'Café Müller', 'Glomérulonéphrite à IgA — 腎臓 \U0001f52c', '\r\n\tline two'],
+    ['3', '', '', None],
+    ['4', 12, 3.5, True],
+    [],
+]
+
+
+def write_tricky_json(folder, **dump_options):
+    path = os.path.join(folder, 'reports_data.json')
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        json.dump(TRICKY_ROWS, f, **dump_options)
+    return path
+
+
+def test_iter_json_array_chunk_sizes():
+    """Every chunk size down to 1 gives the same elements and exact byte spans"""
+    layouts = [{}, {'indent': 2}, {'ensure_ascii': False}, {'ensure_ascii': False, 'indent': '\r\n'}]
+    with tempfile.TemporaryDirectory() as folder:
+        for options in layouts:
+            path = write_tricky_json(folder, **options)
+            with open(path, 'rb') as f:
+                data = f.read()
+            for chunk_size in (1, 2, 3, 5, 7, 16, 1 << 16):
+                assert list(iter_json_array(path, chunk_size)) == TRICKY_ROWS, (options, chunk_size)
+                spans = list(iter_json_array(path, chunk_size, with_spans=True))
+                assert [element for element, _, _ in spans] == TRICKY_ROWS
+                for element, start, end in spans:
+                    assert json.loads(data[start:end].decode('utf-8')) == element, (options, chunk_size)
+    print("✓ iter_json_array with any chunk size")
+
+
+def test_iter_json_array_errors():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'reports_data.json')
+        for text in ('{"ID": 1}', '[["1", "A"], ["2", "B"', '[["1", "A"], ["2", "B"],', ''):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            for chunk_size in (1, 1 << 16):
+                try:
+                    list(iter_json_array(path, chunk_size))
+                except ValueError:
+                    pass
+                else:
+                    raise AssertionError(f"{text!r} should not parse")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(' []\n')
+        assert list(iter_json_array(path, 1)) == []
+    print("✓ iter_json_array rejects broken arrays")
+
+
+def test_json_cold_columns():
+    """Cold values are read back from each row's span until the file changes"""
+    with tempfile.TemporaryDirectory() as folder:
+        path = write_tricky_json(folder, ensure_ascii=False, indent=2)
+        headers, cold, rows = iter_json_records(path, cold_headers=['Report', 'Impression'])
+        assert headers == TRICKY_ROWS[0]
+        rows = list(rows)
+        assert [row for _, row in rows] == TRICKY_ROWS[1:]
+        assert cold.cold_fields == ['Report', 'Impression']
+        for position, row in rows:
+            assert cold.fetch(position) == tuple((row + ['', '', '', ''])[2:4]), position
+        record = cold.record(2, ('2', 'Café Müller'))
+        assert record['Report'] == TRICKY_ROWS[2][2] and record['Name'] == 'Café Müller'
+
+        # Rewritten with the same size but a new mtime: the spans may be stale
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        try:
+            cold.fetch(1)
+        except ValueError as e:
+            assert 'has changed' in str(e)
+        else:
+            raise AssertionError("fetch() should fail after the JSON changed")
+
+        # A different size fails as well, even with the recorded mtime
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('\n')
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        try:
+            cold.fetch(1)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("fetch() should fail after the JSON changed")
+    print("✓ JSON cold columns and changed-file check")
+
+
+def json_ids(query):
+    return [row[0] for row in ROWS if record_matches(dict(zip(HEADERS, row)), query)]
+
+
+def store_ids(store, query):
+    return [row[0] for _, row in store.query_rows(query)]
+
+
+def test_keyword_matches_each_keyword():
+    """The keyword prefix is tried on every comma-separated keyword, not the whole cell"""
+    expected = {'iga': ['1', '2'], 'IG': ['1', '2', '3'], 'igm': ['3'], 'fsgs': ['1', '6'],
+                'change': [], 'ln': ['4'], 'FSGS, IgAN': []}
+    with tempfile.TemporaryDirectory() as folder:
+        store = ReportStore(make_store(folder))
+        try:
+            for keyword, ids in expected.items():
+                query = parse_query({'keyword': keyword})
+                assert json_ids(query) == ids, keyword
+                assert store_ids(store, query) == ids, keyword
+            query = parse_query({'keyword': 'iga', 'year_from': '2017', 'year_to': '2017'})
+            assert json_ids(query) == store_ids(store, query) == ['1', '2']
+        finally:
+            store.close()
+    print("✓ keyword matches each keyword")
+
+
+def test_keyword_table_added_to_older_store():
+    """A store migrated before report_keywords existed gets it on the first query"""
+    with tempfile.TemporaryDirectory() as folder:
+        db_path = make_store(folder)
+        store = ReportStore(db_path)
+        with store.conn:
+            store.conn.execute("DROP TABLE report_keywords")
+        store.close()
+
+        store = ReportStore(db_path)
+        try:
+            assert store_ids(store, parse_query({'keyword': 'iga'})) == ['1', '2']
+            store.insert_rows([['7', 'New Case', '2020', 'IgAN']])
+            assert store_ids(store, parse_query({'keyword': 'iga'})) == ['1', '2', '7']
+        finally:
+            store.close()
+    print("✓ keyword table added to older store")
+
+
+def test_changed_json_is_migrated_again():
+    """A re-parsed reports_data.json replaces the store's rows on the next open"""
+    with tempfile.TemporaryDirectory() as folder:
+        db_path = make_store(folder)
+        built = os.stat(db_path).st_mtime_ns
+        store = open_store(db_path)
+        assert len(store) == len(ROWS)
+        store.close()
+        assert os.stat(db_path).st_mtime_ns == built    # unchanged JSON: no migration
+
+        json_path = write_json(folder, ROWS[:2] + [['9', 'New Case', '2020', 'IgAN', 'text']])
+        stat = os.stat(json_path)
+        os.utime(json_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        headers, rows = load_table(db_path=db_path)
+        assert [row[0] for row in rows] == ['1', '2', '9']
+        headers, rows = iter_table(db_path=db_path)
+        assert [row[0] for row in rows] == ['1', '2', '9']
+        assert not os.path.exists(db_path + '.tmp')
+    print("✓ changed JSON is migrated again")
+
+
+def test_stale_store_not_served_when_migration_fails():
+    """If the changed JSON cannot be migrated, the old store is not used"""
+    with tempfile.TemporaryDirectory() as folder:
+        db_path = make_store(folder)
+        with open(os.path.join(folder, 'reports_data.json'), 'w', encoding='utf-8') as f:
+            f.write('[]')
+        assert open_store(db_path) is None
+        assert not os.path.exists(db_path + '.tmp')
+
+        # A store migrated before the source was recorded is refreshed once
+        db_path = make_store(folder)
+        store = ReportStore(db_path)
+        with store.conn:
+            store.conn.execute("DELETE FROM meta WHERE key = 'source'")
+        store.close()
+        store = open_store(db_path)
+        assert store.source_signature() is not None
+        store.close()
+    print("✓ stale store not served")
+
+
+if __name__ == "__main__":
+    print("REPORT STORE TESTS")
+    print("-" * 70)
+    test_iter_json_array_chunk_sizes()
+    test_iter_json_array_errors()
+    test_json_cold_columns()
+    test_keyword_matches_each_keyword()
+    test_keyword_table_added_to_older_store()
+    test_changed_json_is_migrated_again()
+    test_stale_store_not_served_when_migration_fails()
+    print("-" * 70)
+    print("All report store tests passed")
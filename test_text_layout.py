@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+Test that the memoized line breaking (text_layout.py) and the pre-built
+PDF writer (fast_report_writer.py) lay out reports exactly as FPDF's own
+multi_cell does: the text lines extracted from the page content streams
+must match, position for position, for long, punctuated and empty fields
+
+Run with:  python test_text_layout.py
+"""
+import re
+
+from report_renderer import BULK_REPORT, FORM_REPORT, ReportLayout, form_values
+from fast_report_writer import FAST_BULK_REPORT, FAST_FORM_REPORT
+
+CREATED = '20260102030405'
+
+LONG_TEXT = ("Sections show renal cortex and medulla with 24 glomeruli, 3 globally sclerosed. "
+             "The remaining glomeruli show mild mesangial expansion (segmental), with no crescents; "
+             "tubules & interstitium: focal atrophy ~10-15%. ") * 12
+
+RECORDS = [
+    {'ID': '1', 'Name': 'John Doe', 'Report': LONG_TEXT, 'Impression': LONG_TEXT[:700],
+     'Note': 'Known case of SLE.\nOn steroids since 2015.\n\nFollow up.', 'Keywords': 'LN, class IV'},
+    # Punctuation FPDF escapes or breaks on, runs of spaces, words longer than a line
+    {'ID': '2', 'Name': "O'Brien (Jr.)", 'Report': r'C:\path\to (scan) [a] {b} "q" a\b ' * 20,
+     'Impression': 'x' * 400, 'Note': 'spaces    between     words  ' * 10,
+     'Keywords': 'Café, naïve, ½ – end'.replace('–', '-')},
+    # Empty and whitespace-only fields
+    {'ID': '3', 'Name': '', 'Report': '', 'Impression': '   ', 'Note': '', 'Keywords': ''},
+    {'ID': '4', 'Name': 'Short', 'Report': 'One line.', 'Impression': 'a', 'Note': 'ab', 'Keywords': '\n'},
+    # Overflows the first page (the form layout does not truncate)
+    {'ID': '5', 'Name': 'Long Case', 'Report': LONG_TEXT * 3, 'Impression': LONG_TEXT, 'Note': LONG_TEXT,
+     'Keywords': ', '.join(['IgA nephropathy'] * 60)},
+]
+
+TEXT_OP = re.compile(r'^BT ([\d.]+) ([\d.]+) Td \((.*)\) Tj ET$')
+
+
+def text_lines(pages):
+    """(page, x, y, text) of every text line, and the word spacing
+    operators in order; the "PDF Generated" line is left out"""
+    lines = []
+    for number, content in enumerate(pages, start=1):
+        for op in content.split('\n'):
+            match = TEXT_OP.match(op)
+            if match and not match.group(3).startswith('PDF Generated'):
+                lines.append((number,) + match.groups())
+            elif op.endswith(' Tw'):
+                lines.append((number, op))
+    return lines
+
+
+def fpdf_pages(layout, values):
+    """Pages of the report with FPDF's own multi_cell doing the line breaking"""
+    memoized = ReportLayout.__dict__['_multi_cell']
+    ReportLayout._multi_cell = staticmethod(lambda pdf, h, value: pdf.multi_cell(0, h, value))
+    try:
+        pdf = layout.render(values)
+    finally:
+        ReportLayout._multi_cell = memoized
+    return [pdf.pages[n] for n in sorted(pdf.pages)]
+
+
+def memoized_pages(layout, values):
+    pdf = layout.render(values)
+    return [pdf.pages[n] for n in sorted(pdf.pages)]
+
+
+def check_layout(layout, fast):
+    for record in RECORDS:
+        values = form_values(record)
+        expected = text_lines(fpdf_pages(layout, values))
+        assert expected, record['ID']
+        assert text_lines(memoized_pages(layout, values)) == expected, record['ID']
+        assert text_lines(fast.page_contents(values, CREATED)) == expected, record['ID']
+
+
+def test_bulk_layout_matches_fpdf():
+    check_layout(BULK_REPORT, FAST_BULK_REPORT)
+    print("✓ bulk layout matches FPDF multi_cell")
+
+
+def test_form_layout_matches_fpdf():
+    check_layout(FORM_REPORT, FAST_FORM_REPORT)
+    # The last record really did take more than one page
+    assert len(fpdf_pages(FORM_REPORT, form_values(RECORDS[-1]))) > 1
+    print("✓ form layout matches FPDF multi_cell")
+
+
+def test_single_page_bytes():
+    """render_bytes falls back to FPDF for text that would need a second page"""
+    fallbacks = FAST_FORM_REPORT.fallbacks
+    for record in RECORDS:
+        assert FAST_FORM_REPORT.render_bytes(form_values(record)).startswith(b'%PDF')
+    multi_page = [r for r in RECORDS if len(fpdf_pages(FORM_REPORT, form_values(r))) > 1]
+    assert len(multi_page) == 2
+    assert FAST_FORM_REPORT.fallbacks == fallbacks + len(multi_page)
+    print("✓ single-page fast path and fallback")
+
+
+if __name__ == "__main__":
+    print("TEXT LAYOUT TESTS")
+    print("-" * 70)
+    test_bulk_layout_matches_fpdf()
+    test_form_layout_matches_fpdf()
+    test_single_page_bytes()
+    print("-" * 70)
+    print("All text layout tests passed")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Memoized line breaking for the multi_cell sections of a report
+
+The Report, Impression, Note and Keywords sections are justified
+multi_cell text, and FPDF measures and breaks them character by character
+for every report. Bulk runs repeat the same paragraphs over and over
+(standard impressions, keywords, notes), so the break decisions are
+computed once per paragraph and kept in a bounded LRU cache.
+
+wrap_text() returns what multi_cell would emit, line by line:
+(line, word spacing, Tw operator or ''), so both ReportLayout (through
+FPDF.cell) and FastReportWriter reproduce FPDF's output exactly.
+"""
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate, repeat
+from fpdf.fonts import fpdf_charwidths
+
+# Paragraph layouts kept per process
+LAYOUT_CACHE_SIZE = 4096
+
+
+def wrap_text(s, font_key, font_size, wmax, k):
+    """multi_cell(w, h, s) line breaks for a core font, as a tuple of
+    (line, ws, tw) with ws the word spacing in effect for the line and tw
+    the operator to emit before it
+
+    wmax is the usable width in 1/1000 of the font size, as FPDF computes
+    it, and k the document's scale factor. Every explicit line break ends
+    a paragraph with word spacing reset, so paragraphs are laid out (and
+    cached) independently.
+    """
+    s = s.replace("\r", '')
+    if s.endswith("\n"):
+        s = s[:-1]
+    if "\n" not in s:
+        return wrap_paragraph(s, font_key, font_size, wmax, k)
+    lines = ()
+    for paragraph in s.split("\n"):
+        lines += wrap_paragraph(paragraph, font_key, font_size, wmax, k)
+    return lines
+
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def wrap_paragraph(s, font_key, font_size, wmax, k):
+    """Justified line breaks of a paragraph without newlines (see wrap_text)
+
+    Breaks where FPDF does, but finds each break with a bisect over the
+    cumulative character widths instead of a per-character loop.
+    """
+    widths = fpdf_charwidths[font_key]
+    nb = len(s)
+    # cum[t] = width of s[:t]; a line starting at j overflows at the
+    # first character i with cum[i + 1] - cum[j] > wmax
+    cum = [0]
+    cum.extend(accumulate(map(widths.get, s, repeat(0))))
+    lines = []
+    ws = 0
+    j = 0
+    while True:
+        t = bisect_right(cum, cum[j] + wmax, j + 1)
+        while t <= nb and not cum[t] - cum[j] > wmax:
+            t += 1
+        while t - 1 > j and cum[t - 1] - cum[j] > wmax:
+            t -= 1
+        i = t - 1
+        if i >= nb:
+            break
+        # Automatic line break, at the last space if there is one
+        sep = s.rfind(' ', j, i + 1)
+        if sep == -1:
+            if i == j:
+                i += 1
+            lines.append((s[j:i], 0, '0 Tw' if ws > 0 else ''))
+            ws = 0
+            j = i
+        else:
+            ns = s.count(' ', j, i + 1)
+            ws = (wmax - (cum[sep] - cum[j])) / 1000.0 * font_size / (ns - 1) if ns > 1 else 0
+            lines.append((s[j:sep], ws, '%.3f Tw' % (ws * k)))
+            j = sep + 1
+    lines.append((s[j:nb], 0, '0 Tw' if ws > 0 else ''))
+    return tuple(lines)
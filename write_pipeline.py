@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Disk-write stage for pipelined bulk exports
+
+Rendering a PDF is CPU-bound; writing it to a network share mostly waits.
+ReportWriterPool takes rendered PDFs through a bounded queue and writes
+them on a few threads, so rendering carries on while earlier reports are
+still being written. When the writers fall behind, submit() blocks, so at
+most queue_size rendered PDFs are held in memory.
+"""
+import os
+import queue
+import threading
+
+# Writer threads used when none are given
+DEFAULT_WRITERS = 4
+
+# Rendered PDFs allowed to wait for a writer, per writer thread
+QUEUE_PER_WRITER = 4
+
+
+def atomic_write(path, data):
+    """Write data to path via a temp file in the same folder and a rename,
+    so readers never see a half-written PDF"""
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ReportWriterPool:
+    """Writer threads fed through a bounded queue
+
+    submit(key, *args) queues write(*args); completed() and close() return
+    (key, error message or None) for every finished write.
+    """
+
+    def __init__(self, write, writers=DEFAULT_WRITERS, queue_size=None):
+        self.write = write
+        self.jobs = queue.Queue(maxsize=queue_size or writers * QUEUE_PER_WRITER)
+        self.done = queue.Queue()
+        self.threads = [threading.Thread(target=self._work, daemon=True) for _ in range(writers)]
+        for thread in self.threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            key, args = job
+            try:
+                self.write(*args)
+                self.done.put((key, None))
+            except Exception as e:
+                self.done.put((key, str(e)))
+
+    def submit(self, key, *args):
+        """Queue one write, blocking while the queue is full"""
+        self.jobs.put((key, args))
+
+    def completed(self):
+        """Writes finished since the last call"""
+        finished = []
+        try:
+            while True:
+                finished.append(self.done.get_nowait())
+        except queue.Empty:
+            pass
+        return finished
+
+    def close(self):
+        """Wait for the queued writes to finish and stop the threads"""
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        return self.completed()